@@ -0,0 +1,99 @@
+from pathlib import PurePosixPath
+from google.api_core.exceptions import PreconditionFailed
+from json_storage import JSON_SUFFIX
+
+# Give up after this many lost races for the same name
+MAX_UPLOAD_ATTEMPTS = 8
+
+# Multi-part suffixes kept together; any other dot in a name is part of the stem
+COMPOUND_SUFFIXES = (JSON_SUFFIX,)
+
+
+def copy_name(stem: str, suffix: str, n: int) -> str:
+    """'toc.pdf' -> 'toc_copy.pdf', 'toc_copy2.pdf', ..."""
+    return f"{stem}_copy{suffix}" if n == 1 else f"{stem}_copy{n}{suffix}"
+
+
+def numbered_name(stem: str, suffix: str, n: int) -> str:
+    """'doc_json.json' -> 'doc_json_1.json', 'doc_json_2.json', ..."""
+    return f"{stem}_{n}{suffix}"
+
+
+def _split_blob_name(blob_name: str) -> tuple[str, str, str]:
+    """Returns (folder prefix with trailing slash or "", stem, suffix)."""
+    path = PurePosixPath(blob_name)
+    folder = "" if str(path.parent) == "." else f"{path.parent}/"
+    suffix = next((s for s in COMPOUND_SUFFIXES if path.name.endswith(s) and path.name != s), path.suffix)
+    return folder, path.name.removesuffix(suffix), suffix
+
+
+def candidate_names(blob_name: str, variant=copy_name):
+    """Yields blob_name and then its numbered variants, in the order they are tried."""
+    folder, stem, suffix = _split_blob_name(blob_name)
+    yield blob_name
+    n = 1
+    while True:
+        yield f"{folder}{variant(stem, suffix, n)}"
+        n += 1
+
+
+def list_taken_names(bucket, blob_name: str) -> set[str]:
+    """Lists every existing blob that could collide with blob_name or its variants, in one listing."""
+    folder, stem, _ = _split_blob_name(blob_name)
+    blobs = bucket.list_blobs(prefix=f"{folder}{stem}", fields="items(name),nextPageToken")
+    return {blob.name for blob in blobs}
+
+
+def first_free_name(bucket, blob_name: str, variant=copy_name, taken: set[str] | None = None) -> str:
+    """Returns the first of blob_name and its variants that isn't in the bucket."""
+    if taken is None:
+        taken = list_taken_names(bucket, blob_name)
+    return next(name for name in candidate_names(blob_name, variant) if name not in taken)
+
+
+def _is_precondition_failure(error: Exception) -> bool:
+    # Streaming writes (blob.open("wb")) surface the 412 as a raw InvalidResponse
+    response = getattr(error, "response", None)
+    return isinstance(error, PreconditionFailed) or getattr(response, "status_code", None) == 412
+
+
+def upload_unique(bucket, blob_name: str, write, variant=copy_name) -> tuple[str, object]:
+    """
+    Writes a new blob under blob_name, or under the first free variant if it is taken.
+
+    Every write is conditional on the name not existing yet (if_generation_match=0),
+    so concurrent writers never overwrite each other: the loser of a race gets a 412
+    and moves on to the next name. A fresh name costs one request; an existing one
+    adds a single prefix listing, however many versions are stored.
+
+    Args:
+        bucket: The google.cloud.storage Bucket to write to.
+        blob_name: The preferred blob name.
+        write: Callable(blob, if_generation_match=...) that uploads the content,
+            passing the precondition on to the upload call.
+        variant: Callable(stem, suffix, n) naming the n-th alternative (copy_name or numbered_name).
+
+    Returns:
+        (the blob name written, the Blob)
+    """
+    blob = bucket.blob(blob_name)
+    try:
+        write(blob, if_generation_match=0)
+        return blob_name, blob
+    except Exception as e:
+        if not _is_precondition_failure(e):
+            raise
+
+    taken = list_taken_names(bucket, blob_name) | {blob_name}
+    for _ in range(MAX_UPLOAD_ATTEMPTS):
+        candidate = first_free_name(bucket, blob_name, variant, taken)
+        blob = bucket.blob(candidate)
+        try:
+            write(blob, if_generation_match=0)
+            return candidate, blob
+        except Exception as e:
+            if not _is_precondition_failure(e):
+                raise
+            # Another writer took it between our listing and our upload
+            taken.add(candidate)
+    raise RuntimeError(f"Could not find a free name for {blob_name} after {MAX_UPLOAD_ATTEMPTS} attempts")
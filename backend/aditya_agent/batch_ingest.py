@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ingest import extract_toc_stage, generate_tree_stage, populate_stage, save_stage, build_meta
+from gemini_client import JobBudget, job_budget, request_limit
+from metrics import run_recorded, recorded_result
+from prometheus_client import REGISTRY, write_to_textfile
+
+
+def _populate_in_worker(tree_result: dict, gcs_file_path: str, start_page: int, streaming: bool, max_tokens: int | None, deadline: float | None, llm_slot) -> tuple[dict, dict, int]:
+    """
+    cpu_pool entry point: populates content under what is left of the document's
+    budget (max_tokens, and a time.time() deadline so time spent queued for a
+    worker counts), with its Gemini requests (conclusive heading checks) counted
+    against the batch-wide llm_slot.
+
+    Returns:
+        (populated JSON, layout, Gemini tokens used), so the parent can charge the
+        document's budget.
+    """
+    budget = JobBudget(max_tokens=max_tokens, max_seconds=None if deadline is None else deadline - time.time())
+    with job_budget(budget), request_limit(llm_slot):
+        # Already in a cpu_pool worker, so page text is extracted in this process rather than by a nested pool
+        populated_json, layout = populate_stage(tree_result, gcs_file_path, start_page, streaming, workers=1)
+    return populated_json, layout, budget.tokens_used
+
+
+def _ingest_one(gcs_file_path: str, cpu_pool: ProcessPoolExecutor, llm_slot, streaming: bool) -> dict:
+    """Runs one document through the pipeline, sending CPU-bound stages to the process pool."""
+    timings = {}
+    report = {"gcs_path": gcs_file_path, "json_location": None, "error": None, "timings": timings}
+    started = time.perf_counter()
+    # One budget for the whole document, wherever its Gemini requests are made
+    budget = JobBudget()
+    stage = "toc_extraction"
+    try:
+        # Page scanning already runs in cpu_pool, so the detector stays single-process
+        stage_started = time.perf_counter()
+        # Workers' metric updates are sent back with their results and recorded here
+        toc_result = recorded_result(cpu_pool.submit(run_recorded, extract_toc_stage, gcs_file_path, scan_workers=1))
+        timings[stage] = time.perf_counter() - stage_started
+
+        stage = "tree_generation"
+        stage_started = time.perf_counter()
+        with job_budget(budget), request_limit(llm_slot):
+            tree_result, start_page = generate_tree_stage(toc_result)
+        timings[stage] = time.perf_counter() - stage_started
+
+        stage = "population"
+        stage_started = time.perf_counter()
+        budget.check()
+        remaining_seconds = budget.remaining_seconds()
+        deadline = None if remaining_seconds is None else time.time() + remaining_seconds
+        populated_json, layout, tokens_used = recorded_result(cpu_pool.submit(
+            run_recorded, _populate_in_worker, tree_result, gcs_file_path, start_page, streaming,
+            budget.remaining_tokens(), deadline, llm_slot
+        ))
+        budget.charge_tokens(tokens_used)
+        timings[stage] = time.perf_counter() - stage_started
+
+        stage = "save"
+        stage_started = time.perf_counter()
+        meta = build_meta(gcs_file_path, toc_result, tree_result, layout)
+        report["json_location"] = save_stage(populated_json, gcs_file_path, meta)
+        timings[stage] = time.perf_counter() - stage_started
+        if not report["json_location"]:
+            report["error"] = "Saving the populated JSON failed"
+    except Exception as e:
+        report["error"] = f"{stage}: {e}"
+    timings["total"] = time.perf_counter() - started
+    return report
+
+
+def ingest_batch(
+    gcs_file_paths: list[str],
+    cpu_workers: int | None = None,
+    llm_concurrency: int = 4,
+    streaming: bool = False
+) -> dict:
+    """
+    Ingests many PDFs concurrently.
+
+    TOC page scanning and content population run in a pool of cpu_workers processes,
+    while at most llm_concurrency Gemini requests (TOC trees, and conclusive heading
+    checks made by the workers) are in flight at any time. Each document's requests
+    share one JobBudget. Saving runs on the coordinating threads. Metrics of the
+    work done in the pool's processes are recorded in this process's registry.
+
+    Args:
+        gcs_file_paths: GCS URIs of the PDFs to ingest.
+        cpu_workers: Size of the process pool. Defaults to the CPU count.
+        llm_concurrency: Maximum number of concurrent Gemini requests across the batch.
+        streaming: Populate content in bounded-memory streaming mode.
+
+    Returns:
+        dict with per-document reports ("documents", in input order) and aggregate
+        throughput ("documents_total", "succeeded", "failed", "wall_seconds",
+        "documents_per_second").
+    """
+    cpu_workers = cpu_workers or os.cpu_count() or 1
+    # Enough coordinating threads to keep every CPU worker and LLM slot busy
+    coordinators = cpu_workers + llm_concurrency
+
+    started = time.perf_counter()
+    # The LLM slots live in a manager process, so the pool's workers share them
+    with Manager() as manager, \
+            ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool, \
+            ThreadPoolExecutor(max_workers=coordinators, thread_name_prefix="batch-ingest") as threads:
+        llm_slot = manager.BoundedSemaphore(llm_concurrency)
+        futures = [threads.submit(_ingest_one, path, cpu_pool, llm_slot, streaming) for path in gcs_file_paths]
+        documents = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - started
+
+    succeeded = sum(1 for doc in documents if doc["error"] is None)
+    return {
+        "documents": documents,
+        "documents_total": len(documents),
+        "succeeded": succeeded,
+        "failed": len(documents) - succeeded,
+        "wall_seconds": wall_seconds,
+        "documents_per_second": len(documents) / wall_seconds if wall_seconds else 0.0
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a batch of PDFs from GCS.")
+    parser.add_argument("gcs_paths", nargs="*", help="gs:// URIs of the PDFs (or read one per line from stdin)")
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--metrics-file", default=None, help="Write the batch's Prometheus metrics here when done (e.g. for a textfile collector)")
+    args = parser.parse_args()
+
+    paths = args.gcs_paths or [line.strip() for line in sys.stdin if line.strip()]
+    result = ingest_batch(paths, cpu_workers=args.cpu_workers, llm_concurrency=args.llm_concurrency, streaming=args.streaming)
+    for doc in result["documents"]:
+        status = "ok" if doc["error"] is None else f"FAILED ({doc['error']})"
+        stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in doc["timings"].items())
+        print(f"{doc['gcs_path']}: {status} [{stages}]")
+    print(json.dumps({k: v for k, v in result.items() if k != "documents"}, indent=2))
+    if args.metrics_file:
+        write_to_textfile(args.metrics_file, REGISTRY)
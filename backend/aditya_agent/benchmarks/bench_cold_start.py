@@ -0,0 +1,134 @@
+"""
+Measures cold-start cost: module import time and first-call versus warm-call
+overhead of the shared clients, each in a fresh interpreter.
+
+Scale-to-zero workers pay the import and first-call costs on every cold start,
+so they should stay small: vertexai, GCS clients and the database schema are
+meant to be set up lazily, once per process.
+
+Point --agent-dir at another checkout of backend/aditya_agent (e.g. a git
+worktree of an older commit) to compare before and after a change; call
+measurements that the other tree doesn't support are reported as unavailable.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--repeat 5] [--agent-dir PATH] [--timeout 60] [--json]
+"""
+import os
+import sys
+import re
+import json
+import argparse
+import statistics
+import subprocess
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a worker imports before it can serve its first request
+IMPORTS = ("ingest", "get_relevant_content", "populate_json_content", "generate_tree_structure", "main")
+
+# First call versus a repeat call of each shared client getter, as (label, setup, call)
+CALLS = (
+    ("gemini_client.get_model", "import gemini_client", "gemini_client.get_model()"),
+    ("storage_backend.get_storage_client", "import storage_backend", "storage_backend.get_storage_client('bench')"),
+)
+
+_EXCEPTION_LINE_RE = re.compile(r"^[\w.]*(Error|Exception)\b")
+
+_IMPORT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {agent_dir!r})
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+_CALL_SCRIPT = """
+import sys, time
+sys.path.insert(0, {agent_dir!r})
+{setup}
+started = time.perf_counter()
+{call}
+first = time.perf_counter() - started
+started = time.perf_counter()
+{call}
+print(first, time.perf_counter() - started)
+"""
+
+
+def _run(script: str, cwd: str, timeout: float) -> tuple[list[float] | None, str | None]:
+    """Runs a script in a fresh interpreter; returns the numbers it printed, or an error."""
+    try:
+        proc = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, f"timed out after {timeout:.0f}s"
+    if proc.returncode != 0:
+        # Report the exception line, not whatever the traceback ends with
+        lines = proc.stderr.strip().splitlines() or ["failed"]
+        errors = [line for line in lines if _EXCEPTION_LINE_RE.match(line)]
+        return None, (errors or lines)[-1][:80]
+    return [float(value) for value in proc.stdout.strip().splitlines()[-1].split()], None
+
+
+def measure(agent_dir: str, repeat: int, timeout: float) -> dict:
+    results = {"imports": {}, "calls": {}}
+    # backend/main.py lives one level up and imports its siblings
+    backend_dir = os.path.dirname(agent_dir)
+    for module in IMPORTS:
+        cwd = backend_dir if module == "main" else agent_dir
+        script = _IMPORT_SCRIPT.format(agent_dir=cwd, module=module)
+        samples, error = [], None
+        for _ in range(repeat):
+            values, error = _run(script, cwd, timeout)
+            if error:
+                break
+            samples.append(values[0])
+        results["imports"][module] = {"error": error} if error else {"seconds": round(statistics.median(samples), 4)}
+
+    for label, setup, call in CALLS:
+        script = _CALL_SCRIPT.format(agent_dir=agent_dir, setup=setup, call=call)
+        firsts, warms, error = [], [], None
+        for _ in range(repeat):
+            values, error = _run(script, agent_dir, timeout)
+            if error:
+                break
+            firsts.append(values[0])
+            warms.append(values[1])
+        results["calls"][label] = {"error": error} if error else {
+            "first_seconds": round(statistics.median(firsts), 4),
+            "warm_seconds": round(statistics.median(warms), 6)
+        }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--agent-dir", default=AGENT_DIR, help="The aditya_agent directory to measure")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a measurement is abandoned")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    agent_dir = os.path.abspath(args.agent_dir)
+    results = measure(agent_dir, args.repeat, args.timeout)
+    if args.json:
+        print(json.dumps({"agent_dir": agent_dir, **results}, indent=2))
+        return 0
+
+    print(f"\n{agent_dir} (median of {args.repeat} fresh interpreters)")
+    print(f"  {'import':<40}{'seconds':>12}")
+    for module, row in results["imports"].items():
+        if "error" in row:
+            print(f"  {module:<40}  failed: {row['error']}")
+        else:
+            print(f"  {module:<40}{row['seconds']:>12.3f}")
+    print(f"\n  {'call':<40}{'first s':>12}{'warm s':>12}")
+    for label, row in results["calls"].items():
+        if "error" in row:
+            print(f"  {label:<40}  unavailable: {row['error']}")
+        else:
+            print(f"  {label:<40}{row['first_seconds']:>12.3f}{row['warm_seconds']:>12.6f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Times section placement on a synthetic 2,000-page document.
+
+Compares the original line-by-line matcher from populate_content against
+heading_index.place_sections and checks that both produce the same content.
+
+Usage:
+    python benchmarks/bench_heading_index.py [--pages 2000] [--lines-per-page 45]
+"""
+import os
+import re
+import sys
+import copy
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from heading_index import place_sections, CONCLUSIVE_KEYWORDS  # noqa: E402
+
+
+def legacy_place_sections(ordered_toc, document_lines, headers_footers, stop_heading, is_conclusive):
+    """The matching loop as it was inlined in populate_content, kept as the reference."""
+    doc_lines_count = len(document_lines)
+    line_idx = 0
+
+    def _verify_heading(start_idx, heading_num, heading_title):
+        if start_idx >= doc_lines_count:
+            return (False, -1)
+        line = document_lines[start_idx]
+        if not line.strip().lower().startswith(heading_num.lower()):
+            return (False, -1)
+        normalized_title = "".join(heading_title.lower().split())
+        aggregated_title_lines = []
+        last_line_idx = start_idx
+        for i in range(4):
+            current_idx = start_idx + i
+            if current_idx >= doc_lines_count:
+                break
+            line_text = document_lines[current_idx].strip()
+            if i == 0 and line_text.lower() == heading_num.lower():
+                pass
+            elif i == 0:
+                text_part = re.sub(r'^\s*' + re.escape(heading_num) + r'\s*[:.]?\s*', '', line_text, flags=re.IGNORECASE)
+                aggregated_title_lines.append(text_part)
+            else:
+                if not line_text:
+                    continue
+                aggregated_title_lines.append(line_text)
+            last_line_idx = current_idx
+            built_title_str = "".join(" ".join(aggregated_title_lines).lower().split())
+            if normalized_title in built_title_str:
+                return (True, last_line_idx + 1)
+        return (False, -1)
+
+    def _check_stop_heading(start_idx):
+        if not stop_heading:
+            return False
+        normalized_stop_title = "".join(stop_heading.lower().split())
+        aggregated_lines = []
+        for i in range(3):
+            current_idx = start_idx + i
+            if current_idx >= doc_lines_count:
+                break
+            line_text = document_lines[current_idx].strip()
+            if line_text:
+                aggregated_lines.append(line_text)
+            built_str = "".join(" ".join(aggregated_lines).lower().split())
+            if normalized_stop_title in built_str:
+                return True
+        return False
+
+    for i, current_section in enumerate(ordered_toc):
+        found_heading = False
+        while line_idx < doc_lines_count:
+            is_match, content_start_idx = _verify_heading(line_idx, current_section["number"], current_section["title"])
+            if is_match:
+                found_heading = True
+                line_idx = content_start_idx
+                break
+            line_idx += 1
+        if not found_heading:
+            continue
+        content_lines = []
+        next_section = ordered_toc[i + 1] if i + 1 < len(ordered_toc) else None
+        while line_idx < doc_lines_count:
+            stop = False
+            current_line_text = document_lines[line_idx]
+            if next_section:
+                is_next_match, _ = _verify_heading(line_idx, next_section["number"], next_section["title"])
+                if is_next_match:
+                    stop = True
+            else:
+                if _check_stop_heading(line_idx):
+                    stop = True
+                else:
+                    normalized_line = current_line_text.strip().lower()
+                    if normalized_line:
+                        for keyword in CONCLUSIVE_KEYWORDS:
+                            if keyword in normalized_line:
+                                if is_conclusive(current_line_text):
+                                    stop = True
+                                    break
+            if stop:
+                break
+            if current_line_text.strip() not in headers_footers:
+                content_lines.append(current_line_text)
+            line_idx += 1
+        current_section["node"]["content"] = "\n".join(content_lines).strip()
+
+
+def build_document(pages: int, lines_per_page: int) -> tuple[list[dict], list[str]]:
+    """Builds a three-level numbered TOC and the matching document lines."""
+    sections = []
+    for chapter in range(1, 21):
+        sections.append((f"{chapter}", f"Chapter {chapter} requirements"))
+        for sub in range(1, 11):
+            sections.append((f"{chapter}.{sub}", f"Clause {chapter}.{sub} general provisions"))
+            for leaf in range(1, 6):
+                sections.append((f"{chapter}.{sub}.{leaf}", f"Detail {leaf} of clause {chapter}.{sub}"))
+
+    total_lines = pages * lines_per_page
+    body_per_section = max(1, total_lines // len(sections) - 2)
+    document_lines = []
+    for number, title in sections:
+        document_lines.append(f"{number} {title}")
+        for i in range(body_per_section):
+            if i % lines_per_page == 0:
+                document_lines.append("Standard XYZ-2024")
+            document_lines.append(f"The system shall satisfy requirement {i} in {number} as listed in table {i % 7}.")
+    document_lines.append("Bibliography")
+    document_lines.append("See the index for more.")
+
+    ordered_toc = [{"number": number, "title": title, "node": {"title": title, "content": ""}} for number, title in sections]
+    return ordered_toc, document_lines
+
+
+def _run(place, ordered_toc, document_lines, classify) -> tuple[float, list[str]]:
+    toc = copy.deepcopy(ordered_toc)
+    started = time.perf_counter()
+    place(toc, document_lines, {"Standard XYZ-2024"}, "Bibliography", classify)
+    return time.perf_counter() - started, [section["node"]["content"] for section in toc]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--lines-per-page", type=int, default=45)
+    args = parser.parse_args()
+
+    ordered_toc, document_lines = build_document(args.pages, args.lines_per_page)
+    legacy_s, expected = _run(legacy_place_sections, ordered_toc, document_lines, lambda line: False)
+    indexed_s, actual = _run(place_sections, ordered_toc, document_lines, lambda lines: [False] * len(lines))
+    assert actual == expected, "place_sections output differs from the legacy matcher"
+
+    print(f"{args.pages} pages, {len(document_lines)} lines, {len(ordered_toc)} sections")
+    print(f"  legacy matcher  {legacy_s:8.3f}s")
+    print(f"  heading index   {indexed_s:8.3f}s  ({legacy_s / indexed_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
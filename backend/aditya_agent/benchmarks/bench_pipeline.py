@@ -0,0 +1,255 @@
+"""
+Benchmarks each pipeline stage on synthetic PDFs, fully offline.
+
+Runs extract_toc_pdf, generate_toc_tree_json (via ingest.generate_tree_stage),
+populate_content, save_json_to_gcs and the get_relevant_content lookups
+against a local fake GCS and a deterministic fake Gemini (benchmarks/fakes.py).
+Reports wall time, peak RSS of this process and pages per second for each stage.
+
+Results are compared with a baseline JSON file. The baseline is only ever
+written by --update-baseline, from a real run on the machine that will be
+compared against. The run fails (exit code 1) when a stage is slower or uses
+more memory than the baseline by more than the tolerance.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--pages 300] [--toc-depth 2] [--unnumbered]
+        [--no-headers-footers] [--repeat 3] [--llm-latency 0]
+        [--baseline benchmarks/pipeline_baseline.json] [--update-baseline]
+        [--tolerance 0.25] [--json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import resource
+import statistics
+import threading
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep caches out of the measurement: a fresh PDF cache, and no LLM cache hits
+_WORK_DIR = tempfile.mkdtemp(prefix="bench_pipeline_")
+os.environ["PDF_CACHE_DIR"] = os.path.join(_WORK_DIR, "pdf_cache")
+os.environ.setdefault("LLM_CACHE_BYPASS", "1")
+
+from fakes import FakeGenerativeModel, install_fake_gcs, install_fake_gemini  # noqa: E402
+from synthetic_pdf import generate_pdf  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json")
+STAGES = ("extract_toc_pdf", "generate_toc_tree_json", "populate_content", "save_json_to_gcs", "section_lookups")
+SOURCE_BUCKET = "bench-source"
+OUTPUT_BUCKET = "bench-output"
+
+# Slowdowns smaller than this are noise, whatever the relative change
+_MIN_WALL_DELTA_SECONDS = 0.05
+_MIN_RSS_DELTA_MB = 16.0
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        # No procfs: fall back to the process-wide high-water mark
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+class PeakRss:
+    """Samples this process's RSS in a background thread while a stage runs."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, _current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = _current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, _current_rss_mb())
+
+
+def _measure(stage: str, pages: int, results: dict, fn):
+    with PeakRss() as rss:
+        started = time.perf_counter()
+        value = fn()
+        wall = time.perf_counter() - started
+    results[stage] = {"wall_seconds": wall, "peak_rss_mb": rss.peak_mb, "pages": pages,
+                      "pages_per_second": pages / wall if wall else 0.0}
+    return value
+
+
+def _count_sections(tree) -> list[tuple[str, str]]:
+    """(number, title) of every section of a populated tree."""
+    found = []
+    items = tree.items() if isinstance(tree, dict) else enumerate(tree, start=1)
+    for number, node in items:
+        found.append((str(number), node["title"]))
+        found.extend(_count_sections(node.get("subsections") or {}))
+    return found
+
+
+def run_once(pdf_path: str, page_count: int, name: str) -> dict:
+    """Runs every stage once on a freshly uploaded copy of the PDF."""
+    from toc_extraction import extract_toc_pdf
+    from ingest import generate_tree_stage
+    from populate_json_content import populate_content
+    from save_json import save_json_to_gcs
+    from get_relevant_content import get_section_by_number, get_section_by_title, section_store
+
+    gcs_root = os.path.join(_WORK_DIR, f"gcs_{time.monotonic_ns()}")
+    os.makedirs(gcs_root)
+    gcs = install_fake_gcs(gcs_root)
+    gcs.put_file(SOURCE_BUCKET, f"docs/{name}.pdf", pdf_path)
+    shutil.rmtree(os.environ["PDF_CACHE_DIR"], ignore_errors=True)
+    source_uri = f"gs://{SOURCE_BUCKET}/docs/{name}.pdf"
+
+    results = {}
+    toc_result = _measure("extract_toc_pdf", page_count, results, lambda: extract_toc_pdf(
+        source_bucket=SOURCE_BUCKET, source_blob=f"docs/{name}.pdf",
+        dest_bucket=OUTPUT_BUCKET, dest_blob=f"content_pages/{name}_toc.pdf"
+    ))
+    tree_result, start_page = _measure(
+        "generate_toc_tree_json", len(toc_result["source_pages"]), results,
+        lambda: generate_tree_stage(toc_result, use_outline=False)
+    )
+    populated = _measure("populate_content", page_count - start_page, results, lambda: populate_content(
+        tree_result["json"], source_uri, start_page, tree_result["stop_heading"], tree_result["is_numbered"]
+    ))
+    json_location = _measure("save_json_to_gcs", page_count, results, lambda: save_json_to_gcs(
+        populated, f"gs://{OUTPUT_BUCKET}/Json Files/", name, "bench"
+    ))
+
+    sections = _count_sections(populated)
+
+    def lookups():
+        section_store.invalidate(json_location)
+        hits = 0
+        for number, title in sections:
+            hits += get_section_by_number(json_location, "bench", number) is not None
+            hits += get_section_by_title(json_location, "bench", title) is not None
+        return hits
+
+    hits = _measure("section_lookups", page_count, results, lookups)
+    results["section_lookups"]["lookups"] = 2 * len(sections)
+    results["section_lookups"]["hits"] = hits
+    results["populated_sections"] = sum(1 for node in _iter_nodes(populated) if node.get("content"))
+    results["sections"] = len(sections)
+    return results
+
+
+def _iter_nodes(tree):
+    nodes = tree.values() if isinstance(tree, dict) else tree
+    for node in nodes:
+        yield node
+        yield from _iter_nodes(node.get("subsections") or {})
+
+
+def summarize(runs: list[dict]) -> dict:
+    """Median wall time and largest peak RSS of each stage across runs."""
+    summary = {}
+    for stage in STAGES:
+        wall = statistics.median(run[stage]["wall_seconds"] for run in runs)
+        pages = runs[0][stage]["pages"]
+        summary[stage] = {
+            "wall_seconds": round(wall, 4),
+            "peak_rss_mb": round(max(run[stage]["peak_rss_mb"] for run in runs), 1),
+            "pages": pages,
+            "pages_per_second": round(pages / wall, 1) if wall else 0.0
+        }
+    return summary
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a description of every stage that regressed against the baseline."""
+    regressions = []
+    for stage, current in summary.items():
+        reference = baseline.get(stage)
+        if not reference:
+            continue
+        wall_delta = current["wall_seconds"] - reference["wall_seconds"]
+        if wall_delta > _MIN_WALL_DELTA_SECONDS and current["wall_seconds"] > reference["wall_seconds"] * (1 + tolerance):
+            regressions.append(f"{stage}: wall {reference['wall_seconds']:.3f}s -> {current['wall_seconds']:.3f}s")
+        rss_delta = current["peak_rss_mb"] - reference["peak_rss_mb"]
+        if rss_delta > _MIN_RSS_DELTA_MB and current["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {reference['peak_rss_mb']:.0f}MB -> {current['peak_rss_mb']:.0f}MB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--toc-depth", type=int, default=2)
+    parser.add_argument("--unnumbered", action="store_true")
+    parser.add_argument("--no-headers-footers", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per Gemini call")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown / memory growth")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    scenario = f"pages={args.pages},depth={args.toc_depth},{'unnumbered' if args.unnumbered else 'numbered'}," \
+               f"{'plain' if args.no_headers_footers else 'headers'},llm={args.llm_latency}"
+    install_fake_gemini(args.llm_latency)
+    try:
+        doc = generate_pdf(
+            os.path.join(_WORK_DIR, "synthetic.pdf"), pages=args.pages, toc_depth=args.toc_depth,
+            numbered=not args.unnumbered, headers_footers=not args.no_headers_footers
+        )
+        runs = [run_once(doc.path, doc.page_count, f"synthetic_{i}") for i in range(args.repeat)]
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+    summary = summarize(runs)
+    if args.json:
+        print(json.dumps({"scenario": scenario, "stages": summary}, indent=2))
+    else:
+        print(f"\n{scenario}: {doc.page_count} pages, {runs[0]['sections']} sections, "
+              f"{runs[0]['populated_sections']} populated, {FakeGenerativeModel.calls} model calls")
+        print(f"  {'stage':<24}{'wall s':>10}{'peak RSS MB':>14}{'pages/s':>12}")
+        for stage, row in summary.items():
+            print(f"  {stage:<24}{row['wall_seconds']:>10.3f}{row['peak_rss_mb']:>14.1f}{row['pages_per_second']:>12.1f}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        baselines[scenario] = summary
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline for {scenario} written to {args.baseline}")
+        return 0
+
+    if scenario not in baselines:
+        print(f"No baseline for {scenario}; record one with --update-baseline.")
+        return 0
+    regressions = compare(summary, baselines[scenario], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions against the baseline (tolerance {args.tolerance:.0%}).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Times TOC page detection on synthetic 1,000+ page PDFs.
+
+Compares the original per-line, per-pattern scan against toc_detector with a
+single process and with a worker pool, and checks that all return the same pages.
+
+Usage:
+    python benchmarks/bench_toc_detector.py [--pages 1200] [--workers 8]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from toc_detector import detect_toc_pages, TOC_KEYWORDS, TOC_LINE_PATTERNS  # noqa: E402
+
+
+def legacy_find_toc_pages(doc, min_matches_first_page=5, min_matches_next_page=1) -> list[int]:
+    """The detector as it was inlined in extract_toc_pdf, kept as the reference."""
+    patterns = [re.compile(p) for p in TOC_LINE_PATTERNS]
+    toc_page_numbers = []
+    first_found = False
+    for page_num in range(doc.page_count):
+        text = doc[page_num].get_text(sort=True)
+        lines = text.strip().split("\n")
+        matches = sum(1 for line in lines if any(p.search(line) for p in patterns))
+        if not first_found:
+            if any(kw in text.lower() for kw in TOC_KEYWORDS) and matches >= min_matches_first_page:
+                first_found = True
+                toc_page_numbers.append(page_num + 1)
+        else:
+            if matches >= min_matches_next_page:
+                toc_page_numbers.append(page_num + 1)
+            else:
+                break
+    return toc_page_numbers
+
+
+def build_pdf(path: str, pages: int, with_toc: bool):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        if with_toc and page_num in (2, 3, 4):
+            lines = ["Table of Contents"] if page_num == 2 else []
+            for i in range(40):
+                lines.append(f"{page_num}.{i + 1} Section heading number {i + 1} ........ {10 + i}")
+        else:
+            lines = [f"Body text line {i} on page {page_num} describing requirements in prose." for i in range(45)]
+        page.insert_text((40, 40), "\n".join(lines), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def _time(fn) -> tuple[float, list[int]]:
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for with_toc in (True, False):
+            path = os.path.join(tmp, f"synthetic_{with_toc}.pdf")
+            build_pdf(path, args.pages, with_toc)
+            label = "with TOC" if with_toc else "no TOC"
+
+            with fitz.open(path) as doc:
+                legacy_s, expected = _time(lambda: legacy_find_toc_pages(doc))
+            serial_s, serial = _time(lambda: detect_toc_pages(path, workers=1))
+            pool_s, pooled = _time(lambda: detect_toc_pages(path, workers=args.workers))
+
+            assert serial == expected and pooled == expected, (expected, serial, pooled)
+            print(f"{args.pages} pages, {label}: pages={expected}")
+            print(f"  legacy scan         {legacy_s:8.3f}s")
+            print(f"  detector, 1 process {serial_s:8.3f}s")
+            print(f"  detector, {args.workers} workers {pool_s:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Offline stand-ins for Google Cloud Storage and Gemini, for the benchmarks.
+
+install_fake_gcs() replaces the storage clients with one backed by a
+local directory. It implements the subset of the API the pipeline uses, including
+generations and if_generation_match preconditions. install_fake_gemini() replaces
+the Vertex AI model in the pipeline modules with a deterministic one. It answers
+the TOC-tree prompt by parsing the TOC PDF it is given, and classifies every
+conclusive-keyword line as a heading only if it is short and title-cased.
+"""
+import io
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import fitz  # PyMuPDF
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+
+class FakeGCS:
+    """A directory of buckets holding blobs as plain files, with per-blob generations."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._generations: dict[tuple[str, str], int] = {}
+        self._updated: dict[tuple[str, str], datetime] = {}
+        self._lock = threading.Lock()
+        self._next_generation = 1
+
+    def path(self, bucket: str, name: str) -> str:
+        return os.path.join(self.root, bucket, *name.split("/"))
+
+    def generation(self, bucket: str, name: str) -> int | None:
+        return self._generations.get((bucket, name))
+
+    def commit(self, bucket: str, name: str, source_path: str, if_generation_match: int | None = None):
+        """Atomically moves a written temp file into place, honouring the precondition."""
+        with self._lock:
+            current = self._generations.get((bucket, name), 0)
+            if if_generation_match is not None and if_generation_match != current:
+                os.remove(source_path)
+                raise PreconditionFailed(f"gs://{bucket}/{name}: generation is {current}")
+            target = self.path(bucket, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source_path, target)
+            self._generations[(bucket, name)] = self._next_generation
+            self._updated[(bucket, name)] = datetime.now(timezone.utc)
+            self._next_generation += 1
+
+    def put_file(self, bucket: str, name: str, local_path: str):
+        """Seeds the fake with a local file."""
+        fd, tmp = tempfile.mkstemp(dir=self.root)
+        os.close(fd)
+        shutil.copyfile(local_path, tmp)
+        self.commit(bucket, name, tmp)
+
+
+class _FakeWriter(io.BufferedWriter):
+    """Buffers a streamed upload in a temp file and commits it on close."""
+
+    def __init__(self, blob, if_generation_match: int | None):
+        fd, self._tmp = tempfile.mkstemp(dir=blob._gcs.root)
+        super().__init__(io.FileIO(fd, "wb"))
+        self._blob = blob
+        self._if_generation_match = if_generation_match
+
+    def flush(self):
+        pass  # Like BlobWriter(ignore_flush=True): data is only sent on close
+
+    def close(self):
+        if self.closed:
+            return
+        super().flush()
+        super().close()
+        self._blob._gcs.commit(self._blob.bucket.name, self._blob.name, self._tmp, self._if_generation_match)
+
+
+class FakeBlob:
+    def __init__(self, bucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self._gcs = bucket._gcs
+
+    @property
+    def generation(self) -> int | None:
+        return self._gcs.generation(self.bucket.name, self.name)
+
+    @property
+    def updated(self) -> datetime | None:
+        return self._gcs._updated.get((self.bucket.name, self.name))
+
+    @property
+    def _path(self) -> str:
+        return self._gcs.path(self.bucket.name, self.name)
+
+    def exists(self, **kwargs) -> bool:
+        return self.generation is not None
+
+    def reload(self, **kwargs):
+        if not self.exists():
+            raise NotFound(f"gs://{self.bucket.name}/{self.name}")
+
+    def _write_bytes(self, data: bytes, if_generation_match: int | None):
+        fd, tmp = tempfile.mkstemp(dir=self._gcs.root)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._gcs.commit(self.bucket.name, self.name, tmp, if_generation_match)
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        self._write_bytes(data.encode("utf-8") if isinstance(data, str) else data, if_generation_match)
+
+    def upload_from_file(self, file_obj, content_type=None, if_generation_match=None, **kwargs):
+        self._write_bytes(file_obj.read(), if_generation_match)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        self.reload()
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    def download_as_text(self, **kwargs) -> str:
+        return self.download_as_bytes().decode("utf-8")
+
+    def download_to_filename(self, filename: str, if_generation_match=None, **kwargs):
+        self.reload()
+        if if_generation_match is not None and if_generation_match != self.generation:
+            raise PreconditionFailed(f"gs://{self.bucket.name}/{self.name} changed")
+        shutil.copyfile(self._path, filename)
+
+    def open(self, mode: str = "r", chunk_size=None, ignore_flush=False, content_type=None, if_generation_match=None, **kwargs):
+        if mode == "rb":
+            self.reload()
+            return open(self._path, "rb")
+        if mode == "wb":
+            return _FakeWriter(self, if_generation_match)
+        raise ValueError(f"Unsupported mode: {mode}")
+
+
+class FakeBucket:
+    def __init__(self, gcs: FakeGCS, name: str):
+        self._gcs = gcs
+        self.name = name
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str, **kwargs) -> FakeBlob | None:
+        blob = self.blob(name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix: str = "", fields=None, **kwargs):
+        names = sorted(name for bucket, name in list(self._gcs._generations) if bucket == self.name and name.startswith(prefix))
+        return [self.blob(name) for name in names]
+
+
+class FakeStorageClient:
+    def __init__(self, gcs: FakeGCS, project=None, **kwargs):
+        self._gcs = gcs
+        self.project = project
+
+    def bucket(self, name: str) -> FakeBucket:
+        return FakeBucket(self._gcs, name)
+
+
+def install_fake_gcs(root: str) -> FakeGCS:
+    """Routes every storage client created from now on to a directory-backed fake."""
+    from google.cloud import storage
+    import storage_backend
+
+    gcs = FakeGCS(root)
+    storage.Client = lambda project=None, **kwargs: FakeStorageClient(gcs, project, **kwargs)
+    # The pipeline shares pooled clients; drop any created against an earlier fake
+    storage_backend._create_gcs_client = lambda project_id: FakeStorageClient(gcs, project_id)
+    storage_backend.reset_clients()
+    return gcs
+
+
+# --- Gemini ---
+
+_NUMBERED_ENTRY_RE = re.compile(r'^\s*(\d+(?:\.\d+)*)\s+(.+?)\s*\.{2,}\s*\d+\s*$')
+_ENTRY_RE = re.compile(r'^\s*(.+?)\s*\.{2,}\s*\d+\s*$')
+
+
+class FakePart:
+    def __init__(self, data: bytes | None = None, uri: str | None = None):
+        self.data = data
+        self.uri = uri
+
+    @classmethod
+    def from_data(cls, data: bytes, mime_type: str):
+        return cls(data=data)
+
+    @classmethod
+    def from_uri(cls, uri: str, mime_type: str):
+        return cls(uri=uri)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Deterministic replacement for vertexai's GenerativeModel."""
+
+    latency_seconds = 0.0
+    calls = 0
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, **kwargs) -> _FakeResponse:
+        FakeGenerativeModel.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if isinstance(contents, list):
+            return _FakeResponse(json.dumps(self._toc_tree(contents[1])))
+        return _FakeResponse(json.dumps(self._conclusive_verdicts(contents)))
+
+    @staticmethod
+    def _pdf_bytes(part: FakePart) -> bytes:
+        if part.data is not None:
+            return part.data
+        from storage_backend import get_storage_client
+        bucket, name = part.uri.removeprefix("gs://").split("/", 1)
+        return get_storage_client(None).bucket(bucket).blob(name).download_as_bytes()
+
+    def _toc_tree(self, part: FakePart) -> dict:
+        numbered_entries, titles, last_toc_page = [], [], -1
+        with fitz.open(stream=self._pdf_bytes(part), filetype="pdf") as doc:
+            for page_idx, page in enumerate(doc):
+                found = False
+                for line in page.get_text(sort=True).split("\n"):
+                    if match := _NUMBERED_ENTRY_RE.match(line):
+                        numbered_entries.append((match.group(1), match.group(2)))
+                        found = True
+                    elif match := _ENTRY_RE.match(line):
+                        titles.append((len(numbered_entries), match.group(1)))
+                        found = True
+                if found:
+                    last_toc_page = page_idx
+
+        if numbered_entries:
+            tree = {}
+            nodes = {}
+            for number, title in numbered_entries:
+                node = {"title": title, "content": "", "subsections": {}}
+                parent = nodes.get(number.rsplit(".", 1)[0]) if "." in number else None
+                (parent["subsections"] if parent else tree)[number] = node
+                nodes[number] = node
+            # The first un-numbered entry after the numbered ones ends the main content
+            stop = next((title for position, title in titles if position == len(numbered_entries)), None)
+            return {"toc_tree": tree, "is_numbered": True, "last_toc_page": last_toc_page, "stop_heading": stop}
+
+        tree = [{"title": title, "content": "", "subsections": []} for _, title in titles]
+        return {"toc_tree": tree, "is_numbered": False, "last_toc_page": last_toc_page, "stop_heading": None}
+
+    @staticmethod
+    def _conclusive_verdicts(prompt: str) -> list[bool]:
+        # The lines are the first JSON array in the prompt
+        start = prompt.index("[")
+        lines, _ = json.JSONDecoder().raw_decode(prompt[start:])
+        return [len(line.split()) <= 4 and not line.rstrip().endswith(".") for line in lines]
+
+
+def install_fake_gemini(latency_seconds: float = 0.0):
+    """Points the pipeline modules at the deterministic fake model."""
+    import gemini_client
+
+    FakeGenerativeModel.latency_seconds = latency_seconds
+    # Setting the classes also stops gemini_client from importing and initializing vertexai
+    gemini_client.GenerativeModel = FakeGenerativeModel
+    gemini_client.Part = FakePart
+    gemini_client._models.clear()
@@ -0,0 +1,125 @@
+"""
+Generates synthetic technical-standard PDFs for the benchmarks.
+
+A document has a cover page, a table of contents, numbered (or un-numbered)
+chapters with nested sections, and a closing bibliography that acts as the
+stop heading. Pages can carry a repeated header and footer.
+"""
+import random
+from dataclasses import dataclass, field
+
+import fitz  # PyMuPDF
+
+HEADER = "ACME Engineering Standard AES-1000:2024"
+FOOTER = "Copyright ACME Corporation - All rights reserved"
+STOP_HEADING = "Bibliography"
+
+_WORDS = (
+    "the", "system", "shall", "provide", "requirement", "interface", "component", "value",
+    "test", "specified", "operation", "design", "maximum", "minimum", "temperature",
+    "pressure", "procedure", "compliance", "document", "measurement", "limit", "control"
+)
+_LINES_PER_PAGE = 48
+_TOC_ENTRIES_PER_PAGE = 40
+
+
+@dataclass
+class SyntheticDocument:
+    path: str
+    page_count: int
+    toc_pages: list[int]  # 0-based
+    numbered: bool
+    sections: list[tuple[str, str]] = field(default_factory=list)  # (number or "", title) in order
+
+
+def _section_numbers(chapters: int, depth: int, fanout: int) -> list[str]:
+    numbers = []
+
+    def add(prefix: str, level: int):
+        for i in range(1, fanout + 1):
+            number = f"{prefix}.{i}"
+            numbers.append(number)
+            if level < depth:
+                add(number, level + 1)
+
+    for chapter in range(1, chapters + 1):
+        numbers.append(str(chapter))
+        if depth > 1:
+            add(str(chapter), 2)
+    return numbers
+
+
+def generate_pdf(
+    path: str,
+    pages: int = 300,
+    toc_depth: int = 2,
+    numbered: bool = True,
+    headers_footers: bool = True,
+    fanout: int = 3,
+    seed: int = 0
+) -> SyntheticDocument:
+    """
+    Writes a synthetic PDF of roughly the requested number of pages.
+
+    Args:
+        path: Where to save the PDF.
+        pages: Approximate total page count.
+        toc_depth: Heading levels below each chapter (1 = chapters only).
+        numbered: Number headings ("3.2 Title") or leave them un-numbered.
+        headers_footers: Repeat a header and footer line on every content page.
+        fanout: Sub-sections per section at each level.
+        seed: Seed for the body text, so runs are reproducible.
+    """
+    rnd = random.Random(seed)
+    per_chapter = sum(fanout ** level for level in range(toc_depth))
+    # Aim for about two pages of body per section
+    chapters = max(1, pages // (per_chapter * 2 + 1))
+    numbers = _section_numbers(chapters, toc_depth, fanout)
+    # Titles end in a word: a trailing number would make body headings look like TOC entries
+    sections = [
+        (number if numbered else "", f"{rnd.choice(_WORDS).title()} {rnd.choice(_WORDS)} {idx} {rnd.choice(_WORDS)}")
+        for idx, number in enumerate(numbers, start=1)
+    ]
+    toc_page_count = -(-(len(sections) + 1) // _TOC_ENTRIES_PER_PAGE)
+    body_lines_per_section = max(1, (pages - 1 - toc_page_count - 1) * _LINES_PER_PAGE // len(sections) - 1)
+
+    # Lay out the body first so the TOC can show page numbers
+    body_lines = []
+    for number, title in sections:
+        heading = f"{number} {title}" if numbered else title
+        body_lines.append((heading, len(body_lines)))
+        for _ in range(rnd.randint(body_lines_per_section // 2, body_lines_per_section * 3 // 2)):
+            body_lines.append((" ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(6, 12))) + ".", None))
+    body_lines.append((STOP_HEADING, None))
+    body_lines.extend((f"[{i}] Reference document {i}.", None) for i in range(1, 20))
+
+    first_body_page = 1 + toc_page_count
+    body_page_of = lambda line_idx: first_body_page + line_idx // _LINES_PER_PAGE  # noqa: E731
+
+    toc_lines = []
+    for (number, title), (_, line_idx) in zip(sections, (line for line in body_lines if line[1] is not None)):
+        entry = f"{number} {title}" if numbered else title
+        toc_lines.append(f"{entry} {'.' * 8} {body_page_of(line_idx) + 1}")
+    toc_lines.append(f"{STOP_HEADING} {'.' * 8} {body_page_of(len(body_lines) - 20) + 1}")
+
+    doc = fitz.open()
+    cover = doc.new_page()
+    cover.insert_text((72, 200), "AES-1000\nSynthetic Engineering Standard", fontsize=20)
+
+    for page_idx in range(toc_page_count):
+        page = doc.new_page()
+        entries = toc_lines[page_idx * _TOC_ENTRIES_PER_PAGE:(page_idx + 1) * _TOC_ENTRIES_PER_PAGE]
+        title = ["Table of Contents"] if page_idx == 0 else []
+        page.insert_text((50, 50), "\n".join(title + entries), fontsize=9)
+
+    for start in range(0, len(body_lines), _LINES_PER_PAGE):
+        page = doc.new_page()
+        lines = [text for text, _ in body_lines[start:start + _LINES_PER_PAGE]]
+        if headers_footers:
+            lines = [HEADER] + lines + [FOOTER, f"Page {doc.page_count}"]
+        page.insert_text((50, 40), "\n".join(lines), fontsize=8)
+
+    doc.save(path)
+    result = SyntheticDocument(path, doc.page_count, list(range(1, first_body_page)), numbered, sections)
+    doc.close()
+    return result
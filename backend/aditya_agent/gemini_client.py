@@ -0,0 +1,215 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from google.api_core import exceptions as api_exceptions
+from metrics import llm_call, count_llm_tokens
+
+PROJECT_ID = "big-depth-471018-r6"
+LOCATION = "us-central1"
+MODEL_NAME = "gemini-2.5-pro"
+
+# Gemini requests in flight across the whole process, whatever the number of jobs
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8))
+
+# Retries of transient errors, with full-jitter exponential backoff
+MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = float(os.environ.get("GEMINI_BACKOFF_BASE_SECONDS", 1.0))
+BACKOFF_MAX_SECONDS = float(os.environ.get("GEMINI_BACKOFF_MAX_SECONDS", 60.0))
+
+# PDFs larger than this are referenced by GCS uri rather than sent inline, which
+# would make the request itself that large (Vertex AI caps inline data)
+INLINE_PDF_MAX_BYTES = int(os.environ.get("GEMINI_INLINE_PDF_MAX_BYTES", 8 * 1024 ** 2))
+
+# Default per-job budgets; unset means unlimited
+JOB_MAX_TOKENS = int(os.environ["GEMINI_JOB_MAX_TOKENS"]) if os.environ.get("GEMINI_JOB_MAX_TOKENS") else None
+JOB_MAX_SECONDS = float(os.environ["GEMINI_JOB_MAX_SECONDS"]) if os.environ.get("GEMINI_JOB_MAX_SECONDS") else None
+
+# Quota, overload and server-side errors that are worth trying again
+TRANSIENT_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.Aborted,
+)
+
+# vertexai takes seconds to import, so it is loaded (and initialized) on the first request
+GenerativeModel = None
+Part = None
+_vertexai_lock = threading.Lock()
+
+_models = {}
+_models_lock = threading.Lock()
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_current_budget = contextvars.ContextVar("gemini_job_budget", default=None)
+_current_request_limit = contextvars.ContextVar("gemini_request_limit", default=None)
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+class JobBudget:
+    """
+    Token and wall-time allowance of one ingestion job's Gemini requests.
+
+    The clock starts when the budget is created. Requests are refused once
+    either limit is reached; a request already in flight is allowed to finish.
+    """
+
+    def __init__(self, max_tokens: int | None = JOB_MAX_TOKENS, max_seconds: float | None = JOB_MAX_SECONDS):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.tokens_used = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def remaining_seconds(self) -> float | None:
+        if self.max_seconds is None:
+            return None
+        return self.max_seconds - (time.monotonic() - self.started_at)
+
+    def check(self):
+        """Raises BudgetExceededError if no more requests may be made."""
+        if self.max_tokens is not None and self.tokens_used >= self.max_tokens:
+            raise BudgetExceededError(f"Gemini token budget of {self.max_tokens} exhausted")
+        remaining = self.remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            raise BudgetExceededError(f"Gemini time budget of {self.max_seconds}s exhausted")
+
+    def remaining_tokens(self) -> int | None:
+        if self.max_tokens is None:
+            return None
+        return max(self.max_tokens - self.tokens_used, 0)
+
+    def charge(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        tokens = getattr(usage, "total_token_count", 0) if usage is not None else 0
+        self.charge_tokens(tokens or 0)
+
+    def charge_tokens(self, tokens: int):
+        """Charges tokens used elsewhere, e.g. by a worker process given the remaining allowance."""
+        with self._lock:
+            self.tokens_used += tokens
+
+
+@contextmanager
+def job_budget(budget: JobBudget):
+    """Applies budget to every Gemini request made in this thread (or task) until the block exits."""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+@contextmanager
+def request_limit(slot):
+    """
+    Holds slot around every Gemini request made in this thread (or task) until the
+    block exits, on top of the process-wide limit. slot is a semaphore, possibly
+    shared by several processes (e.g. from a multiprocessing Manager).
+    """
+    token = _current_request_limit.set(slot)
+    try:
+        yield slot
+    finally:
+        _current_request_limit.reset(token)
+
+
+def _load_vertexai():
+    """Imports vertexai and initializes it for the project, once per process."""
+    global GenerativeModel, Part
+    if GenerativeModel is not None:
+        return
+    with _vertexai_lock:
+        if GenerativeModel is None:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel as model_class, Part as part_class
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            Part = part_class
+            GenerativeModel = model_class
+
+
+def pdf_part(data: bytes | None = None, uri: str | None = None):
+    """Returns a PDF request part, sent inline from data or referenced by its GCS uri."""
+    _load_vertexai()
+    if data is not None:
+        return Part.from_data(data=data, mime_type="application/pdf")
+    return Part.from_uri(uri, mime_type="application/pdf")
+
+
+def get_model(model_name: str = MODEL_NAME):
+    """Returns the process-wide GenerativeModel for model_name, creating it on first use."""
+    model = _models.get(model_name)
+    if model is None:
+        _load_vertexai()
+        with _models_lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = GenerativeModel(model_name)
+    return model
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def generate_content(contents, purpose: str, model_name: str = MODEL_NAME, **kwargs):
+    """
+    Sends one request to Gemini through the shared client layer.
+
+    At most MAX_CONCURRENT_REQUESTS requests are in flight at once. Transient
+    errors (quota, overload, server errors, timeouts) are retried up to
+    MAX_RETRIES times with jittered exponential backoff; other errors are
+    raised immediately. The current job budget, if any, is checked before
+    each attempt and charged with the tokens each response reports, and the
+    current request_limit slot, if any, is held during each attempt.
+
+    Args:
+        contents: The prompt, as accepted by GenerativeModel.generate_content.
+        purpose: Short label of what the request is for, used in metrics.
+        model_name: The Gemini model to use.
+        **kwargs: Passed on to GenerativeModel.generate_content.
+
+    Returns:
+        The model response.
+
+    Raises:
+        BudgetExceededError: If the job's token or time budget is used up.
+    """
+    budget = _current_budget.get()
+    limit = _current_request_limit.get()
+    model = get_model(model_name)
+    for attempt in range(MAX_RETRIES + 1):
+        if budget:
+            budget.check()
+        remaining = budget.remaining_seconds() if budget else None
+        if not _request_slots.acquire(timeout=remaining):
+            raise BudgetExceededError(f"Gemini time budget of {budget.max_seconds}s ran out waiting for a request slot")
+        if limit is not None and not limit.acquire(timeout=budget.remaining_seconds() if budget else None):
+            _request_slots.release()
+            raise BudgetExceededError(f"Gemini time budget of {budget.max_seconds}s ran out waiting for a request slot")
+        try:
+            with llm_call(model_name, purpose):
+                response = model.generate_content(contents, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            delay = _backoff_seconds(attempt)
+            remaining = budget.remaining_seconds() if budget else None
+            if attempt == MAX_RETRIES or (remaining is not None and remaining < delay):
+                raise
+            print(f"Gemini request failed ({e}); retrying in {delay:.1f}s...")
+        else:
+            count_llm_tokens(model_name, purpose, response)
+            if budget:
+                budget.charge(response)
+            return response
+        finally:
+            if limit is not None:
+                limit.release()
+            _request_slots.release()
+        time.sleep(delay)
@@ -1,21 +1,33 @@
+import re
 import json
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from llm_cache import LLMCache, make_cache_key
+from gemini_client import MODEL_NAME, INLINE_PDF_MAX_BYTES, generate_content, pdf_part
 
-# Initialize Vertex AI
-vertexai.init(
-    project="big-depth-471018-r6",
-    location="us-central1"
-)
+_toc_tree_cache = None
 
-def generate_toc_tree_json(pdf_gcs_path: str, use_flag: bool) -> dict:
+
+def get_toc_tree_cache() -> LLMCache:
+    """Returns the persistent response cache for TOC tree generation."""
+    global _toc_tree_cache
+    if _toc_tree_cache is None:
+        _toc_tree_cache = LLMCache("toc_tree")
+    return _toc_tree_cache
+
+
+def generate_toc_tree_json(pdf_gcs_path: str | None, use_flag: bool, toc_sha256: str | None = None, bypass_cache: bool = False, pdf_bytes: bytes | None = None) -> dict:
     """
     Generates a hierarchical JSON structure from a TOC PDF using Gemini.
     The model also identifies the heading that marks the end of the main content.
 
     Args:
-        pdf_gcs_path (str): GCS path to the PDF (e.g., gs://bucket_name/path/to.pdf).
+        pdf_gcs_path (str | None): GCS path to the PDF (e.g., gs://bucket_name/path/to.pdf).
+            When given, the model reads the PDF from there. Not needed when pdf_bytes is given.
         use_flag (bool): Boolean flag to decide which prompt style to use.
+        toc_sha256 (str | None): Hash of the TOC pages' content (see extract_toc_pdf). When
+            given, successful responses are cached under it together with the prompt, model
+            name and use_flag, and an unchanged TOC is answered without calling the model.
+        bypass_cache (bool): Always call the model, ignoring cached responses.
+        pdf_bytes (bytes | None): The TOC PDF itself, sent inline when it hasn't been uploaded.
 
     Returns:
         dict: {
@@ -26,8 +38,6 @@ def generate_toc_tree_json(pdf_gcs_path: str, use_flag: bool) -> dict:
         }
     """
 
-    model = GenerativeModel("gemini-2.5-pro")
-
     # --- Prompt when use_flag = True ---
     prompt_case_true = """
     You are given a PDF document where most, if not all, pages are expected to be from a Table of Contents (TOC).
@@ -161,12 +171,27 @@ def generate_toc_tree_json(pdf_gcs_path: str, use_flag: bool) -> dict:
     # Select prompt
     prompt = prompt_case_true if use_flag else prompt_case_false
 
-    # Attach PDF from GCS
-    pdf_file = Part.from_uri(pdf_gcs_path, mime_type="application/pdf")
+    cache_key = None
+    if toc_sha256:
+        cache_key = make_cache_key(toc_sha256, prompt, MODEL_NAME, use_flag)
+        cached = get_toc_tree_cache().get(cache_key, bypass=bypass_cache)
+        if cached is not None:
+            print("Using cached TOC tree response.")
+            return cached
+
+    # Reference the uploaded copy when there is one, so the request stays small; inline otherwise
+    if pdf_gcs_path:
+        pdf_file = pdf_part(uri=pdf_gcs_path)
+    else:
+        if len(pdf_bytes) > INLINE_PDF_MAX_BYTES:
+            print(f"Sending a {len(pdf_bytes)}-byte TOC PDF inline; upload it to send it by reference instead.")
+        pdf_file = pdf_part(data=pdf_bytes)
 
     # Call Gemini
-    response = model.generate_content(
+    response = generate_content(
         [prompt, pdf_file],
+        purpose="toc_tree",
+        model_name=MODEL_NAME,
         generation_config={"response_mime_type": "application/json"}
     )
 
@@ -195,10 +220,102 @@ def generate_toc_tree_json(pdf_gcs_path: str, use_flag: bool) -> dict:
         result["last_toc_page"] = parsed_json.get("last_toc_page", -1)
         result["stop_heading"] = parsed_json.get("stop_heading") # Returns None if key is missing or value is null
 
+        if cache_key:
+            get_toc_tree_cache().set(cache_key, result)
         return result
 
     except json.JSONDecodeError:
         # Handle cases where the response is not valid JSON
         result["json"] = "Error: Failed to decode JSON from model response."
         print(f"DEBUG: Invalid JSON received: {raw_text}")
-        return result
\ No newline at end of file
+        return result
+
+# Matches numbered outline titles such as "3 Scope" or "4.2. Requirements". The
+# top-level number is capped and the title must not start with a digit, so
+# "2020 Overview" or "1 000 samples" aren't taken for numbered headings.
+_NUMBERED_TITLE_RE = re.compile(r'^\s*(\d{1,3}(?:\.\d+)*)\.?\s+([^\d\s].*?)\s*$')
+
+# Annex entries ("Annex B", "Appendix C: Data", "A.1 Tables") are back matter: like
+# the 'Appendix' stop heading the Gemini prompt asks for, the first one ends the main
+# content, and they are left out of the numbered tree
+_ANNEX_TITLE_RE = re.compile(r'^\s*(?:(?:annex|appendix)\b|[A-Z](?:\.\d+)+\.?\s)', flags=re.IGNORECASE)
+
+
+def generate_toc_tree_from_outline(outline: list) -> dict | None:
+    """
+    Builds the generate_toc_tree_json result from a PDF's embedded bookmark outline.
+
+    Args:
+        outline: The output of PyMuPDF's doc.get_toc(): [level, title, page] entries
+            with 1-based page numbers.
+
+    Returns:
+        The same dict as generate_toc_tree_json, with "last_toc_page" as the 0-based
+        index of the page just before the main content, or None if the outline is
+        missing or too sparse to stand in for the TOC.
+    """
+    entries = [
+        (level, title.strip(), page)
+        for level, title, page, *_ in outline or []
+        if title and title.strip() and page >= 1
+    ]
+    if len(entries) < 2:
+        return None
+
+    numbered = [(_NUMBERED_TITLE_RE.match(title), level, title, page) for level, title, page in entries]
+    numbered_count = sum(1 for match, *_ in numbered if match)
+    annex_count = sum(1 for _, title, _ in entries if _ANNEX_TITLE_RE.match(title))
+
+    result = {
+        "json": {},
+        "is_numbered": numbered_count > 0 and numbered_count * 2 >= len(entries) - annex_count,
+        "last_toc_page": -1,
+        "stop_heading": None
+    }
+
+    if result["is_numbered"]:
+        # Nest by number prefix, so "4.2" lands under "4" whatever the outline levels say
+        tree = {}
+        nodes = {}
+        first_page = None
+        top_level = None
+        last_numbered_idx = -1
+        for idx, (match, level, title, page) in enumerate(numbered):
+            if first_page is not None and _ANNEX_TITLE_RE.match(title):
+                break
+            if not match:
+                continue
+            number, heading = match.group(1), match.group(2)
+            if number in nodes:
+                continue
+            node = {"title": heading, "content": "", "subsections": {}}
+            parent = nodes.get(number.rsplit(".", 1)[0]) if "." in number else None
+            (parent["subsections"] if parent else tree)[number] = node
+            nodes[number] = node
+            if first_page is None:
+                first_page = page
+                top_level = level
+            last_numbered_idx = idx
+
+        # The first un-numbered heading at chapter level, or the first annex, after the last numbered one
+        for match, level, title, page in numbered[last_numbered_idx + 1:]:
+            if not match and (level <= top_level or _ANNEX_TITLE_RE.match(title)):
+                result["stop_heading"] = title
+                break
+
+        result["json"] = tree
+        result["last_toc_page"] = first_page - 2
+    else:
+        # Nest by outline level
+        tree = []
+        stack = [(0, tree)]
+        for level, title, page in entries:
+            node = {"title": title, "content": "", "subsections": []}
+            while len(stack) > 1 and stack[-1][0] >= level:
+                stack.pop()
+            stack[-1][1].append(node)
+            stack.append((level, node["subsections"]))
+        result["json"] = tree
+        result["last_toc_page"] = entries[0][2] - 2
+
+    return result
@@ -1,38 +1,64 @@
-from google.cloud import storage
-import json
-
-def _read_json_from_gcs(gcs_path: str, project_id: str) -> dict | None:
+from storage_backend import get_storage_client
+from metrics import count_bytes
+import threading
+from collections import OrderedDict
+from json_storage import DOWNLOAD_CHUNK_SIZE, read_envelope
+from section_store import SectionStore
+from search_index import SectionSearchIndex, load_search_index_from_gcs
+
+def read_envelope_from_gcs(gcs_path: str, project_id: str) -> dict | None:
     """
-    Downloads and reads a JSON file from a GCS path.
+    Downloads and decodes a populated JSON file of any format version from a GCS path.
+
+    The blob is streamed through a chunked reader, decompressed and parsed one
+    top-level section at a time, so neither the download nor the decompressed
+    text is ever held whole.
 
     Args:
-        gcs_path: The full GCS path (e.g., "gs://bucket-name/folder/file.json").
+        gcs_path: The full GCS path (e.g., "gs://bucket-name/folder/file.json.gz").
         project_id: The Google Cloud project ID.
 
     Returns:
-        The content of the JSON file as a dictionary, or None if an error occurs.
+        dict with format_version, toc and meta (see json_storage.read_envelope),
+        or None if an error occurs.
     """
     try:
-        # Initialize the client and parse the GCS path
-        storage_client = storage.Client(project=project_id)
+        # Parse the GCS path
+        storage_client = get_storage_client(project_id)
         bucket_name, blob_name = gcs_path.replace("gs://", "").split("/", 1)
 
         # Get the bucket and blob
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(blob_name)
 
-        # Download the file content as a string
         print(f"Reading JSON from: {gcs_path}")
-        json_string = blob.download_as_text()
-
-        # Parse the string into a Python dictionary
-        data = json.loads(json_string)
-        return data
+        with blob.open("rb", chunk_size=DOWNLOAD_CHUNK_SIZE) as f:
+            envelope = read_envelope(f)
+            count_bytes("download", "populated_json", f.tell())
+        return envelope
 
     except Exception as e:
         print(f"Error reading or parsing JSON from GCS: {e}")
         return None
+
+def _read_json_from_gcs(gcs_path: str, project_id: str) -> dict | None:
+    """
+    Downloads and reads a populated JSON file from a GCS path.
+
+    Args:
+        gcs_path: The full GCS path (e.g., "gs://bucket-name/folder/file.json.gz").
+        project_id: The Google Cloud project ID.
+
+    Returns:
+        The TOC tree stored in the file, or None if an error occurs.
+    """
+    envelope = read_envelope_from_gcs(gcs_path, project_id)
+    return envelope["toc"] if envelope else None
     
+# Parsed documents are shared by every lookup in this process
+section_store = SectionStore(_read_json_from_gcs)
+
+
 def get_section_by_number(gcs_path: str, project_id: str, heading_number: str) -> dict | None:
     """
     Finds a section in a TOC JSON file on GCS using its heading number.
@@ -45,24 +71,10 @@ def get_section_by_number(gcs_path: str, project_id: str, heading_number: str) -
     Returns:
         The dictionary node for the section if found, otherwise None.
     """
-    # First, read the JSON data from the GCS path
-    toc_tree = _read_json_from_gcs(gcs_path, project_id)
-    if not toc_tree:
+    document = section_store.get(gcs_path, project_id)
+    if document is None:
         return None  # Stop if the file could not be read or is empty
-
-    # --- The rest of the function is the same as your original ---
-    def _find_node_recursive(data: dict, key: str):
-        if key in data:
-            return data[key]
-        
-        for node_key in data:
-            if "subsections" in data[node_key] and data[node_key]["subsections"]:
-                found = _find_node_recursive(data[node_key]["subsections"], key)
-                if found:
-                    return found
-        return None
-
-    return _find_node_recursive(toc_tree, heading_number)
+    return document.by_number(heading_number)
 
 def get_section_by_title(gcs_path: str, project_id: str, title_query: str) -> tuple[str, dict] | None:
     """
@@ -76,21 +88,67 @@ def get_section_by_title(gcs_path: str, project_id: str, title_query: str) -> tu
     Returns:
         A tuple containing (heading_number, section_node) if found, otherwise None.
     """
-    # First, read the JSON data from the GCS path
-    toc_tree = _read_json_from_gcs(gcs_path, project_id)
-    if not toc_tree:
+    document = section_store.get(gcs_path, project_id)
+    if document is None:
         return None # Stop if the file could not be read or is empty
+    return document.by_title(title_query)
 
-    # --- The rest of the function is the same as your original ---
-    def _find_node_recursive(data: dict, title: str):
-        for heading_num, node in data.items():
-            if node.get("title", "").lower().strip() == title.lower().strip():
-                return (heading_num, node)
-            
-            if "subsections" in node and node["subsections"]:
-                found = _find_node_recursive(node["subsections"], title)
-                if found:
-                    return found
-        return None
+def get_sections(gcs_path: str, project_id: str, heading_numbers: list[str] = (), title_queries: list[str] = ()) -> dict:
+    """
+    Resolves many heading numbers and titles in one call, loading the JSON at most once.
+
+    Args:
+        gcs_path: The GCS path to the JSON file.
+        project_id: The Google Cloud project ID.
+        heading_numbers: Heading numbers to find (e.g., ["3.1", "5"]).
+        title_queries: Titles to search for (case-insensitive).
+
+    Returns:
+        {"numbers": {number: node | None}, "titles": {title: (heading_number, node) | None}}
+    """
+    return section_store.lookup(gcs_path, project_id, heading_numbers, title_queries)
+
+# Merged search indexes per set of populated JSON paths. Saving never overwrites
+# a populated JSON (a taken name gets a new one), so its index can't go stale
+# once loaded; merges missing an index (e.g. one still being written) aren't kept.
+MAX_CORPUS_INDEXES = 64
+_corpus_indexes: OrderedDict[tuple, SectionSearchIndex] = OrderedDict()
+_corpus_indexes_lock = threading.Lock()
+
+def _corpus_search_index(gcs_paths: tuple[str, ...], project_id: str) -> SectionSearchIndex:
+    """Loads and merges the search indexes of the given populated JSON files, reusing complete merges."""
+    key = (gcs_paths, project_id)
+    with _corpus_indexes_lock:
+        merged = _corpus_indexes.get(key)
+        if merged is not None:
+            _corpus_indexes.move_to_end(key)
+            return merged
+
+    indexes = [load_search_index_from_gcs(path, project_id) for path in gcs_paths]
+    loaded = [index for index in indexes if index is not None]
+    merged = SectionSearchIndex.merge(loaded)
+    if len(loaded) < len(indexes):
+        print(f"No search index for {len(indexes) - len(loaded)} of {len(indexes)} documents; searching the rest without caching.")
+        return merged
+    with _corpus_indexes_lock:
+        _corpus_indexes[key] = merged
+        while len(_corpus_indexes) > MAX_CORPUS_INDEXES:
+            _corpus_indexes.popitem(last=False)
+    return merged
+
+def search_sections(gcs_paths: str | list[str], project_id: str, query: str, k: int = 10) -> list[dict]:
+    """
+    Ranks sections of one or more populated JSON files against a keyword query (BM25).
+
+    Args:
+        gcs_paths: GCS path(s) of populated JSON files that have a search index saved next to them.
+        project_id: The Google Cloud project ID.
+        query: Free-text keywords.
+        k: Maximum number of results.
 
-    return _find_node_recursive(toc_tree, title_query)
\ No newline at end of file
+    Returns:
+        Up to k dicts with "source" (JSON path), "number", "title" and "score", best first.
+    """
+    if isinstance(gcs_paths, str):
+        gcs_paths = [gcs_paths]
+    return _corpus_search_index(tuple(sorted(set(gcs_paths))), project_id).search(query, k)
@@ -0,0 +1,343 @@
+import re
+from bisect import bisect_left
+from collections import deque
+
+CONCLUSIVE_KEYWORDS = ['appendix', 'conclusion', 'references', 'bibliography', 'index', 'annex', 'glossary', 'acknowledgements']
+
+# Compiled "strip the heading number" patterns, one per heading number
+_number_prefix_patterns: dict[str, re.Pattern] = {}
+
+
+def _normalize(text: str) -> str:
+    """Lower-cases text and removes all whitespace, for layout-insensitive comparisons."""
+    return "".join(text.lower().split())
+
+
+def _strip_heading_number(line_text: str, heading_num: str) -> str:
+    """Removes a leading heading number (and a ':' or '.' after it) from a stripped line."""
+    if heading_num.isascii():
+        # Plain string operations for the common case; same result as the pattern below
+        if line_text[:len(heading_num)].lower() != heading_num.lower():
+            return line_text
+        rest = line_text[len(heading_num):].lstrip()
+        if rest[:1] in (":", "."):
+            rest = rest[1:].lstrip()
+        return rest
+
+    pattern = _number_prefix_patterns.get(heading_num)
+    if pattern is None:
+        pattern = re.compile(r'^\s*' + re.escape(heading_num) + r'\s*[:.]?\s*', flags=re.IGNORECASE)
+        _number_prefix_patterns[heading_num] = pattern
+    return pattern.sub('', line_text)
+
+
+def verify_heading(line_at, start_idx: int, heading_num: str, heading_title: str, normalized_title: str | None = None) -> tuple[bool, int]:
+    """
+    Verifies if a heading exists at a given index using iterative title aggregation.
+
+    Args:
+        line_at: Callable returning the document line at an index, or None past the end.
+        start_idx: Index of the line that should start with the heading number.
+        heading_num: The heading number (e.g., "3.1"), or "" for an un-numbered heading.
+        heading_title: The heading title from the TOC.
+        normalized_title: The pre-computed _normalize(heading_title), if available.
+
+    Returns:
+        (True, index of the first content line) on a match, otherwise (False, -1).
+    """
+    line = line_at(start_idx)
+    if line is None:
+        return (False, -1)
+
+    if not line.strip().lower().startswith(heading_num.lower()):
+        return (False, -1)
+
+    if normalized_title is None:
+        normalized_title = _normalize(heading_title)
+    if not heading_num:
+        # Nothing anchors an un-numbered heading, so its title must start on this
+        # line; otherwise any line followed by the title would match
+        first_line = _normalize(line)
+        if not first_line or not (normalized_title.startswith(first_line) or first_line.startswith(normalized_title)):
+            return (False, -1)
+    aggregated_title_lines = []
+    last_line_idx = start_idx
+
+    for i in range(4): # Look ahead up to 4 lines
+        current_idx = start_idx + i
+        current_line = line_at(current_idx)
+        if current_line is None:
+            break
+        line_text = current_line.strip()
+        if i == 0 and line_text.lower() == heading_num.lower():
+            pass
+        elif i == 0:
+            aggregated_title_lines.append(_strip_heading_number(line_text, heading_num))
+        else:
+            if not line_text:
+                continue
+            aggregated_title_lines.append(line_text)
+
+        last_line_idx = current_idx
+        built_title_str = _normalize(" ".join(aggregated_title_lines))
+
+        if normalized_title in built_title_str:
+            return (True, last_line_idx + 1)
+
+    return (False, -1)
+
+
+def check_stop_heading(line_at, start_idx: int, normalized_stop_title: str | None) -> bool:
+    """Checks for the (normalized) stop heading using iterative, multi-line matching."""
+    if not normalized_stop_title:
+        return False
+
+    aggregated_lines = []
+    for i in range(3): # Look ahead up to 3 lines
+        current_line = line_at(start_idx + i)
+        if current_line is None:
+            break
+
+        line_text = current_line.strip()
+        if line_text:
+            aggregated_lines.append(line_text)
+
+        if normalized_stop_title in _normalize(" ".join(aggregated_lines)):
+            return True
+    return False
+
+
+def has_conclusive_keyword(line_text: str) -> bool:
+    """Checks whether a line mentions one of the CONCLUSIVE_KEYWORDS."""
+    normalized_line = line_text.strip().lower()
+    return bool(normalized_line) and any(keyword in normalized_line for keyword in CONCLUSIVE_KEYWORDS)
+
+
+def build_heading_index(document_lines: list[str], heading_numbers) -> dict[str, list[int]]:
+    """
+    Indexes the lines that could open each heading.
+
+    A heading can only be verified on a line whose stripped, lower-cased text
+    starts with the lower-cased heading number, so each line is looked up once
+    per distinct number length instead of being tested against every section.
+    An empty number (an un-numbered heading) can open on any line, so every
+    line is its candidate; it is kept out of the prefilter, which would
+    otherwise have to let every line through.
+
+    Returns:
+        Lower-cased heading number -> ascending list of candidate line indices.
+    """
+    index = {number.lower(): [] for number in heading_numbers}
+    numbered = [number for number in index if number]
+    lengths = sorted({len(number) for number in numbered})
+    first_chars = {number[0] for number in numbered}
+
+    if first_chars:
+        # Cheap superset prefilter on the first non-blank character, run at C speed
+        chars = "".join(re.escape(c) for c in sorted(first_chars))
+        prefilter = re.compile(r'\s*[' + chars + ']', flags=re.IGNORECASE).match
+
+        for idx, line in enumerate(document_lines):
+            if prefilter(line) is None:
+                continue
+            text = line.strip().lower()
+            if text[:1] not in first_chars:
+                continue
+            for length in lengths:
+                if length > len(text):
+                    break
+                positions = index.get(text[:length])
+                if positions is not None:
+                    positions.append(idx)
+
+    if "" in index:
+        index[""] = list(range(len(document_lines)))
+    return index
+
+
+def place_sections(ordered_toc: list[dict], document_lines: list[str], headers_footers: set[str], stop_heading: str | None, classify_conclusive, end_heading: dict | None = None) -> list[tuple[int, int] | None]:
+    """
+    Fills the 'content' of every section in a flattened, document-ordered TOC.
+
+    Candidate heading lines are indexed once up front; sections are then placed in
+    a single forward pass, verifying only the indexed candidates. The content of a
+    section runs from the line after its heading up to the next section's heading.
+    The last section ends at the stop heading, or at the first line that
+    classify_conclusive confirms as a conclusive heading; given an end_heading,
+    it ends at that heading instead.
+
+    Args:
+        ordered_toc: Flattened sections with "number", "title" and "node" keys.
+        document_lines: Text lines of the content pages, in reading order.
+        headers_footers: Lines to drop from section content.
+        stop_heading: Title of the heading that ends the main content, if known.
+        classify_conclusive: Callable(lines) -> list[bool], called once with all lines of
+            the last section that contain a conclusive keyword.
+        end_heading: A section ("number" and "title") following the last one, whose
+            heading only marks where the last section ends; it isn't filled.
+
+    Returns:
+        Per section, (heading line, end line) of where it was placed, or None if
+        its heading wasn't found.
+    """
+    doc_lines_count = len(document_lines)
+
+    def line_at(idx: int) -> str | None:
+        return document_lines[idx] if idx < doc_lines_count else None
+
+    headings = ordered_toc + [end_heading] if end_heading else ordered_toc
+    index = build_heading_index(document_lines, [section["number"] for section in headings])
+    normalized_titles = [_normalize(section["title"]) for section in headings]
+    normalized_stop_title = _normalize(stop_heading) if stop_heading else None
+
+    def find_heading(section_idx: int, from_idx: int) -> tuple[int, int] | None:
+        section = headings[section_idx]
+        positions = index[section["number"].lower()]
+        for pos in positions[bisect_left(positions, from_idx):]:
+            is_match, content_start_idx = verify_heading(
+                line_at, pos, section["number"], section["title"], normalized_titles[section_idx]
+            )
+            if is_match:
+                return pos, content_start_idx
+        return None
+
+    spans = [None] * len(ordered_toc)
+    line_idx = 0
+    for i, current_section in enumerate(ordered_toc):
+        found = find_heading(i, line_idx)
+        if found is None:
+            # Nothing after this point can be placed any more
+            line_idx = doc_lines_count
+            continue
+        line_idx = found[1]
+
+        if i + 1 < len(headings):
+            next_found = find_heading(i + 1, line_idx)
+            end_idx = next_found[0] if next_found else doc_lines_count
+        else: # This is the last section, use primary and fallback stop logic
+            end_idx = line_idx
+            while end_idx < doc_lines_count and not check_stop_heading(line_at, end_idx, normalized_stop_title):
+                end_idx += 1
+
+            # Classify every keyword line before the stop heading in one batch;
+            # the first confirmed conclusive heading ends the section early
+            candidates = [idx for idx in range(line_idx, end_idx) if has_conclusive_keyword(document_lines[idx])]
+            if candidates:
+                verdicts = classify_conclusive([document_lines[idx] for idx in candidates])
+                end_idx = next((idx for idx, verdict in zip(candidates, verdicts) if verdict), end_idx)
+
+        # Filter out headers and footers
+        content_lines = [
+            line for line in document_lines[line_idx:end_idx]
+            if line.strip() not in headers_footers
+        ]
+        current_section["node"]["content"] = "\n".join(content_lines).strip()
+        spans[i] = (found[0], end_idx)
+        line_idx = end_idx
+
+    return spans
+
+
+class LineWindow:
+    """
+    Lazily reads document lines from an iterator of per-page line lists.
+
+    Only the lines between the last release() point and the furthest line looked
+    at are kept, so memory stays bounded by a page or two plus the lookahead.
+    """
+
+    def __init__(self, pages):
+        self._pages = iter(pages)
+        self._lines = deque()
+        self._base = 0  # Document index of self._lines[0]
+        self._exhausted = False
+
+    def line_at(self, idx: int) -> str | None:
+        """Returns the line at a document index, or None past the end of the document."""
+        while idx >= self._base + len(self._lines) and not self._exhausted:
+            try:
+                self._lines.extend(next(self._pages))
+            except StopIteration:
+                self._exhausted = True
+        if idx < self._base:
+            raise IndexError(f"line {idx} was already released")
+        offset = idx - self._base
+        return self._lines[offset] if offset < len(self._lines) else None
+
+    def release(self, idx: int):
+        """Drops every line before a document index."""
+        while self._base < idx and self._lines:
+            self._lines.popleft()
+            self._base += 1
+
+
+def place_sections_streaming(ordered_toc: list[dict], window: LineWindow, headers_footers: set[str], stop_heading: str | None, classify_conclusive) -> list[tuple[int, int] | None]:
+    """
+    Streaming variant of place_sections for documents too large to hold in memory.
+
+    Lines are read once, front to back, from a LineWindow and released as soon as
+    they have been consumed; only the 4-line heading and 3-line stop-heading
+    lookahead is held beyond the current line. Produces the same content as
+    place_sections and returns the same spans, except that the last section's
+    span ends at the stop heading even when a conclusive heading cut it short.
+    """
+    normalized_titles = [_normalize(section["title"]) for section in ordered_toc]
+    normalized_stop_title = _normalize(stop_heading) if stop_heading else None
+    line_at = window.line_at
+
+    def is_heading(section_idx: int, idx: int) -> tuple[bool, int]:
+        section = ordered_toc[section_idx]
+        return verify_heading(line_at, idx, section["number"], section["title"], normalized_titles[section_idx])
+
+    spans = [None] * len(ordered_toc)
+    line_idx = 0
+    for i, current_section in enumerate(ordered_toc):
+        found_heading = False
+        while line_at(line_idx) is not None:
+            is_match, content_start_idx = is_heading(i, line_idx)
+            if is_match:
+                found_heading = True
+                heading_idx = line_idx
+                line_idx = content_start_idx
+                break
+            line_idx += 1
+            window.release(line_idx)
+        window.release(line_idx)
+
+        if not found_heading:
+            continue
+
+        content_lines = []
+        if i + 1 < len(ordered_toc):
+            while (line := line_at(line_idx)) is not None:
+                if is_heading(i + 1, line_idx)[0]:
+                    break
+                # Filter out headers and footers before appending
+                if line.strip() not in headers_footers:
+                    content_lines.append(line)
+                line_idx += 1
+                window.release(line_idx)
+        else: # This is the last section, use primary and fallback stop logic
+            # The last section is kept in memory anyway, so only the conclusive
+            # keyword lines are remembered for one batched classification
+            candidates = []  # (kept lines before it, line)
+            while (line := line_at(line_idx)) is not None:
+                if check_stop_heading(line_at, line_idx, normalized_stop_title):
+                    break
+                if has_conclusive_keyword(line):
+                    candidates.append((len(content_lines), line))
+                if line.strip() not in headers_footers:
+                    content_lines.append(line)
+                line_idx += 1
+                window.release(line_idx)
+
+            if candidates:
+                verdicts = classify_conclusive([line for _, line in candidates])
+                cut = next((pos for (pos, _), verdict in zip(candidates, verdicts) if verdict), None)
+                if cut is not None:
+                    content_lines = content_lines[:cut]
+
+        current_section["node"]["content"] = "\n".join(content_lines).strip()
+        spans[i] = (heading_idx, line_idx)
+
+    return spans
@@ -0,0 +1,146 @@
+import json
+import hashlib
+from bisect import bisect_right
+from difflib import SequenceMatcher
+
+
+def _resource_digests(document, page) -> list[bytes]:
+    """Digests of the images and form XObjects a page draws, with the names it draws them by."""
+    resources = {(image[7], image[0]) for image in page.get_images(full=True)}
+    resources.update((xobject[1], xobject[0]) for xobject in page.get_xobjects())
+    # Sorted by content rather than xref, as a rewritten file may renumber its objects
+    return sorted(
+        hashlib.blake2b(name.encode("utf-8") + b"\0" + (document.xref_stream_raw(xref) or b""), digest_size=16).digest()
+        for name, xref in resources
+    )
+
+
+def page_hashes(document) -> list[str]:
+    """
+    Hashes every page's content stream and the images and form XObjects it draws.
+
+    Cheap, as no text is extracted, yet a scanned page whose image was replaced
+    (or a page whose text sits in a form XObject) hashes differently.
+    """
+    hashes = []
+    for p in range(document.page_count):
+        page = document[p]
+        digest = hashlib.blake2b(page.read_contents(), digest_size=16)
+        for resource in _resource_digests(document, page):
+            digest.update(resource)
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def outline_hash(outline: list) -> str:
+    """Hashes an embedded bookmark outline (doc.get_toc())."""
+    return hashlib.blake2b(json.dumps(outline, ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def align_pages(old_hashes: list[str], new_hashes: list[str]) -> tuple[list[int], set[int]]:
+    """
+    Matches the pages of two revisions by their hashes.
+
+    Pages inserted or removed shift the pages after them rather than marking
+    them changed, so appending an annex only changes the pages that were added.
+
+    Returns:
+        (page_map, changed): the 0-based new page of every old page, and the new
+        pages whose content is new. A rewritten or removed old page maps to where
+        its replacement (or the gap it left) now is; the pages either side of a
+        removal count as changed, as the sections around it lost content.
+    """
+    page_map, changed = [], set()
+    last_page = max(len(new_hashes) - 1, 0)
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_hashes, new_hashes, autojunk=False).get_opcodes():
+        if tag == "equal":
+            page_map.extend(range(j1, j2))
+            continue
+        page_map.extend(min(j1 + min(i - i1, max(j2 - j1 - 1, 0)), last_page) for i in range(i1, i2))
+        changed.update(range(j1, j2))
+        if j1 == j2:
+            changed.update(p for p in (j1 - 1, j1) if 0 <= p < len(new_hashes))
+    return page_map, changed
+
+
+def remap_section_pages(section_pages: dict[str, list[int]], page_map: list[int]) -> dict[str, list[int]]:
+    """Moves recorded section page ranges to the matching pages of the revised document."""
+    return {number: [page_map[first], page_map[last]] for number, (first, last) in section_pages.items()}
+
+
+def tree_is_reusable(tree_meta: dict, old_hashes: list[str], new_hashes: list[str], outline: list) -> bool:
+    """
+    Checks whether a previously generated TOC tree still describes a revised document.
+
+    The tree only depends on the pages it was generated from (the TOC or fallback
+    pages) and on the embedded outline, so it is reused if those are unchanged and
+    still in place (so the recorded start page holds); pages added, removed or
+    edited after them don't matter.
+    """
+    if tree_meta.get("outline_sha256") != outline_hash(outline):
+        return False
+    page_map, changed = align_pages(old_hashes, new_hashes)
+    return all(
+        p < len(page_map) and page_map[p] == p and p not in changed
+        for p in tree_meta.get("source_pages", [])
+    )
+
+
+def section_page_ranges(ordered_toc: list[dict], spans: list, page_starts: list[int], start_page: int) -> dict[str, list[int]]:
+    """
+    Converts the line spans returned by place_sections into 0-based page ranges.
+
+    Args:
+        ordered_toc: Flattened sections, as passed to place_sections.
+        spans: (heading line, end line) per section, or None if it wasn't placed.
+        page_starts: Index of the first line of each page, relative to the placed lines.
+        start_page: Page of the first placed line.
+
+    Returns:
+        {heading number: [first page, last page]} for every placed section.
+    """
+    def page_of(line_idx: int) -> int:
+        return start_page + bisect_right(page_starts, line_idx) - 1
+
+    ranges = {}
+    for section, span in zip(ordered_toc, spans):
+        if span is not None:
+            heading_idx, end_idx = span
+            ranges[section["number"]] = [page_of(heading_idx), page_of(max(end_idx - 1, heading_idx))]
+    return ranges
+
+
+def affected_runs(numbers: list[str], section_pages: dict[str, list[int]], changed: set[int], page_count: int) -> list[tuple[int, int]] | None:
+    """
+    Groups the sections that contain changed pages into runs of consecutive sections.
+
+    The last section is treated as running to the end of the document, since a
+    change after it may move the heading that ends it.
+
+    Returns:
+        (first, last) indices into numbers for each run, or None if a section has
+        no recorded page range and nothing can be re-extracted selectively.
+    """
+    if any(number not in section_pages for number in numbers):
+        return None
+    runs = []
+    for i, number in enumerate(numbers):
+        first, last = section_pages[number]
+        if i == len(numbers) - 1:
+            last = page_count - 1
+        if any(first <= p <= last for p in changed):
+            if runs and runs[-1][1] == i - 1:
+                runs[-1] = (runs[-1][0], i)
+            else:
+                runs.append((i, i))
+    return runs
+
+
+def strip_content(tree):
+    """Removes the populated 'content' of every section, so a tree can be populated afresh."""
+    nodes = tree.values() if isinstance(tree, dict) else tree
+    for node in nodes:
+        node.pop("content", None)
+        if node.get("subsections"):
+            strip_content(node["subsections"])
+    return tree
@@ -0,0 +1,312 @@
+import re
+import write_behind
+from metrics import stage_timer, timed_stage
+from gemini_client import INLINE_PDF_MAX_BYTES, JobBudget, job_budget
+from storage_backend import get_storage_client
+from pdf_cache import get_cached_pdf_path
+from page_text_store import PageTextStore
+from toc_extraction import extract_toc_pdf, upload_toc_pdf
+from generate_tree_structure import generate_toc_tree_json, generate_toc_tree_from_outline
+from populate_json_content import populate_content, repopulate_content
+from incremental import page_hashes, outline_hash, tree_is_reusable, strip_content
+from json_storage import JSON_SUFFIX
+from save_json import save_json_to_gcs
+from search_index import SectionSearchIndex, save_search_index_to_gcs
+
+PROJECT_ID = "big-depth-471018-r6"
+TOC_BUCKET = "genai_ex_documents"
+JSON_DESTINATION = "gs://genai_ex_documents/Json Files/"
+
+# Build the TOC tree from the PDF's bookmark outline when it has one, skipping Gemini
+USE_EMBEDDED_OUTLINE = True
+
+# Pipeline stages, in order, as reported to on_stage callbacks
+STAGES = ("toc_extraction", "tree_generation", "population", "save")
+
+# How ingest_document persists artifacts: inline, in the background, or not at all
+PERSIST_MODES = ("sync", "async", "none")
+
+
+def split_gcs_file_path(gcs_file_path: str) -> tuple[str, str, str]:
+    """Returns (bucket, blob, file name without extension) for a 'gs://bucket/path/file.pdf' URI."""
+    source_bucket, source_blob = gcs_file_path.removeprefix("gs://").split('/', 1)
+    file_name = gcs_file_path.split('/')[-1].split('.')[0]
+    return source_bucket, source_blob, file_name
+
+
+def toc_blob_for(gcs_file_path: str) -> str:
+    """Returns the blob name the extracted TOC PDF of a source document is saved under."""
+    _, _, file_name = split_gcs_file_path(gcs_file_path)
+    return f"content_pages/{file_name}_toc.pdf"
+
+
+@timed_stage("toc_extraction")
+def extract_toc_stage(gcs_file_path: str, **kwargs) -> dict:
+    """Finds the TOC pages of the source PDF and, unless upload=False, saves them as a separate PDF."""
+    source_bucket, source_blob, _ = split_gcs_file_path(gcs_file_path)
+    return extract_toc_pdf(
+        source_bucket=source_bucket,
+        source_blob=source_blob,
+        dest_bucket=TOC_BUCKET,
+        dest_blob=toc_blob_for(gcs_file_path),
+        verbose=True,
+        **kwargs
+    )
+
+
+@timed_stage("toc_upload")
+def persist_toc_stage(toc_result: dict, gcs_file_path: str) -> dict:
+    """Uploads a TOC PDF that was extracted with upload=False."""
+    return upload_toc_pdf(toc_result["pdf_bytes"], TOC_BUCKET, toc_blob_for(gcs_file_path), verbose=True)
+
+
+@timed_stage("tree_generation")
+def generate_tree_stage(toc_result: dict, use_outline: bool = USE_EMBEDDED_OUTLINE) -> tuple[dict, int]:
+    """
+    Builds the TOC tree, from the embedded outline when possible and with Gemini otherwise.
+
+    Returns:
+        (the generate_toc_tree_json result, 0-based page where the main content starts)
+    """
+    tree_result = generate_toc_tree_from_outline(toc_result["outline"]) if use_outline else None
+    from_outline = tree_result is not None
+    if from_outline:
+        print("Built TOC tree from the embedded PDF outline.")
+    else:
+        # By reference when the TOC PDF has been uploaded, inline otherwise
+        print(f"Calling API to process: {toc_result['gs_uri'] or 'in-memory TOC PDF'}...")
+        tree_result = generate_toc_tree_json(
+            pdf_gcs_path=toc_result["gs_uri"],
+            use_flag=toc_result["from_toc"],
+            toc_sha256=toc_result["toc_sha256"],
+            pdf_bytes=toc_result["pdf_bytes"]
+        )
+
+    # Outline results index pages of the full document, like the fallback prompt
+    if toc_result["from_toc"] and not from_outline:
+        start_page = toc_result["toc_pages"][tree_result["last_toc_page"]] + 1
+    else:
+        start_page = tree_result["last_toc_page"] + 1
+    return tree_result, start_page
+
+
+@timed_stage("population")
+def populate_stage(tree_result: dict, gcs_file_path: str, start_page: int, streaming: bool = False, text_store=None, workers: int | None = None) -> tuple[dict, dict]:
+    """
+    Fills in the content of every TOC section from the source PDF, reading page
+    text from text_store if the pipeline shares one, or else extracting it with
+    the given number of worker processes.
+
+    Returns:
+        (populated JSON, page layout recorded for incremental re-ingestion)
+    """
+    print("Starting content population...")
+    layout = {}
+    populated_json = populate_content(
+        toc_json=tree_result["json"],
+        pdf_gcs_path=gcs_file_path,
+        start_page=start_page,
+        stop_heading=tree_result["stop_heading"],
+        is_numbered=tree_result["is_numbered"],
+        streaming=streaming,
+        layout=layout,
+        text_store=text_store,
+        workers=workers
+    )
+    print("\n...Population complete!")
+    return populated_json, layout
+
+
+def build_meta(gcs_file_path: str, toc_result: dict, tree_result: dict, layout: dict) -> dict:
+    """Describes how a populated JSON was built, so a later revision can reuse it."""
+    return {
+        "source": gcs_file_path,
+        "tree": {
+            "source_pages": toc_result["source_pages"],
+            "outline_sha256": outline_hash(toc_result["outline"]),
+            "stop_heading": tree_result["stop_heading"],
+            "is_numbered": tree_result["is_numbered"]
+        },
+        "layout": layout
+    }
+
+
+@timed_stage("save")
+def save_stage(populated_json: dict, gcs_file_path: str, meta: dict | None = None) -> str | None:
+    """Saves the populated JSON (with its build metadata) and its search index; returns the JSON's GCS path."""
+    _, _, file_name = split_gcs_file_path(gcs_file_path)
+    json_location = save_json_to_gcs(populated_json, JSON_DESTINATION, file_name, PROJECT_ID, meta=meta)
+    if json_location:
+        save_search_index_to_gcs(SectionSearchIndex.build(populated_json, json_location), json_location, PROJECT_ID)
+        # Seed the lookup cache so the first query doesn't download what we just wrote
+        from get_relevant_content import section_store
+        section_store.put(json_location, populated_json)
+    return json_location
+
+
+def find_previous_json(gcs_file_path: str) -> str | None:
+    """Returns the most recently saved populated JSON for a document, if any."""
+    _, _, file_name = split_gcs_file_path(gcs_file_path)
+    bucket_name, directory = JSON_DESTINATION.removeprefix("gs://").split("/", 1)
+    bucket = get_storage_client(PROJECT_ID).bucket(bucket_name)
+    stem = f"{directory}{file_name}_json"
+    # Only this document's versions: <stem>.json.gz or <stem>_N.json.gz
+    version_re = re.compile(re.escape(stem) + r"(_\d+)?" + re.escape(JSON_SUFFIX))
+    blobs = [
+        blob for blob in bucket.list_blobs(prefix=stem, fields="items(name,updated),nextPageToken")
+        if version_re.fullmatch(blob.name)
+    ]
+    if not blobs:
+        return None
+    return f"gs://{bucket_name}/{max(blobs, key=lambda blob: blob.updated).name}"
+
+
+def load_previous_ingest(gcs_file_path: str, previous_json: str | None = None) -> dict | None:
+    """
+    Loads a previously populated JSON of the same document that can be updated incrementally.
+
+    Args:
+        gcs_file_path: GCS URI of the (revised) PDF.
+        previous_json: GCS path of the populated JSON to start from. Defaults to the
+            most recently saved one for this document.
+
+    Returns:
+        dict with json_location, toc and meta, or None if there is nothing reusable.
+    """
+    from get_relevant_content import read_envelope_from_gcs
+
+    try:
+        previous_json = previous_json or find_previous_json(gcs_file_path)
+    except Exception as e:
+        print(f"Error looking up the previous populated JSON: {e}")
+        return None
+    if not previous_json:
+        return None
+    envelope = read_envelope_from_gcs(previous_json, PROJECT_ID)
+    if not envelope:
+        return None
+    meta = envelope["meta"]
+    if meta.get("source") != gcs_file_path or "tree" not in meta or not meta.get("layout", {}).get("page_hashes"):
+        print(f"{previous_json} has no reusable build metadata for {gcs_file_path}.")
+        return None
+    return {"json_location": previous_json, "toc": envelope["toc"], "meta": meta}
+
+
+def ingest_document(
+    gcs_file_path: str,
+    on_stage=None,
+    use_outline: bool = USE_EMBEDDED_OUTLINE,
+    streaming: bool = False,
+    handoff: bool = False,
+    persist: str = "sync",
+    incremental: bool = False,
+    previous_json: str | None = None,
+    budget: JobBudget | None = None
+) -> dict:
+    """
+    Runs the full ingestion pipeline for one PDF.
+
+    Args:
+        gcs_file_path: The full GCS URI of the PDF (e.g., 'gs://my-bucket/report.pdf').
+        on_stage: Optional callable(stage, status) invoked with status "running" when
+            each of STAGES starts and "done" when it finishes, or "skipped" when an
+            incremental re-ingestion doesn't need it.
+        use_outline: Try the embedded bookmark outline before calling Gemini.
+        streaming: Populate content in bounded-memory streaming mode.
+        handoff: Pass the TOC PDF to tree generation in memory instead of through GCS,
+            unless it is larger than INLINE_PDF_MAX_BYTES. Without handoff (and when
+            saving), Gemini reads the uploaded TOC PDF from GCS.
+        persist: "sync" saves the TOC PDF and populated JSON before returning, "async"
+            saves them in the background and "none" skips saving. The TOC PDF is only
+            written behind the pipeline when handoff is set.
+        incremental: Update the previously populated JSON of this document instead
+            of starting over. If the TOC pages are unchanged and in place, the
+            previous tree is reused and only sections on changed pages are
+            re-extracted, even if pages were added or removed after the TOC;
+            otherwise the full pipeline runs.
+        previous_json: GCS path of the populated JSON to update; defaults to the
+            latest one saved for this document.
+        budget: Token and time allowance of the job's Gemini requests; defaults to
+            a JobBudget with the GEMINI_JOB_MAX_TOKENS / GEMINI_JOB_MAX_SECONDS limits.
+
+    Returns:
+        dict with json_location (None if saving failed, was skipped or is still running),
+        populated_json and, for persist="async", save_future, a Future of json_location.
+    """
+    if persist not in PERSIST_MODES:
+        raise ValueError(f"persist must be one of {PERSIST_MODES}, got {persist!r}")
+
+    def _report(stage: str, status: str):
+        if on_stage:
+            on_stage(stage, status)
+
+    # Every page's text is extracted once and shared by TOC detection and population;
+    # streaming mode keeps it on disk
+    with stage_timer("pdf_fetch"):
+        pdf_path = get_cached_pdf_path(gcs_file_path, project_id=PROJECT_ID, verbose=True)
+    with job_budget(budget or JobBudget()), \
+            PageTextStore(pdf_path, max_memory_bytes=0 if streaming else None) as text_store:
+        previous = load_previous_ingest(gcs_file_path, previous_json) if incremental else None
+        if previous:
+            old_meta = previous["meta"]
+            new_hashes = page_hashes(text_store.document)
+            outline = text_store.document.get_toc()
+            if not tree_is_reusable(old_meta["tree"], old_meta["layout"]["page_hashes"], new_hashes, outline):
+                print("The TOC changed since the last ingestion; running the full pipeline.")
+                previous = None
+
+        if previous:
+            print(f"Updating {previous['json_location']} incrementally.")
+            _report("toc_extraction", "skipped")
+            _report("tree_generation", "skipped")
+            tree_meta = old_meta["tree"]
+            populated_json = previous["toc"]
+
+            _report("population", "running")
+            with stage_timer("repopulation"):
+                layout = repopulate_content(
+                    populated_json, old_meta["layout"], gcs_file_path,
+                    tree_meta["stop_heading"], tree_meta["is_numbered"], new_page_hashes=new_hashes,
+                    text_store=text_store
+                )
+            if layout is None:
+                tree_result = {"json": strip_content(populated_json), **tree_meta}
+                populated_json, layout = populate_stage(
+                    tree_result, gcs_file_path, old_meta["layout"]["start_page"], streaming=streaming, text_store=text_store
+                )
+            _report("population", "done")
+
+            if layout.get("page_hashes") == old_meta["layout"]["page_hashes"]:
+                print("No pages changed; keeping the previous populated JSON.")
+                _report("save", "skipped")
+                return {"json_location": previous["json_location"], "populated_json": populated_json}
+            meta = {**old_meta, "layout": layout}
+        else:
+            _report("toc_extraction", "running")
+            toc_result = extract_toc_stage(gcs_file_path, upload=not handoff and persist != "none", text_store=text_store)
+            if handoff and persist != "none":
+                if len(toc_result["pdf_bytes"]) > INLINE_PDF_MAX_BYTES:
+                    # Too large to send inline, so upload it now and let Gemini read it from GCS
+                    toc_result.update(persist_toc_stage(toc_result, gcs_file_path))
+                else:
+                    write_behind.submit(persist_toc_stage, toc_result, gcs_file_path)
+            _report("toc_extraction", "done")
+
+            _report("tree_generation", "running")
+            tree_result, start_page = generate_tree_stage(toc_result, use_outline=use_outline)
+            _report("tree_generation", "done")
+
+            _report("population", "running")
+            populated_json, layout = populate_stage(tree_result, gcs_file_path, start_page, streaming=streaming, text_store=text_store)
+            _report("population", "done")
+            meta = build_meta(gcs_file_path, toc_result, tree_result, layout)
+
+    result = {"json_location": None, "populated_json": populated_json}
+    _report("save", "running")
+    if persist == "sync":
+        result["json_location"] = save_stage(populated_json, gcs_file_path, meta)
+    elif persist == "async":
+        result["save_future"] = write_behind.submit(save_stage, populated_json, gcs_file_path, meta)
+    _report("save", "done")
+
+    return result
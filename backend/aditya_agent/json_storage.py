@@ -0,0 +1,162 @@
+import io
+import gzip
+import json
+
+# Version 1 is the legacy layout: the bare tree as indented, uncompressed JSON.
+# Version 2 wraps it in {"format_version", "toc", "meta"}, written compactly and gzipped.
+FORMAT_VERSION = 2
+JSON_SUFFIX = ".json.gz"
+CONTENT_TYPE = "application/gzip"
+
+# Resumable-upload chunk (a multiple of 256 KiB); bounds what a write keeps in memory
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# Characters of decompressed text read at a time while parsing
+READ_CHUNK_CHARS = 256 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def write_envelope(tree, fileobj, meta: dict | None = None):
+    """
+    Streams a populated TOC tree to a binary file object in the current format.
+
+    The JSON is encoded piece by piece and compressed as it goes, so the
+    serialized document is never held in memory as a whole.
+    """
+    envelope = {"format_version": FORMAT_VERSION, "toc": tree, "meta": meta or {}}
+    # mtime=0 keeps the output byte-identical for identical trees
+    with io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6, mtime=0), encoding="utf-8") as text:
+        for chunk in _ENCODER.iterencode(envelope):
+            text.write(chunk)
+
+
+class _IncrementalReader:
+    """
+    Decodes JSON values one at a time from a text stream read in chunks.
+
+    Only the text of the value being decoded (and one chunk) is buffered, so a
+    document can be parsed without ever holding its full text.
+    """
+
+    def __init__(self, text, chunk_chars: int):
+        self._text = text
+        self._chunk_chars = chunk_chars
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_chars: int) -> bool:
+        """Reads at least min_chars more (or up to the end); returns False at the end of the stream."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._text.read(max(min_chars, self._chunk_chars))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def next_char(self) -> str:
+        """Consumes and returns the next non-whitespace character, or "" at the end."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                self._pos += 1
+                return self._buf[self._pos - 1]
+            if not self._fill(self._chunk_chars):
+                return ""
+
+    def peek_char(self) -> str:
+        char = self.next_char()
+        if char:
+            self._pos -= 1
+        return char
+
+    def value(self):
+        """Decodes the next JSON value, reading more text until it is complete."""
+        self.peek_char()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # Incomplete: read at least as much again as is buffered, so retries stay linear
+                if not self._fill(len(self._buf) - self._pos):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buf) and self._fill(self._chunk_chars):
+                continue
+            self._pos = end
+            return value
+
+    def expect(self, char: str):
+        found = self.next_char()
+        if found != char:
+            raise ValueError(f"Malformed JSON: expected {char!r}, found {found or 'end of file'!r}")
+
+
+def _read_container(reader: _IncrementalReader, incremental_keys=None):
+    """
+    Reads an object or array entry by entry, so only one entry's text is buffered
+    at a time. Values of keys in incremental_keys are read the same way; other
+    values (and anything that isn't an object or array) are decoded whole.
+    """
+    opening = reader.peek_char()
+    if opening not in ("{", "["):
+        return reader.value()
+    reader.next_char()
+    closing = "}" if opening == "{" else "]"
+    result = {} if opening == "{" else []
+    if reader.peek_char() == closing:
+        reader.next_char()
+        return result
+    while True:
+        if opening == "{":
+            key = reader.value()
+            reader.expect(":")
+            result[key] = _read_container(reader) if incremental_keys and key in incremental_keys else reader.value()
+        else:
+            result.append(reader.value())
+        separator = reader.next_char()
+        if separator == closing:
+            return result
+        if separator != ",":
+            raise ValueError(f"Malformed JSON: expected ',' or {closing!r}, found {separator or 'end of file'!r}")
+
+
+def read_envelope(fileobj, chunk_chars: int = READ_CHUNK_CHARS) -> dict:
+    """
+    Reads a populated TOC JSON file of any format version from a seekable binary file object.
+
+    The file is decompressed and parsed in chunks of chunk_chars characters, one
+    top-level TOC entry at a time, so memory holds the parsed tree plus the text
+    of a single top-level section rather than the whole decompressed document.
+
+    Returns:
+        dict with format_version, toc and meta (empty for legacy files).
+
+    Raises:
+        ValueError: If the file was written by a newer, unknown format version.
+    """
+    compressed = fileobj.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC
+    fileobj.seek(0)
+    stream = gzip.GzipFile(fileobj=fileobj, mode="rb") if compressed else fileobj
+    reader = _IncrementalReader(io.TextIOWrapper(stream, encoding="utf-8"), chunk_chars)
+    # A legacy file is the bare tree, so its own entries are the sections
+    data = _read_container(reader, incremental_keys={"toc"})
+    if reader.next_char():
+        raise ValueError("Malformed JSON: unexpected data after the document")
+
+    if isinstance(data, dict) and "format_version" in data:
+        if data["format_version"] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported populated JSON format version: {data['format_version']}")
+        return {"format_version": data["format_version"], "toc": data["toc"], "meta": data.get("meta") or {}}
+    return {"format_version": 1, "toc": data, "meta": {}}
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+
+# SQLite file shared by every process on this machine
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "aditya_llm_cache.sqlite3")
+DEFAULT_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 10000))
+# Set LLM_CACHE_BYPASS=1 to always call the model
+BYPASS = os.environ.get("LLM_CACHE_BYPASS") == "1"
+
+
+def make_cache_key(*parts) -> str:
+    """Hashes JSON-serializable key parts (content hashes, prompt text, model name, flags) into one key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent key/value store for LLM results, backed by SQLite.
+
+    Values are stored as JSON. Each namespace is an independent key space, so
+    different kinds of model calls can share one database file. Entries older
+    than ttl_seconds are ignored and purged, and each namespace keeps at most
+    max_entries, evicting the least recently used ones first.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        path: str = CACHE_PATH,
+        ttl_seconds: float | None = DEFAULT_TTL_SECONDS,
+        max_entries: int | None = DEFAULT_MAX_ENTRIES,
+        enabled: bool | None = None
+    ):
+        self.namespace = namespace
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = not BYPASS if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")}
+            if "accessed_at" not in columns:
+                self._conn.execute("ALTER TABLE llm_cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                self._conn.execute("UPDATE llm_cache SET accessed_at = created_at")
+
+    def _min_created_at(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds is not None else float("-inf")
+
+    def get_many(self, keys: list[str], bypass: bool = False) -> dict:
+        """Returns {key: value} for the keys that are cached and not expired."""
+        keys = list(dict.fromkeys(keys))
+        if bypass or not self.enabled:
+            self.misses += len(keys)
+            return {}
+
+        found = {}
+        now = time.time()
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM llm_cache WHERE namespace = ? AND created_at >= ? AND key IN ({placeholders})",
+                    [self.namespace, self._min_created_at(now), *batch]
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE llm_cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    [(now, self.namespace, key) for key, _ in rows]
+                )
+            found.update((key, json.loads(value)) for key, value in rows)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str, default=None, bypass: bool = False):
+        return self.get_many([key], bypass=bypass).get(key, default)
+
+    def set_many(self, items: dict):
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        rows = [(self.namespace, key, json.dumps(value), now, now) for key, value in items.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_cache (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, self._min_created_at(now))
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE namespace = ? AND key IN ("
+                    " SELECT key FROM llm_cache WHERE namespace = ?"
+                    " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries)
+                )
+
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for this process and the number of stored entries."""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM llm_cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
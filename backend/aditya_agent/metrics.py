@@ -0,0 +1,137 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from prometheus_client import Counter, Histogram
+
+# Pipeline metrics, registered in prometheus_client's default registry and served
+# by the backend's /metrics endpoint. Updates made in a worker process only reach
+# that process's registry, so work sent to a process pool is wrapped in
+# run_recorded and its updates replayed in the parent with recorded_result.
+
+# Stages take from milliseconds (cached lookups) to minutes (large PDFs)
+_STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+_LLM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "aditya_stage_seconds", "Wall time of a pipeline stage", ["stage", "outcome"], buckets=_STAGE_BUCKETS
+)
+STORAGE_BYTES = Counter(
+    "aditya_storage_bytes", "Bytes moved to and from storage", ["direction", "artifact"]
+)
+PAGES_EXTRACTED = Counter(
+    "aditya_pages_extracted", "PDF pages whose text was extracted", ["flavour"]
+)
+LLM_CALLS = Counter(
+    "aditya_llm_calls", "Gemini requests", ["model", "purpose", "outcome"]
+)
+LLM_SECONDS = Histogram(
+    "aditya_llm_seconds", "Latency of a Gemini request", ["model", "purpose"], buckets=_LLM_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "aditya_llm_tokens", "Tokens used by Gemini requests", ["model", "purpose", "kind"]
+)
+
+_METRICS = {
+    "stage_seconds": STAGE_SECONDS,
+    "storage_bytes": STORAGE_BYTES,
+    "pages_extracted": PAGES_EXTRACTED,
+    "llm_calls": LLM_CALLS,
+    "llm_seconds": LLM_SECONDS,
+    "llm_tokens": LLM_TOKENS,
+}
+_captured = contextvars.ContextVar("aditya_metrics_captured", default=None)
+
+
+def _record(metric: str, labels: tuple, value: float = 1):
+    """Applies one update to a metric, also capturing it when inside run_recorded."""
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((metric, labels, value))
+    child = _METRICS[metric].labels(*labels)
+    if isinstance(child, Histogram):
+        child.observe(value)
+    else:
+        child.inc(value)
+
+
+def run_recorded(fn, *args, **kwargs) -> tuple:
+    """
+    Process pool entry point: runs fn(*args, **kwargs) and returns (result, error,
+    metric updates made meanwhile), for recorded_result to unpack in the parent.
+    """
+    captured = []
+    token = _captured.set(captured)
+    try:
+        return fn(*args, **kwargs), None, captured
+    except Exception as e:
+        return None, e, captured
+    finally:
+        _captured.reset(token)
+
+
+def recorded_result(future):
+    """Replays a run_recorded future's metric updates in this process, then returns its result or raises its error."""
+    result, error, updates = future.result()
+    for metric, labels, value in updates:
+        _record(metric, labels, value)
+    if error is not None:
+        raise error
+    return result
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Records the wall time of the enclosed block as one run of a stage."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        _record("stage_seconds", (stage, outcome), time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_bytes(direction: str, artifact: str, num_bytes: int | None):
+    """Counts bytes "downloaded" or "uploaded" for an artifact (source_pdf, toc_pdf, ...)."""
+    if num_bytes:
+        _record("storage_bytes", (direction, artifact), num_bytes)
+
+
+def count_pages_extracted(flavour: str, pages: int = 1):
+    _record("pages_extracted", (flavour,), pages)
+
+
+@contextmanager
+def llm_call(model_name: str, purpose: str):
+    """Counts and times the Gemini request made in the enclosed block."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        _record("llm_seconds", (model_name, purpose), time.perf_counter() - started)
+        _record("llm_calls", (model_name, purpose, outcome))
+
+
+def count_llm_tokens(model_name: str, purpose: str, response):
+    """Adds the prompt and response token counts a Gemini response reports, if any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        count = getattr(usage, field, 0)
+        if count:
+            _record("llm_tokens", (model_name, purpose, kind), count)
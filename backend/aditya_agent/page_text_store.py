@@ -0,0 +1,158 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+from metrics import count_pages_extracted
+
+# Text flavours: "text" is what content population reads, "sorted" is the
+# reading-order text TOC detection matches its line patterns against. Sorting
+# costs far more than the plain extraction, so extracting a page's sorted text
+# also keeps its plain text, taken from the same parse of the page.
+FLAVOURS = ("text", "sorted")
+
+# Page text held in memory before further pages are spilled to a temporary file
+MAX_MEMORY_BYTES = int(os.environ.get("PAGE_TEXT_MAX_MEMORY_BYTES", 64 * 1024 ** 2))
+
+# Below this many pages a process pool costs more than it saves
+_MIN_PAGES_FOR_POOL = 64
+
+
+def _extract(page: fitz.Page, flavour: str) -> dict[str, str]:
+    """Extracts a page's text in flavour, plus its plain text if that comes for free."""
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+    texts = {"text": page.get_text("text", textpage=textpage)}
+    if flavour == "sorted":
+        texts["sorted"] = page.get_text("text", sort=True, textpage=textpage)
+    return texts
+
+
+def _extract_chunk(pdf_path: str, first_page: int, last_page: int, flavour: str) -> list[dict[str, str]]:
+    """Worker entry point: extracts pages [first_page, last_page) of the PDF at pdf_path."""
+    with fitz.open(pdf_path) as doc:
+        return [_extract(doc[page_num], flavour) for page_num in range(first_page, last_page)]
+
+
+class PageTextStore:
+    """
+    The text of a PDF's pages, extracted at most once per flavour and shared by
+    every stage that reads it (TOC detection, header/footer detection and
+    content population). Pages read in the sorted flavour get their plain text
+    stored alongside, so content population doesn't parse TOC-scan pages (or,
+    without a TOC, every page) a second time; the price is holding the plain
+    text of scanned pages that population never reads.
+
+    With more than one worker and a large enough document, pages are extracted
+    in chunks of chunk_size by worker processes, reading up to two chunks per
+    worker ahead of the page being asked for; otherwise one page at a time.
+    Once more than max_memory_bytes of text is held, further pages are spilled
+    to a temporary file and read back on demand.
+    """
+
+    def __init__(
+        self,
+        pdf_path: str,
+        workers: int | None = None,
+        chunk_size: int = 32,
+        max_memory_bytes: int | None = None,
+        spill_dir: str | None = None,
+        doc: fitz.Document | None = None
+    ):
+        self.pdf_path = pdf_path
+        self._owns_doc = doc is None
+        self._doc = doc if doc is not None else fitz.open(pdf_path)
+        self.page_count = self._doc.page_count
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_memory_bytes = MAX_MEMORY_BYTES if max_memory_bytes is None else max_memory_bytes
+        self._spill_dir = spill_dir
+        self._spill = None
+        self._memory_bytes = 0
+        # Per flavour, page number -> text, or (offset, length) in the spill file
+        self._pages = {flavour: {} for flavour in FLAVOURS}
+        self._in_flight = {}  # (flavour, chunk start) -> Future
+        self._executor = None
+
+    @property
+    def document(self) -> fitz.Document:
+        """The open document, for anything other than text (page count, content streams)."""
+        return self._doc
+
+    def _use_pool(self) -> bool:
+        return self.workers > 1 and self.page_count >= _MIN_PAGES_FOR_POOL
+
+    def _chunk_bounds(self, start: int) -> tuple[int, int]:
+        return start, min(start + self.chunk_size, self.page_count)
+
+    def _submit(self, flavour: str, start: int):
+        if (flavour, start) in self._in_flight or start >= self.page_count or start in self._pages[flavour]:
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._in_flight[(flavour, start)] = self._executor.submit(_extract_chunk, self.pdf_path, *self._chunk_bounds(start), flavour)
+
+    def _put(self, flavour: str, page_num: int, texts: dict[str, str]):
+        count_pages_extracted(flavour)
+        for text_flavour, text in texts.items():
+            if page_num not in self._pages[text_flavour]:
+                self._store(text_flavour, page_num, text)
+
+    def _store(self, flavour: str, page_num: int, text: str):
+        if self._memory_bytes + len(text) <= self.max_memory_bytes:
+            self._pages[flavour][page_num] = text
+            self._memory_bytes += len(text)
+            return
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(dir=self._spill_dir)
+        data = text.encode("utf-8")
+        self._spill.seek(0, os.SEEK_END)
+        self._pages[flavour][page_num] = (self._spill.tell(), len(data))
+        self._spill.write(data)
+
+    def _load(self, flavour: str, page_num: int):
+        if not self._use_pool():
+            # In-process, extract only what is asked for, so an early stop wastes nothing
+            self._put(flavour, page_num, _extract(self._doc[page_num], flavour))
+            return
+        start = page_num - page_num % self.chunk_size
+        # Keep the pool busy with the chunks a sequential reader will want next
+        for ahead in range(self.workers * 2 + 1):
+            self._submit(flavour, start + ahead * self.chunk_size)
+        for offset, texts in enumerate(self._in_flight.pop((flavour, start)).result()):
+            self._put(flavour, start + offset, texts)
+
+    def get(self, page_num: int, flavour: str = "text") -> str:
+        """Returns the text of a 0-based page, extracting it if needed."""
+        if flavour not in self._pages:
+            raise ValueError(f"Unknown text flavour: {flavour}")
+        if not 0 <= page_num < self.page_count:
+            raise IndexError(f"page {page_num} out of range")
+        if page_num not in self._pages[flavour]:
+            self._load(flavour, page_num)
+        stored = self._pages[flavour][page_num]
+        if isinstance(stored, str):
+            return stored
+        offset, length = stored
+        self._spill.seek(offset)
+        return self._spill.read(length).decode("utf-8")
+
+    def iter_pages(self, first_page: int = 0, end_page: int | None = None, flavour: str = "text"):
+        """Yields the text of pages [first_page, end_page) in order."""
+        for page_num in range(first_page, self.page_count if end_page is None else min(end_page, self.page_count)):
+            yield self.get(page_num, flavour)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._in_flight.clear()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self._owns_doc:
+            self._doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
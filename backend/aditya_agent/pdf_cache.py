@@ -0,0 +1,117 @@
+import os
+import hashlib
+import tempfile
+import threading
+import fitz  # PyMuPDF
+from storage_backend import get_storage_client
+from metrics import count_bytes
+
+# Location and size budget of the on-disk PDF cache
+CACHE_DIR = os.environ.get("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "aditya_pdf_cache")
+MAX_CACHE_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+_key_locks: dict[str, threading.Lock] = {}
+_key_locks_guard = threading.Lock()
+
+
+def _split_gcs_path(pdf_gcs_path: str) -> tuple[str, str]:
+    """Splits 'gs://bucket/blob' (or 'bucket/blob') into bucket and blob names."""
+    bucket_name, blob_name = pdf_gcs_path.removeprefix("gs://").split("/", 1)
+    return bucket_name, blob_name
+
+
+def _cache_key(bucket_name: str, blob_name: str, generation: int | None) -> str:
+    """Content address of a blob: every new upload gets a new GCS generation."""
+    identity = f"gs://{bucket_name}/{blob_name}#{generation}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _evict(keep: str, max_bytes: int = MAX_CACHE_BYTES):
+    """Removes least recently used cache entries until the cache fits in max_bytes."""
+    entries = []
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.name.endswith(".pdf") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    # Oldest access time first; hits refresh the mtime
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass  # Another process already evicted it
+
+
+def get_cached_pdf_path(pdf_gcs_path: str, project_id: str | None = None, verbose: bool = False) -> str:
+    """
+    Returns a local file path holding the given GCS PDF, downloading it at most once.
+
+    Entries are keyed by the blob's generation, so an overwritten blob is fetched
+    again while repeated reads of the same upload are served from local disk.
+    With the local storage backend the PDF is already a file, and its own path
+    is returned without copying it.
+
+    Args:
+        pdf_gcs_path: GCS path of the PDF (e.g., "gs://bucket/folder/file.pdf").
+        project_id: The Google Cloud project ID.
+        verbose: Print cache hits and downloads.
+
+    Returns:
+        The absolute path of the cached PDF file.
+    """
+    bucket_name, blob_name = _split_gcs_path(pdf_gcs_path)
+    blob = get_storage_client(project_id).bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f"gs://{bucket_name}/{blob_name} does not exist")
+    if getattr(blob, "local_path", None):
+        return blob.local_path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    key = _cache_key(bucket_name, blob_name, blob.generation)
+    local_path = os.path.join(CACHE_DIR, f"{key}.pdf")
+
+    with _lock_for(key):
+        if os.path.exists(local_path):
+            if verbose:
+                print(f"PDF cache hit for gs://{bucket_name}/{blob_name}")
+            os.utime(local_path)  # Mark as recently used
+            return local_path
+
+        if verbose:
+            print(f"Downloading gs://{bucket_name}/{blob_name} into the PDF cache...")
+        # Download next to the final path and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+        os.close(fd)
+        try:
+            blob.download_to_filename(tmp_path, if_generation_match=blob.generation)
+            count_bytes("download", "pdf", os.path.getsize(tmp_path))
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    _evict(keep=local_path)
+    return local_path
+
+
+def open_cached_pdf(pdf_gcs_path: str, project_id: str | None = None, verbose: bool = False) -> fitz.Document:
+    """
+    Opens a GCS PDF through the local cache.
+
+    The document is opened by file path, so PyMuPDF reads pages from disk on
+    demand instead of holding a full copy of the PDF bytes in memory.
+    """
+    return fitz.open(get_cached_pdf_path(pdf_gcs_path, project_id=project_id, verbose=verbose))
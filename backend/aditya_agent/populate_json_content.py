@@ -1,61 +1,97 @@
-import re
 import json
-import io
 import os
-import fitz  # PyMuPDF, install with: pip install PyMuPDF
 from collections import Counter
-from google.cloud import storage # Install with: pip install google-cloud-storage4
-import vertexai
-from vertexai.generative_models import GenerativeModel
-vertexai.init(
-    project="big-depth-471018-r6",
-location="us-central1"
-)
-
-def _is_conclusive_heading_llm(line_text: str) -> bool:
-    """Uses an LLM to determine if a line is a conclusive heading."""
+from pdf_cache import get_cached_pdf_path
+from page_text_store import PageTextStore
+from heading_index import place_sections, place_sections_streaming, LineWindow
+from llm_cache import LLMCache
+from gemini_client import BudgetExceededError, generate_content
+from incremental import page_hashes, align_pages, remap_section_pages, section_page_ranges, affected_runs
+
+# Lines classified per Gemini request, so the prompt stays bounded
+CONCLUSIVE_BATCH_SIZE = int(os.environ.get("CONCLUSIVE_BATCH_SIZE", 100))
+
+_conclusive_cache = None
+
+
+def _get_conclusive_cache() -> LLMCache:
+    global _conclusive_cache
+    if _conclusive_cache is None:
+        _conclusive_cache = LLMCache("conclusive_heading")
+    return _conclusive_cache
+
+
+def _normalize_line_key(line_text: str) -> str:
+    return " ".join(line_text.lower().split())
+
+
+def _classify_conclusive_headings_llm(lines: list[str]) -> list[bool]:
+    """
+    Uses an LLM to determine which lines are conclusive headings.
+
+    Verdicts are memoized by normalized line text in a persistent cache. Lines
+    not yet cached are classified in requests of up to CONCLUSIVE_BATCH_SIZE
+    lines, each cached as soon as it succeeds, so the prompt stays bounded and
+    a failed request only loses its own lines.
+    """
+    if not lines:
+        return []
+    keys = [_normalize_line_key(line) for line in lines]
+    cache = _get_conclusive_cache()
+    verdicts = cache.get_many(keys)
+
+    pending = [key for key in dict.fromkeys(keys) if key not in verdicts]
+    for start in range(0, len(pending), CONCLUSIVE_BATCH_SIZE):
+        batch = pending[start:start + CONCLUSIVE_BATCH_SIZE]
+        try:
+            prompt = f"""
+            Analyze each of the following lines of text from a document, given as a JSON array:
+            {json.dumps(batch, ensure_ascii=False)}
+
+            For each line, decide whether it is a standalone heading for a final, conclusive section of a document (like an appendix, bibliography, or index), or more likely a regular sentence that happens to contain a conclusive word.
+
+            Respond with only a JSON array of booleans in the same order as the lines: true if the line is a heading, false if it is not.
+            """
+            response = generate_content(
+                prompt,
+                purpose="conclusive_headings",
+                generation_config={"response_mime_type": "application/json"}
+            )
+            answers = json.loads(response.text)
+            if not isinstance(answers, list) or len(answers) != len(batch):
+                raise ValueError(f"expected {len(batch)} verdicts, got: {response.text[:200]}")
+            new_verdicts = {key: answer is True or str(answer).strip().lower() == "true" for key, answer in zip(batch, answers)}
+            cache.set_many(new_verdicts)
+            verdicts.update(new_verdicts)
+        except BudgetExceededError as e:
+            # Every further request would be refused too
+            print(f"LLM verification stopped: {e}")
+            break
+        except Exception as e:
+            print(f"LLM verification call failed: {e}")
+            # Fail safely, assume they are not headings on error (and don't cache that)
+
+    return [verdicts.get(key, False) for key in keys]
+
+def _open_text_store(pdf_gcs_path: str, max_memory_bytes: int | None = None, workers: int | None = None) -> PageTextStore | None:
+    """Opens a page text store for a PDF on GCS, reusing the shared local PDF cache."""
     try:
-        model = GenerativeModel("gemini-2.5-pro")
-        prompt = f"""
-        Analyze the following line of text from a document:
-        Line: "{line_text}"
-
-        Is this line a standalone heading for a final, conclusive section of a document (like an appendix, bibliography, or index), or is it more likely a regular sentence that happens to contain a conclusive word?
-
-        Respond with only "true" if it is a heading, and "false" if it is not.
-        """
-        response = model.generate_content(prompt)
-        # Normalize the LLM's response to a boolean
-        return response.text.strip().lower() == "true"
-    except Exception as e:
-        print(f"LLM verification call failed: {e}")
-        return False # Fail safely, assume it's not a heading on error
-
-def _get_pdf_document_from_gcs(pdf_gcs_path: str) -> fitz.Document | None:
-    """Downloads a PDF from GCS and returns it as a PyMuPDF Document object."""
-    try:
-        bucket_name, blob_name = pdf_gcs_path.replace("gs://", "").split("/", 1)
         project_id = os.environ.get("GOOGLE_CLOUD_PROJECT") or "big-depth-471018-r6"
-        storage_client = storage.Client(project=project_id)
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
-        pdf_bytes = blob.download_as_bytes()
-        return fitz.open(stream=pdf_bytes, filetype="pdf")
+        return PageTextStore(get_cached_pdf_path(pdf_gcs_path, project_id=project_id), workers=workers, max_memory_bytes=max_memory_bytes)
     except Exception as e:
         print(f"Error processing PDF from GCS: {e}")
         return None
 
-def _detect_headers_and_footers(document: fitz.Document, start_page: int) -> set[str]:
+def _detect_headers_and_footers(store: PageTextStore, start_page: int) -> set[str]:
     """Detects repeated lines in the top/bottom margins of the first few content pages."""
     line_counts = Counter()
     # Scan the first 5 pages of the main content area
-    num_pages_to_scan = min(5, document.page_count - start_page)
+    num_pages_to_scan = min(5, store.page_count - start_page)
     if num_pages_to_scan <= 1:
         return set()
 
     for page_num in range(start_page, start_page + num_pages_to_scan):
-        page = document.load_page(page_num)
-        lines = [line.strip() for line in page.get_text("text").split('\n') if line.strip()]
+        lines = [line.strip() for line in store.get(page_num).split('\n') if line.strip()]
         
         if len(lines) > 6: # Ensure page has enough content to have distinct headers/footers
             # Get top and bottom 3 lines
@@ -78,8 +114,37 @@ def _flatten_toc_recursive(toc_data: dict, flat_list: list):
         if "subsections" in details and details["subsections"]:
             _flatten_toc_recursive(details["subsections"], flat_list)
 
-def populate_content(toc_json: dict, pdf_gcs_path: str, start_page: int, stop_heading: str, is_numbered: bool) -> dict:
-    """Populates the 'content' field for each entry in a numbered TOC JSON using robust heading detection."""
+def _iter_page_lines(store: PageTextStore, start_page: int, end_page: int | None = None, page_starts: list[int] | None = None):
+    """
+    Yields the text lines of each page from start_page up to (not including) end_page.
+
+    If page_starts is given, the running line offset of each yielded page is appended to it.
+    """
+    offset = 0
+    for text in store.iter_pages(start_page, end_page):
+        lines = text.split('\n')
+        if page_starts is not None:
+            page_starts.append(offset)
+            offset += len(lines)
+        yield lines
+
+
+def populate_content(toc_json: dict, pdf_gcs_path: str, start_page: int, stop_heading: str, is_numbered: bool, streaming: bool = False, layout: dict | None = None, text_store: PageTextStore | None = None, workers: int | None = None) -> dict:
+    """
+    Populates the 'content' field for each entry in a numbered TOC JSON using robust heading detection.
+
+    With streaming=True, pages are read lazily and released as soon as they have
+    been matched, instead of holding every line of the document in memory.
+
+    If a layout dict is given, it is filled with what repopulate_content needs to
+    update the tree after a revision: start_page, page_hashes (one per page) and
+    section_pages ({heading number: [first page, last page]}).
+
+    Page text is read from text_store when one is shared by the pipeline. Otherwise
+    a private store is opened with the given number of extraction workers (the CPU
+    count by default; pass 1 when already running in a worker process), which in
+    streaming mode keeps all text on disk.
+    """
     if not is_numbered:
         print("Content population is only supported for numbered TOCs.")
         return toc_json
@@ -89,142 +154,103 @@ def populate_content(toc_json: dict, pdf_gcs_path: str, start_page: int, stop_he
     if not ordered_toc:
         return toc_json
 
-    document = _get_pdf_document_from_gcs(pdf_gcs_path)
-    if not document:
+    store = text_store or _open_text_store(pdf_gcs_path, max_memory_bytes=0 if streaming else None, workers=workers)
+    if not store:
         return toc_json
 
-    # Detect headers and footers before processing content
-    headers_footers = _detect_headers_and_footers(document, start_page)
-
-    # Extract all text lines from the relevant pages
-    document_lines = []
-    # print(document.page_count)
-    if start_page < document.page_count:
-        for page_num in range(start_page, document.page_count):
-            page = document.load_page(page_num)
-            document_lines.extend(page.get_text("text").split('\n'))
-
-    doc_lines_count = len(document_lines)
-    line_idx = 0
-    
-    CONCLUSIVE_KEYWORDS = ['appendix', 'conclusion', 'references', 'bibliography', 'index', 'annex', 'glossary', 'acknowledgements']
-
-    def _verify_heading(start_idx: int, heading_num: str, heading_title: str) -> tuple[bool, int]:
-        """Verifies if a heading exists at a given index using iterative title aggregation."""
-        if start_idx >= doc_lines_count:
-            return (False, -1)
-        
-        line = document_lines[start_idx]
-
-        if not line.strip().lower().startswith(heading_num.lower()):
-            return (False, -1)
-        
-        normalized_title = "".join(heading_title.lower().split())
-        aggregated_title_lines = []
-        last_line_idx = start_idx
-        
-        for i in range(4): # Look ahead up to 4 lines
-            current_idx = start_idx + i
-            if current_idx >= doc_lines_count:
-                break
-            line_text = document_lines[current_idx].strip()
-            if i == 0 and line_text.lower() == heading_num.lower():
-                pass
-            elif i == 0:
-                text_part = re.sub(r'^\s*' + re.escape(heading_num) + r'\s*[:.]?\s*', '', line_text, flags=re.IGNORECASE)
-                aggregated_title_lines.append(text_part)
-            else:
-                if not line_text:
-                    continue
-                aggregated_title_lines.append(line_text)
-
-            last_line_idx = current_idx
-            built_title_str = "".join(" ".join(aggregated_title_lines).lower().split())
-
-            if normalized_title in built_title_str:
-                return (True, last_line_idx + 1)
-        
-        return (False, -1)
-
-    def _check_stop_heading(start_idx: int) -> bool:
-        """Checks for the stop heading using iterative, multi-line matching."""
-        if not stop_heading:
-            return False
-        
-        normalized_stop_title = "".join(stop_heading.lower().split())
-        aggregated_lines = []
-        for i in range(3): # Look ahead up to 3 lines
-            current_idx = start_idx + i
-            if current_idx >= doc_lines_count:
-                break
-            
-            line_text = document_lines[current_idx].strip()
-            if line_text:
-                aggregated_lines.append(line_text)
-            
-            built_str = "".join(" ".join(aggregated_lines).lower().split())
-            if normalized_stop_title in built_str:
-                return True
-        return False
-
-    # Iterate through each section in the flattened TOC list
-    for i, current_section in enumerate(ordered_toc):
-        found_heading = False
-        # print(doc_lines_count)
-        while line_idx < doc_lines_count:
-            # print(current_section["number"],current_section["title"])
-            is_match, content_start_idx = _verify_heading(line_idx, current_section["number"], current_section["title"])
-            # print(is_match)
-            if is_match:
-                # print("Yes")
-                found_heading = True
-                line_idx = content_start_idx
-                break
-            line_idx += 1
-        
-        if not found_heading:
-            continue
-
-        content_lines = []
-        next_section = ordered_toc[i + 1] if i + 1 < len(ordered_toc) else None
-        
-        while line_idx < doc_lines_count:
-            stop = False
-            current_line_text = document_lines[line_idx]
-
-            if next_section:
-                is_next_match, _ = _verify_heading(line_idx, next_section["number"], next_section["title"])
-                if is_next_match:
-                    stop = True
-            else: # This is the last section, use primary and fallback stop logic
-                if _check_stop_heading(line_idx):
-                    stop = True
-                else:
-                    normalized_line = current_line_text.strip().lower()
-                    if normalized_line:
-                        for keyword in CONCLUSIVE_KEYWORDS:
-                            if keyword in normalized_line:
-                                if _is_conclusive_heading_llm(current_line_text):
-                                    stop = True
-                                    break # Exit keyword loop
-            if stop:
-                break
-            
-            # Filter out headers and footers before appending
-            if current_line_text.strip() not in headers_footers:
-                content_lines.append(current_line_text)
-            
-            line_idx += 1
-            
-        current_section["node"]["content"] = "\n".join(content_lines).strip()
-
+    page_starts = []
+    try:
+        # Detect headers and footers before processing content
+        headers_footers = _detect_headers_and_footers(store, start_page)
+        if layout is not None:
+            layout.update(start_page=start_page, page_hashes=page_hashes(store.document))
+
+        if streaming:
+            window = LineWindow(_iter_page_lines(store, start_page, page_starts=page_starts))
+            spans = place_sections_streaming(ordered_toc, window, headers_footers, stop_heading, _classify_conclusive_headings_llm)
+        else:
+            # Extract all text lines from the relevant pages
+            document_lines = []
+            for lines in _iter_page_lines(store, start_page, page_starts=page_starts):
+                document_lines.extend(lines)
+    finally:
+        if text_store is None:
+            store.close()
+
+    if not streaming:
+        spans = place_sections(ordered_toc, document_lines, headers_footers, stop_heading, _classify_conclusive_headings_llm)
+
+    if layout is not None:
+        layout["section_pages"] = section_page_ranges(ordered_toc, spans, page_starts, start_page)
     return toc_json
 
 
+def repopulate_content(toc_json: dict, layout: dict, pdf_gcs_path: str, stop_heading: str, is_numbered: bool, new_page_hashes: list[str] | None = None, text_store: PageTextStore | None = None) -> dict | None:
+    """
+    Updates a populated TOC tree for a revised PDF, re-extracting only the sections
+    whose page ranges contain changed pages. Pages are matched by hash, so sections
+    that merely moved because pages were added or removed before them are kept.
+
+    Args:
+        toc_json: The previously populated tree; updated in place.
+        layout: The layout recorded by populate_content for the previous revision.
+        pdf_gcs_path: GCS URI of the revised PDF.
+        stop_heading: Title of the heading that ends the main content, if known.
+        is_numbered: Whether the TOC is numbered.
+        new_page_hashes: Page hashes of the revised PDF, if already computed.
+        text_store: A shared PageTextStore of the revised PDF, if the pipeline has one.
+
+    Returns:
+        The layout of the revised document, or None if the tree must be populated
+        from scratch (a section can't be located). In that case toc_json may have
+        been partly updated.
+    """
+    if not is_numbered:
+        return None
 
+    ordered_toc = []
+    _flatten_toc_recursive(toc_json, ordered_toc)
+    store = text_store or _open_text_store(pdf_gcs_path)
+    if not store:
+        return None
 
-
-
-
-
-
+    try:
+        new_page_hashes = new_page_hashes or page_hashes(store.document)
+        page_map, changed = align_pages(layout["page_hashes"], new_page_hashes)
+        if len(new_page_hashes) != len(layout["page_hashes"]):
+            print(f"Page count changed from {len(layout['page_hashes'])} to {len(new_page_hashes)}; moving unchanged sections to their new pages.")
+        section_pages = remap_section_pages(layout["section_pages"], page_map)
+        runs = affected_runs([section["number"] for section in ordered_toc], section_pages, changed, store.page_count)
+        if runs is None:
+            return None
+        print(f"{len(changed)} page(s) changed; re-extracting {sum(last - first + 1 for first, last in runs)} of {len(ordered_toc)} sections.")
+
+        start_page = page_map[layout["start_page"]]
+        headers_footers = _detect_headers_and_footers(store, start_page) if runs else set()
+        new_section_pages = dict(section_pages)
+        for first, last in runs:
+            run = ordered_toc[first:last + 1]
+            first_page = section_pages[run[0]["number"]][0]
+            if last + 1 < len(ordered_toc):
+                # The next, unchanged section's heading ends the run; it is only searched for
+                boundary = ordered_toc[last + 1]
+                end_page = section_pages[boundary["number"]][0] + 1
+            else:
+                boundary = None
+                end_page = store.page_count
+
+            page_starts = []
+            run_lines = []
+            for lines in _iter_page_lines(store, first_page, end_page, page_starts=page_starts):
+                run_lines.extend(lines)
+            spans = place_sections(run, run_lines, headers_footers, stop_heading, _classify_conclusive_headings_llm, end_heading=boundary)
+            if any(span is None for span in spans):
+                print("A revised section could not be located; repopulating every section.")
+                return None
+            run_pages = section_page_ranges(run, spans, page_starts, first_page)
+            new_section_pages.update(run_pages)
+    finally:
+        if text_store is None:
+            store.close()
+
+    return {"start_page": start_page, "page_hashes": new_page_hashes, "section_pages": new_section_pages}
@@ -1,19 +1,26 @@
-import os
-import json
-from google.cloud import storage
+from storage_backend import get_storage_client
+from metrics import count_bytes
+from artifact_naming import numbered_name, upload_unique
+from json_storage import JSON_SUFFIX, CONTENT_TYPE, UPLOAD_CHUNK_SIZE, write_envelope
 
-def save_json_to_gcs(data: dict, destination_gcs_path: str, file_name: str, project_id: str):
+def save_json_to_gcs(data: dict, destination_gcs_path: str, file_name: str, project_id: str, meta: dict | None = None):
     """
-    Saves a dictionary as a JSON file to a specific GCS location.
+    Saves a dictionary as a gzipped JSON file to a specific GCS location.
+
+    The file uses the versioned json_storage format and is streamed through a
+    resumable upload, so the serialized JSON is never built in memory.
 
     If a file with the same name already exists, it appends a number
-    (e.g., file_name_json_1.json, file_name_json_2.json) to find a unique name.
+    (e.g., file_name_json_1.json.gz, file_name_json_2.json.gz) to find a unique name.
+    The upload only succeeds if the name is still free, so concurrent saves
+    of the same document never overwrite each other.
 
     Args:
         data: The dictionary (JSON object) to save.
         destination_gcs_path: The GCS folder path (e.g., "gs://bucket-name/folder/").
         file_name: The base name for the output file (e.g., "my_document").
         project_id: The Google Cloud project ID.
+        meta: Optional metadata stored alongside the tree in the file's envelope.
         
     Returns:
         The GCS path of the saved file as a string, or None if an error occurred.
@@ -25,35 +32,23 @@ def save_json_to_gcs(data: dict, destination_gcs_path: str, file_name: str, proj
             
         bucket_name, directory = destination_gcs_path.replace("gs://", "").split("/", 1)
         
-        # Initialize client with project ID and get bucket
-        storage_client = storage.Client(project=project_id)
-        bucket = storage_client.bucket(bucket_name)
+        # Get the bucket from the shared client
+        bucket = get_storage_client(project_id).bucket(bucket_name)
 
-        # --- NEW: Logic to find a unique filename ---
-        base_name_part = f"{file_name}_json"
-        extension = ".json"
-        
-        # 1. Start with the original proposed filename
-        output_filename = f"{base_name_part}{extension}"
-        output_blob_name = os.path.join(directory, output_filename)
-        
-        counter = 1
-        # 2. Loop as long as a file with the current name exists
-        while bucket.blob(output_blob_name).exists():
-            print(f"File 'gs://{bucket_name}/{output_blob_name}' already exists. Saving with different name.")
-            # 3. Create a new filename with a counter
-            new_filename = f"{base_name_part}_{counter}{extension}"
-            output_blob_name = os.path.join(directory, new_filename)
-            counter += 1
-        # --- End of new logic ---
+        # Pick a unique filename: one conditional upload, plus one listing if the name is taken
+        output_blob_name = f"{directory}{file_name}_json{JSON_SUFFIX}"
+
+        def _write(blob, **precondition):
+            with blob.open("wb", content_type=CONTENT_TYPE, chunk_size=UPLOAD_CHUNK_SIZE, ignore_flush=True, **precondition) as f:
+                write_envelope(data, f, meta)
+                size = f.tell()
+            count_bytes("upload", "populated_json", size)
 
         print(f"Attempting to save JSON to: gs://{bucket_name}/{output_blob_name}")
-        json_loc = f'gs://{bucket_name}/{output_blob_name}'
-        
-        # Create a new blob for the final unique name and upload the data
-        blob = bucket.blob(output_blob_name)
-        json_data = json.dumps(data, indent=2)
-        blob.upload_from_string(json_data, content_type="application/json")
+        saved_blob_name, _ = upload_unique(bucket, output_blob_name, _write, numbered_name)
+        if saved_blob_name != output_blob_name:
+            print(f"File 'gs://{bucket_name}/{output_blob_name}' already exists. Saved with different name.")
+        json_loc = f'gs://{bucket_name}/{saved_blob_name}'
         
         print(f"Successfully saved JSON to GCS at: {json_loc}")
         return json_loc
@@ -0,0 +1,203 @@
+import io
+import re
+import json
+import numpy as np
+from collections import Counter
+from storage_backend import get_storage_client
+from metrics import count_bytes
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+INDEX_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cases text and splits it into word and section-number tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def index_path_for(json_gcs_path: str) -> str:
+    """
+    Returns the GCS path of the search index stored next to a populated JSON file.
+
+    'doc_json.json' -> 'doc_json.bm25.npz' and 'doc_json.json.gz' -> 'doc_json.json.bm25.npz',
+    so a legacy file and a gzipped one with the same stem never share an index.
+    """
+    if json_gcs_path.endswith(".gz"):
+        return json_gcs_path.removesuffix(".gz") + ".bm25.npz"
+    return json_gcs_path.removesuffix(".json") + ".bm25.npz"
+
+
+def _iter_sections(tree, prefix: str = ""):
+    """Yields (heading number, node) for every section, in document order."""
+    if isinstance(tree, dict):
+        for heading_num, node in tree.items():
+            yield heading_num, node
+            yield from _iter_sections(node.get("subsections") or {})
+    elif isinstance(tree, list):
+        # Un-numbered TOCs: use the position path as the section id
+        for position, node in enumerate(tree, start=1):
+            section_id = f"{prefix}{position}"
+            yield section_id, node
+            yield from _iter_sections(node.get("subsections") or [], f"{section_id}.")
+
+
+class SectionSearchIndex:
+    """
+    BM25 inverted index over the title and content of populated TOC sections.
+
+    Postings are stored in CSR form: the postings of term t are
+    doc_ids[indptr[t]:indptr[t + 1]] with matching term_freqs, so a query
+    only touches the postings of its own terms and is scored with NumPy.
+    """
+
+    def __init__(self, terms: list[str], indptr, doc_ids, term_freqs, doc_lengths, sections: list[dict]):
+        self.terms = terms
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.term_freqs = np.asarray(term_freqs, dtype=np.float32)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.sections = sections
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @classmethod
+    def _from_postings(cls, terms: list[str], term_ids, doc_ids, term_freqs, doc_lengths, sections: list[dict]) -> "SectionSearchIndex":
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        order = np.lexsort((doc_ids, term_ids))
+        counts = np.bincount(term_ids, minlength=len(terms))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(terms, indptr, doc_ids[order], np.asarray(term_freqs, dtype=np.float32)[order], doc_lengths, sections)
+
+    @classmethod
+    def build(cls, toc_tree, source: str = "") -> "SectionSearchIndex":
+        """Indexes every section of a populated TOC tree; source labels the document in results."""
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs, doc_lengths, sections = [], [], [], [], []
+        for doc_id, (heading_num, node) in enumerate(_iter_sections(toc_tree)):
+            title = node.get("title", "")
+            tokens = tokenize(title) + tokenize(node.get("content", ""))
+            for term, freq in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(freq)
+            doc_lengths.append(len(tokens))
+            sections.append({"source": source, "number": heading_num, "title": title})
+        return cls._from_postings(list(vocabulary), term_ids, doc_ids, term_freqs, doc_lengths, sections)
+
+    @classmethod
+    def merge(cls, indexes: list["SectionSearchIndex"]) -> "SectionSearchIndex":
+        """Combines per-document indexes into one corpus-wide index with shared statistics."""
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs, doc_lengths, sections = [], [], [], [], []
+        doc_offset = 0
+        for index in indexes:
+            remap = np.array([vocabulary.setdefault(term, len(vocabulary)) for term in index.terms], dtype=np.int64)
+            per_term = np.diff(index.indptr)
+            term_ids.append(np.repeat(remap, per_term))
+            doc_ids.append(index.doc_ids.astype(np.int64) + doc_offset)
+            term_freqs.append(index.term_freqs)
+            doc_lengths.append(index.doc_lengths)
+            sections.extend(index.sections)
+            doc_offset += len(index.sections)
+        if not indexes:
+            return cls._from_postings([], [], [], [], [], [])
+        return cls._from_postings(
+            list(vocabulary), np.concatenate(term_ids), np.concatenate(doc_ids),
+            np.concatenate(term_freqs), np.concatenate(doc_lengths), sections
+        )
+
+    def search(self, query: str, k: int = 10, k1: float = 1.5, b: float = 0.75) -> list[dict]:
+        """
+        Ranks sections against a keyword query with BM25.
+
+        Returns:
+            Up to k dicts with "source", "number", "title" and "score", best first.
+        """
+        query_term_ids = sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+        if not query_term_ids or not self.sections:
+            return []
+
+        num_docs = len(self.sections)
+        starts = self.indptr[query_term_ids]
+        ends = self.indptr[[t + 1 for t in query_term_ids]]
+        doc_freqs = (ends - starts).astype(np.float32)
+        idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        docs = np.concatenate([self.doc_ids[s:e] for s, e in zip(starts, ends)])
+        tfs = np.concatenate([self.term_freqs[s:e] for s, e in zip(starts, ends)])
+        term_idf = np.repeat(idf, (ends - starts))
+        norm = k1 * (1 - b + b * self.doc_lengths[docs] / (self.avg_doc_length or 1.0))
+        scores = np.bincount(docs, weights=term_idf * tfs * (k1 + 1) / (tfs + norm), minlength=num_docs)
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{**self.sections[i], "score": float(scores[i])} for i in top]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the index as a compressed .npz archive."""
+        meta = json.dumps({"version": INDEX_FORMAT_VERSION, "terms": self.terms, "sections": self.sections})
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs.astype(np.uint16) if self.term_freqs.max(initial=0) < 65536 else self.term_freqs,
+            doc_lengths=self.doc_lengths
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SectionSearchIndex":
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+            if meta.get("version") != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported search index version: {meta.get('version')}")
+            return cls(meta["terms"], archive["indptr"], archive["doc_ids"], archive["term_freqs"],
+                       archive["doc_lengths"], meta["sections"])
+
+
+def save_search_index_to_gcs(index: SectionSearchIndex, json_gcs_path: str, project_id: str) -> str | None:
+    """
+    Saves a search index next to its populated JSON file on GCS.
+
+    Returns:
+        The GCS path of the saved index, or None if an error occurred.
+    """
+    try:
+        index_path = index_path_for(json_gcs_path)
+        bucket_name, blob_name = index_path.replace("gs://", "").split("/", 1)
+        storage_client = get_storage_client(project_id)
+        data = index.to_bytes()
+        storage_client.bucket(bucket_name).blob(blob_name).upload_from_string(
+            data, content_type="application/octet-stream"
+        )
+        count_bytes("upload", "search_index", len(data))
+        print(f"Successfully saved search index to GCS at: {index_path}")
+        return index_path
+    except Exception as e:
+        print(f"Error saving search index to GCS: {e}")
+        return None
+
+
+def load_search_index_from_gcs(json_gcs_path: str, project_id: str) -> SectionSearchIndex | None:
+    """Loads the search index stored next to a populated JSON file, or None if it can't be read."""
+    try:
+        bucket_name, blob_name = index_path_for(json_gcs_path).replace("gs://", "").split("/", 1)
+        storage_client = get_storage_client(project_id)
+        data = storage_client.bucket(bucket_name).blob(blob_name).download_as_bytes()
+        count_bytes("download", "search_index", len(data))
+        index = SectionSearchIndex.from_bytes(data)
+        # Label results with the JSON they came from
+        for section in index.sections:
+            section["source"] = json_gcs_path
+        return index
+    except Exception as e:
+        print(f"Error reading search index from GCS: {e}")
+        return None
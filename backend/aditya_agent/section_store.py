@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+
+
+def _normalize_title(title: str) -> str:
+    return title.lower().strip()
+
+
+class IndexedDocument:
+    """
+    A parsed TOC JSON tree with flat lookup indexes.
+
+    number_index maps every heading number to its node, and title_index maps
+    every normalized title to the heading number of its first occurrence in
+    document order, matching the recursive lookups it replaces.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.number_index: dict[str, dict] = {}
+        self.title_index: dict[str, str] = {}
+        if isinstance(tree, dict):
+            self._index(tree)
+
+    def _index(self, data: dict):
+        # Same-level keys first, then subsections, like the recursive number lookup
+        for heading_num, node in data.items():
+            self.number_index.setdefault(heading_num, node)
+        for heading_num, node in data.items():
+            self.title_index.setdefault(_normalize_title(node.get("title", "")), heading_num)
+            if node.get("subsections"):
+                self._index(node["subsections"])
+
+    def by_number(self, heading_number: str) -> dict | None:
+        return self.number_index.get(heading_number)
+
+    def by_title(self, title_query: str) -> tuple[str, dict] | None:
+        heading_num = self.title_index.get(_normalize_title(title_query))
+        if heading_num is None:
+            return None
+        return (heading_num, self.number_index[heading_num])
+
+
+class SectionStore:
+    """
+    Process-wide cache of parsed, indexed TOC JSON documents.
+
+    Each document is loaded once through the given loader and kept in an LRU of
+    at most max_documents entries, so repeated section lookups cost a dict probe
+    instead of a download, a parse and a tree walk.
+    """
+
+    def __init__(self, loader, max_documents: int = 32):
+        self._loader = loader
+        self._max_documents = max_documents
+        self._documents: OrderedDict[str, IndexedDocument] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, gcs_path: str, tree) -> IndexedDocument:
+        """Registers an already parsed tree, e.g. one that was just populated."""
+        document = IndexedDocument(tree)
+        with self._lock:
+            self._documents[gcs_path] = document
+            self._documents.move_to_end(gcs_path)
+            while len(self._documents) > self._max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+    def get(self, gcs_path: str, project_id: str) -> IndexedDocument | None:
+        with self._lock:
+            document = self._documents.get(gcs_path)
+            if document is not None:
+                self._documents.move_to_end(gcs_path)
+                return document
+
+        tree = self._loader(gcs_path, project_id)
+        if not tree:
+            return None
+        return self.put(gcs_path, tree)
+
+    def invalidate(self, gcs_path: str):
+        with self._lock:
+            self._documents.pop(gcs_path, None)
+
+    def lookup(self, gcs_path: str, project_id: str, numbers: list[str] = (), titles: list[str] = ()) -> dict:
+        """
+        Resolves many heading numbers and titles against one document in a single call.
+
+        Returns:
+            {"numbers": {number: node | None}, "titles": {title: (heading_number, node) | None}}
+        """
+        document = self.get(gcs_path, project_id)
+        if document is None:
+            return {"numbers": {n: None for n in numbers}, "titles": {t: None for t in titles}}
+        return {
+            "numbers": {n: document.by_number(n) for n in numbers},
+            "titles": {t: document.by_title(t) for t in titles}
+        }
@@ -0,0 +1,248 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+# "gcs" (default) or "local": gs://bucket/name then maps to <root>/bucket/name on a
+# local or NFS filesystem, and nothing goes over the network
+STORAGE_BACKEND = os.environ.get("AGENT_STORAGE_BACKEND", "gcs").lower()
+LOCAL_STORAGE_ROOT = os.environ.get("AGENT_LOCAL_STORAGE_ROOT") or os.path.join(tempfile.gettempdir(), "aditya_storage")
+
+# HTTP connections the shared GCS client keeps open, for concurrent uploads and downloads
+GCS_POOL_SIZE = int(os.environ.get("AGENT_GCS_POOL_SIZE", 32))
+
+# Uploads in progress are written under this prefix and hidden from listings
+_STAGING_PREFIX = ".upload-"
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _create_gcs_client(project_id: str | None):
+    from google.cloud import storage
+    import requests
+
+    client = storage.Client(project=project_id)
+    # The default session pools 10 connections; parallel stages need more
+    adapter = requests.adapters.HTTPAdapter(pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_POOL_SIZE)
+    client._http.mount("https://", adapter)
+    return client
+
+
+def get_storage_client(project_id: str | None = None):
+    """
+    Returns the process-wide storage client for a project, creating it on first use.
+
+    With AGENT_STORAGE_BACKEND=local this is a LocalStorageClient rooted at
+    AGENT_LOCAL_STORAGE_ROOT; otherwise a google.cloud.storage.Client with a
+    connection pool sized by AGENT_GCS_POOL_SIZE. Both expose the same
+    bucket()/blob() subset the pipeline uses.
+    """
+    key = (STORAGE_BACKEND, project_id)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                if STORAGE_BACKEND == "local":
+                    client = LocalStorageClient(LOCAL_STORAGE_ROOT, project=project_id)
+                elif STORAGE_BACKEND == "gcs":
+                    client = _create_gcs_client(project_id)
+                else:
+                    raise ValueError(f"Unknown AGENT_STORAGE_BACKEND: {STORAGE_BACKEND}")
+                _clients[key] = client
+    return client
+
+
+def reset_clients():
+    """Drops the cached clients, e.g. after changing credentials or the backend in tests."""
+    with _clients_lock:
+        _clients.clear()
+
+
+class _LocalWriter:
+    """File object for LocalBlob.open("wb"): writes a temp file and publishes it on close."""
+
+    def __init__(self, blob: "LocalBlob", if_generation_match: int | None):
+        self._blob = blob
+        self._if_generation_match = if_generation_match
+        self._file = tempfile.NamedTemporaryFile(dir=blob._staging_dir(), prefix=_STAGING_PREFIX, delete=False)
+        self.closed = False
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self):
+        pass  # Like BlobWriter(ignore_flush=True): the blob only appears on close
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._file.close()
+        self._blob._publish(self._file.name, self._if_generation_match)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.closed = True
+            self._file.close()
+            os.remove(self._file.name)
+
+
+class LocalBlob:
+    """A file standing in for a GCS blob. Its generation is the file's mtime in nanoseconds."""
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def local_path(self) -> str:
+        return os.path.join(self.bucket.path, *self.name.split("/"))
+
+    def _stat(self):
+        try:
+            return os.stat(self.local_path)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def generation(self) -> int | None:
+        stat = self._stat()
+        return stat.st_mtime_ns if stat else None
+
+    @property
+    def updated(self) -> datetime | None:
+        stat = self._stat()
+        return datetime.fromtimestamp(stat.st_mtime, timezone.utc) if stat else None
+
+    @property
+    def size(self) -> int | None:
+        stat = self._stat()
+        return stat.st_size if stat else None
+
+    def exists(self, **kwargs) -> bool:
+        return os.path.isfile(self.local_path)
+
+    def reload(self, **kwargs):
+        if not self.exists():
+            raise NotFound(f"gs://{self.bucket.name}/{self.name}")
+
+    def _staging_dir(self) -> str:
+        directory = os.path.dirname(self.local_path)
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _publish(self, tmp_path: str, if_generation_match: int | None):
+        """Moves a finished temp file into place; if_generation_match=0 only creates."""
+        try:
+            if if_generation_match == 0:
+                # link() never replaces an existing file, so concurrent creators can't both win
+                try:
+                    os.link(tmp_path, self.local_path)
+                except FileExistsError:
+                    raise PreconditionFailed(f"gs://{self.bucket.name}/{self.name} already exists")
+            else:
+                if if_generation_match is not None and self.generation != if_generation_match:
+                    raise PreconditionFailed(f"gs://{self.bucket.name}/{self.name} has changed")
+                os.replace(tmp_path, self.local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _write_bytes(self, data: bytes, if_generation_match: int | None):
+        with _LocalWriter(self, if_generation_match) as f:
+            f.write(data)
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        self._write_bytes(data.encode("utf-8") if isinstance(data, str) else data, if_generation_match)
+
+    def upload_from_file(self, file_obj, content_type=None, if_generation_match=None, **kwargs):
+        with _LocalWriter(self, if_generation_match) as f:
+            shutil.copyfileobj(file_obj, f)
+
+    def upload_from_filename(self, filename: str, content_type=None, if_generation_match=None, **kwargs):
+        with open(filename, "rb") as source:
+            self.upload_from_file(source, if_generation_match=if_generation_match)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        self.reload()
+        with open(self.local_path, "rb") as f:
+            return f.read()
+
+    def download_as_text(self, encoding: str = "utf-8", **kwargs) -> str:
+        return self.download_as_bytes().decode(encoding)
+
+    def download_to_filename(self, filename: str, if_generation_match=None, **kwargs):
+        self.reload()
+        if if_generation_match is not None and self.generation != if_generation_match:
+            raise PreconditionFailed(f"gs://{self.bucket.name}/{self.name} has changed")
+        shutil.copyfile(self.local_path, filename)
+
+    def open(self, mode: str = "r", chunk_size=None, ignore_flush=False, content_type=None, if_generation_match=None, **kwargs):
+        if mode == "rb":
+            self.reload()
+            return open(self.local_path, "rb")
+        if mode == "wb":
+            return _LocalWriter(self, if_generation_match)
+        raise ValueError(f"Unsupported mode: {mode}")
+
+    def delete(self, **kwargs):
+        try:
+            os.remove(self.local_path)
+        except FileNotFoundError:
+            raise NotFound(f"gs://{self.bucket.name}/{self.name}")
+
+
+class LocalBucket:
+    def __init__(self, client: "LocalStorageClient", name: str):
+        self.client = client
+        self.name = name
+        self.path = os.path.join(client.root, name)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str, **kwargs) -> LocalBlob | None:
+        blob = self.blob(name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix: str = "", fields=None, **kwargs):
+        """Yields the blobs whose names start with prefix, in name order."""
+        # Only walk the directory the prefix points into
+        start = os.path.join(self.path, *prefix.split("/")[:-1])
+        names = []
+        for directory, _, files in os.walk(start):
+            relative = os.path.relpath(directory, self.path).replace(os.sep, "/")
+            for file_name in files:
+                if file_name.startswith(_STAGING_PREFIX):
+                    continue
+                name = file_name if relative == "." else f"{relative}/{file_name}"
+                if name.startswith(prefix):
+                    names.append(name)
+        for name in sorted(names):
+            yield self.blob(name)
+
+
+class LocalStorageClient:
+    """Serves buckets from directories under root, for on-prem and test deployments."""
+
+    def __init__(self, root: str = LOCAL_STORAGE_ROOT, project: str | None = None):
+        self.root = root
+        self.project = project
+
+    def bucket(self, name: str) -> LocalBucket:
+        return LocalBucket(self, name)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline modules use flat imports from aditya_agent/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+from itertools import islice
+
+from artifact_naming import candidate_names, numbered_name
+
+
+def _first(blob_name, n=3, variant=None):
+    names = candidate_names(blob_name) if variant is None else candidate_names(blob_name, variant)
+    return list(islice(names, n))
+
+
+def test_dotted_pdf_name_gets_the_marker_before_the_extension():
+    assert _first("uploads/ISO 9001.2015 rev.2.pdf") == [
+        "uploads/ISO 9001.2015 rev.2.pdf",
+        "uploads/ISO 9001.2015 rev.2_copy.pdf",
+        "uploads/ISO 9001.2015 rev.2_copy2.pdf",
+    ]
+
+
+def test_compound_json_suffix_stays_together():
+    assert _first("out/doc_json.json.gz", variant=numbered_name) == [
+        "out/doc_json.json.gz",
+        "out/doc_json_1.json.gz",
+        "out/doc_json_2.json.gz",
+    ]
+
+
+def test_name_without_folder_or_suffix():
+    assert _first("toc", n=2) == ["toc", "toc_copy"]
@@ -0,0 +1,32 @@
+from generate_tree_structure import generate_toc_tree_from_outline
+
+
+def test_years_are_not_heading_numbers():
+    outline = [[1, "Foreword", 3], [1, "2020 Overview", 4], [1, "1 Scope", 5], [1, "2 Terms", 6]]
+    result = generate_toc_tree_from_outline(outline)
+    assert result["is_numbered"]
+    assert list(result["json"]) == ["1", "2"]
+
+
+def test_first_annex_ends_the_main_content():
+    outline = [
+        [1, "1 Scope", 5],
+        [1, "2 Requirements", 6],
+        [2, "2.1 General", 6],
+        [1, "Annex A (informative) Examples", 9],
+        [2, "A.1 Tables", 9],
+        [2, "A.2 Figures", 10],
+        [1, "Bibliography", 12],
+    ]
+    result = generate_toc_tree_from_outline(outline)
+    assert list(result["json"]) == ["1", "2"]
+    assert list(result["json"]["2"]["subsections"]) == ["2.1"]
+    assert result["stop_heading"] == "Annex A (informative) Examples"
+    assert result["last_toc_page"] == 3
+
+
+def test_letter_numbered_annex_without_a_chapter_entry_ends_the_main_content():
+    outline = [[1, "1 Scope", 5], [1, "2 Terms", 6], [2, "A.1 Tables", 9], [1, "Index", 12]]
+    result = generate_toc_tree_from_outline(outline)
+    assert list(result["json"]) == ["1", "2"]
+    assert result["stop_heading"] == "A.1 Tables"
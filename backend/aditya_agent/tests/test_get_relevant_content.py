@@ -0,0 +1,33 @@
+import get_relevant_content
+from search_index import SectionSearchIndex
+
+
+def _index(title: str, source: str) -> SectionSearchIndex:
+    index = SectionSearchIndex.build({"1": {"title": title, "content": "", "subsections": {}}})
+    for section in index.sections:
+        section["source"] = source
+    return index
+
+
+def test_partial_merges_are_not_cached(monkeypatch):
+    available = {"gs://b/a.json.gz": _index("pump maintenance", "gs://b/a.json.gz")}
+    loads = []
+
+    def load(path, project_id):
+        loads.append(path)
+        return available.get(path)
+
+    monkeypatch.setattr(get_relevant_content, "load_search_index_from_gcs", load)
+    monkeypatch.setattr(get_relevant_content, "_corpus_indexes", type(get_relevant_content._corpus_indexes)())
+    paths = ["gs://b/a.json.gz", "gs://b/b.json.gz"]
+
+    # b's index hasn't been written yet
+    assert [hit["source"] for hit in get_relevant_content.search_sections(paths, "p", "pump")] == ["gs://b/a.json.gz"]
+
+    available["gs://b/b.json.gz"] = _index("pump wiring", "gs://b/b.json.gz")
+    hits = get_relevant_content.search_sections(paths, "p", "pump")
+    assert sorted(hit["source"] for hit in hits) == paths
+
+    # The complete merge is kept
+    get_relevant_content.search_sections(paths, "p", "pump")
+    assert len(loads) == 4
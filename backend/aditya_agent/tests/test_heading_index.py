@@ -0,0 +1,44 @@
+from heading_index import LineWindow, build_heading_index, place_sections, place_sections_streaming
+
+
+def _section(number: str, title: str) -> dict:
+    return {"number": number, "title": title, "node": {}}
+
+
+def test_empty_number_matches_any_line():
+    lines = ["1 Scope", "text", "Foreword", "2 Terms"]
+    index = build_heading_index(lines, ["1", "", "2"])
+    assert index == {"1": [0], "": [0, 1, 2, 3], "2": [3]}
+
+
+def test_unnumbered_heading_is_placed_between_numbered_ones():
+    ordered_toc = [_section("1", "Scope"), _section("", "Foreword"), _section("2", "Terms")]
+    lines = ["1 Scope", "scope text", "Foreword", "foreword text", "2 Terms", "terms text"]
+
+    spans = place_sections(ordered_toc, lines, set(), None, lambda lines: [False] * len(lines))
+
+    assert spans == [(0, 2), (2, 4), (4, 6)]
+    assert ordered_toc[1]["node"]["content"] == "foreword text"
+
+
+def test_streaming_places_unnumbered_heading_the_same_way():
+    lines = ["1 Scope", "scope text", "Foreword", "foreword text", "2 Terms", "terms text"]
+    ordered_toc = [_section("1", "Scope"), _section("", "Foreword"), _section("2", "Terms")]
+
+    spans = place_sections_streaming(ordered_toc, LineWindow([lines]), set(), None, lambda lines: [False] * len(lines))
+
+    assert spans == [(0, 2), (2, 4), (4, 6)]
+    assert ordered_toc[0]["node"]["content"] == "scope text"
+
+
+def test_end_heading_ends_the_last_section_without_classifying():
+    ordered_toc = [_section("1", "Scope")]
+    lines = ["1 Scope", "scope text", "2 Terms", "see the appendix"]
+
+    def classify(lines):
+        raise AssertionError("classified the end heading's section")
+
+    spans = place_sections(ordered_toc, lines, set(), None, classify, end_heading=_section("2", "Terms"))
+
+    assert spans == [(0, 2)]
+    assert ordered_toc[0]["node"]["content"] == "scope text"
@@ -0,0 +1,91 @@
+import fitz
+
+from incremental import page_hashes, outline_hash, align_pages, remap_section_pages, affected_runs, tree_is_reusable
+from page_text_store import PageTextStore
+from populate_json_content import populate_content, repopulate_content
+
+
+def _scanned_pdf(colours: list[tuple[int, int, int]]) -> fitz.Document:
+    """A PDF of image-only pages, one solid colour each, with no text."""
+    doc = fitz.open()
+    for colour in colours:
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+        pixmap.set_rect(pixmap.irect, colour)
+        page = doc.new_page(width=200, height=200)
+        page.insert_image(page.rect, pixmap=pixmap)
+    return fitz.open("pdf", doc.tobytes())
+
+
+def test_replaced_page_image_changes_the_hash():
+    old = page_hashes(_scanned_pdf([(255, 0, 0), (0, 255, 0)]))
+    new = page_hashes(_scanned_pdf([(255, 0, 0), (0, 0, 255)]))
+    assert old[0] == new[0]
+    assert old[1] != new[1]
+
+
+def test_appended_pages_keep_the_tree_and_unchanged_sections():
+    old = ["toc", "a", "b", "c"]
+    new = ["toc", "a", "b", "c", "annex1", "annex2"]
+    page_map, changed = align_pages(old, new)
+    assert page_map == [0, 1, 2, 3]
+    assert changed == {4, 5}
+    assert tree_is_reusable({"source_pages": [0], "outline_sha256": outline_hash([])}, old, new, [])
+    section_pages = remap_section_pages({"1": [1, 1], "2": [2, 2], "3": [3, 3]}, page_map)
+    # Only the last section, which runs to the end of the document, is re-extracted
+    assert affected_runs(["1", "2", "3"], section_pages, changed, len(new)) == [(2, 2)]
+
+
+def test_inserted_page_shifts_the_sections_after_it():
+    old = ["toc", "a", "b", "c", "d"]
+    new = ["toc", "a", "new", "b", "c", "d"]
+    page_map, changed = align_pages(old, new)
+    assert page_map == [0, 1, 3, 4, 5]
+    assert changed == {2}
+    section_pages = remap_section_pages({"1": [1, 2], "2": [3, 3], "3": [4, 4]}, page_map)
+    assert section_pages == {"1": [1, 3], "2": [4, 4], "3": [5, 5]}
+    assert affected_runs(["1", "2", "3"], section_pages, changed, len(new)) == [(0, 0)]
+
+
+def test_removed_page_marks_its_neighbours_changed():
+    page_map, changed = align_pages(["toc", "a", "b", "c"], ["toc", "a", "c"])
+    assert page_map == [0, 1, 2, 2]
+    assert changed == {1, 2}
+
+
+def test_tree_is_not_reused_when_pages_move_before_the_toc():
+    tree_meta = {"source_pages": [1], "outline_sha256": outline_hash([])}
+    assert tree_is_reusable(tree_meta, ["cover", "toc", "a"], ["cover", "toc", "a", "b"], [])
+    assert not tree_is_reusable(tree_meta, ["cover", "toc", "a"], ["new", "cover", "toc", "a"], [])
+    assert not tree_is_reusable(tree_meta, ["cover", "toc", "a"], ["cover", "toc2", "a"], [])
+
+
+def _section_pdf(path: str, pages: list[list[str]]):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 72 + 24 * i), line)
+    doc.save(path)
+
+
+def test_repopulate_moves_the_start_page_and_only_classifies_the_last_section(tmp_path, monkeypatch):
+    toc = {"1": {"title": "Scope"}, "2": {"title": "Terms"}, "3": {"title": "Rules"}}
+    pages = [["Cover"], ["1 Scope", "old scope"], ["2 Terms", "see the appendix"], ["3 Rules", "rule text"]]
+    old_path, new_path = str(tmp_path / "old.pdf"), str(tmp_path / "new.pdf")
+    _section_pdf(old_path, pages)
+    # A page inserted before the content, and section 1 rewritten
+    _section_pdf(new_path, [["Notice"], pages[0], ["1 Scope", "new scope"]] + pages[2:])
+    classified = []
+    monkeypatch.setattr("populate_json_content._classify_conclusive_headings_llm", lambda lines: classified.extend(lines) or [False] * len(lines))
+
+    layout = {}
+    with PageTextStore(old_path, workers=1) as store:
+        populate_content(toc, old_path, 1, None, True, layout=layout, text_store=store)
+    with PageTextStore(new_path, workers=1) as store:
+        new_layout = repopulate_content(toc, layout, new_path, None, True, text_store=store)
+
+    assert new_layout["start_page"] == 2
+    assert new_layout["section_pages"] == {"1": [2, 2], "2": [3, 3], "3": [4, 4]}
+    assert toc["1"]["content"] == "new scope"
+    # Section 2 only ends the re-extracted run, so its keyword line is never classified
+    assert classified == []
@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+from json_storage import read_envelope, write_envelope
+
+
+def _tree(sections: int) -> dict:
+    return {
+        str(n): {
+            "title": f"Section {n} é",
+            "content": "lorem ipsum \"quoted\" \\ text " * n,
+            "subsections": {f"{n}.1": {"title": "Sub", "content": "x" * n, "subsections": {}}},
+        }
+        for n in range(1, sections + 1)
+    }
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 7, 64, 1 << 20])
+def test_round_trip_in_any_chunk_size(chunk_chars):
+    tree = _tree(30)
+    meta = {"source": "gs://b/doc.pdf", "layout": {"page_hashes": ["a", "b"], "start_page": 12345}}
+    buffer = io.BytesIO()
+    write_envelope(tree, buffer, meta)
+    buffer.seek(0)
+    assert read_envelope(buffer, chunk_chars=chunk_chars) == {"format_version": 2, "toc": tree, "meta": meta}
+
+
+@pytest.mark.parametrize("tree", [_tree(5), [{"title": "Intro", "content": "", "subsections": []}], "Error : no TOC", {}])
+def test_legacy_files_are_read(tree):
+    buffer = io.BytesIO(json.dumps(tree, indent=4).encode("utf-8"))
+    assert read_envelope(buffer, chunk_chars=5) == {"format_version": 1, "toc": tree, "meta": {}}
+
+
+def test_text_is_only_buffered_one_section_at_a_time(monkeypatch):
+    import json_storage
+    tree = _tree(200)
+    buffer = io.BytesIO()
+    write_envelope(tree, buffer)
+    buffer.seek(0)
+    largest = []
+    real = json_storage._DECODER.raw_decode
+
+    def raw_decode(text, index=0):
+        largest.append(len(text))
+        return real(text, index)
+
+    monkeypatch.setattr(json_storage, "_DECODER", type("Decoder", (), {"raw_decode": staticmethod(raw_decode)})())
+    assert read_envelope(buffer, chunk_chars=1024)["toc"] == tree
+    whole = len(json.dumps(tree, separators=(",", ":"), ensure_ascii=False))
+    section = max(len(json.dumps(node, separators=(",", ":"), ensure_ascii=False)) for node in tree.values())
+    assert max(largest) < 2 * section + 2048 < whole
+
+
+def test_malformed_file_is_rejected():
+    with pytest.raises(ValueError):
+        read_envelope(io.BytesIO(b'{"format_version": 2, "toc": {"1": {"title": "x"'), chunk_chars=4)
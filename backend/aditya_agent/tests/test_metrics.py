@@ -0,0 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from prometheus_client import REGISTRY
+
+from metrics import count_bytes, stage_timer, run_recorded, recorded_result
+
+
+def _upload(num_bytes: int) -> int:
+    with stage_timer("test_worker_stage"):
+        count_bytes("upload", "test_artifact", num_bytes)
+    return num_bytes
+
+
+def _fail():
+    with stage_timer("test_worker_stage"):
+        raise ValueError("boom")
+
+
+def _value(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_worker_metrics_are_recorded_in_the_parent():
+    before_bytes = _value("aditya_storage_bytes_total", direction="upload", artifact="test_artifact")
+    before_ok = _value("aditya_stage_seconds_count", stage="test_worker_stage", outcome="ok")
+    before_error = _value("aditya_stage_seconds_count", stage="test_worker_stage", outcome="error")
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert recorded_result(pool.submit(run_recorded, _upload, 123)) == 123
+        with pytest.raises(ValueError, match="boom"):
+            recorded_result(pool.submit(run_recorded, _fail))
+    assert _value("aditya_storage_bytes_total", direction="upload", artifact="test_artifact") == before_bytes + 123
+    assert _value("aditya_stage_seconds_count", stage="test_worker_stage", outcome="ok") == before_ok + 1
+    assert _value("aditya_stage_seconds_count", stage="test_worker_stage", outcome="error") == before_error + 1
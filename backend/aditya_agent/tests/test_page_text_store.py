@@ -0,0 +1,32 @@
+import fitz
+
+from page_text_store import PageTextStore
+
+
+def _text_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 144), f"Body of page {page_num}")
+        page.insert_text((72, 72), f"Heading {page_num}")
+    doc.save(path)
+
+
+def test_sorted_read_keeps_the_plain_text(tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.pdf")
+    _text_pdf(path, 3)
+    with PageTextStore(path, workers=1) as store:
+        sorted_text = store.get(1, "sorted")
+        # The plain text now comes from the store, without parsing the page again
+        monkeypatch.setattr("page_text_store._extract", None)
+        plain_text = store.get(1, "text")
+    assert sorted_text.index("Heading 1") < sorted_text.index("Body of page 1")
+    assert plain_text.index("Body of page 1") < plain_text.index("Heading 1")
+
+
+def test_chunked_extraction_matches_single_pages(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    _text_pdf(path, 70)
+    with PageTextStore(path, workers=1) as single, PageTextStore(path, workers=2, chunk_size=8) as pooled:
+        assert list(pooled.iter_pages(flavour="sorted")) == list(single.iter_pages(flavour="sorted"))
+        assert list(pooled.iter_pages()) == list(single.iter_pages())
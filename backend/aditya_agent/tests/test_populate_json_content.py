@@ -0,0 +1,54 @@
+import json
+import types
+
+import populate_json_content
+from llm_cache import LLMCache
+
+
+def _fake_model(monkeypatch, fail_on_call: int | None = None) -> list[list[str]]:
+    """Classifies (normalized) lines starting with 'annex' as headings; returns the batches it was asked about."""
+    requests = []
+
+    def generate_content(prompt, purpose, **kwargs):
+        start = prompt.index("[")
+        lines, _ = json.JSONDecoder().raw_decode(prompt[start:])
+        requests.append(lines)
+        if len(requests) == fail_on_call:
+            raise RuntimeError("model unavailable")
+        return types.SimpleNamespace(text=json.dumps([line.startswith("annex") for line in lines]))
+
+    monkeypatch.setattr(populate_json_content, "generate_content", generate_content)
+    return requests
+
+
+def _use_cache(monkeypatch, tmp_path) -> LLMCache:
+    cache = LLMCache("conclusive_heading", path=str(tmp_path / "cache.sqlite"), enabled=True)
+    monkeypatch.setattr(populate_json_content, "_conclusive_cache", cache)
+    return cache
+
+
+def test_lines_are_classified_in_bounded_batches(monkeypatch, tmp_path):
+    _use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(populate_json_content, "CONCLUSIVE_BATCH_SIZE", 3)
+    requests = _fake_model(monkeypatch)
+    lines = [f"Annex {i}" if i % 2 else f"Line {i}" for i in range(7)]
+
+    verdicts = populate_json_content._classify_conclusive_headings_llm(lines)
+
+    assert verdicts == [i % 2 == 1 for i in range(7)]
+    assert [len(batch) for batch in requests] == [3, 3, 1]
+
+
+def test_successful_batches_are_cached_when_one_fails(monkeypatch, tmp_path):
+    cache = _use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(populate_json_content, "CONCLUSIVE_BATCH_SIZE", 2)
+    _fake_model(monkeypatch, fail_on_call=2)
+    lines = ["Annex A", "Line 1", "Annex B", "Line 2", "Annex C"]
+
+    verdicts = populate_json_content._classify_conclusive_headings_llm(lines)
+
+    # The failed batch counts as "not a heading" and isn't cached
+    assert verdicts == [True, False, False, False, True]
+    assert cache.get_many(["annex a", "line 1", "annex b", "line 2", "annex c"]) == {
+        "annex a": True, "line 1": False, "annex c": True
+    }
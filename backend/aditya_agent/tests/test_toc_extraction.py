@@ -0,0 +1,24 @@
+import fitz  # PyMuPDF
+
+from toc_extraction import build_toc_pdf
+
+
+def _scanned_pdf(color: tuple[int, int, int]) -> fitz.Document:
+    """A one-page PDF whose only content is an image, like a scanned TOC."""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 50, 50), False)
+    pix.set_rect(pix.irect, color)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    return doc
+
+
+def test_scanned_tocs_get_different_keys():
+    red, green = _scanned_pdf((255, 0, 0)), _scanned_pdf((0, 255, 0))
+    # Image-only pages have identical content streams; only the image differs
+    assert red[0].read_contents() == green[0].read_contents()
+    assert build_toc_pdf(red, [0])[1] != build_toc_pdf(green, [0])[1]
+
+
+def test_same_pages_get_the_same_key():
+    assert build_toc_pdf(_scanned_pdf((255, 0, 0)), [0]) == build_toc_pdf(_scanned_pdf((255, 0, 0)), [0])
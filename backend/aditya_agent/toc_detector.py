@@ -0,0 +1,109 @@
+import re
+import fitz  # PyMuPDF
+from page_text_store import PageTextStore
+
+TOC_KEYWORDS = (
+    "contents", "table of contents", "index",
+    "list of contents", "detailed contents",
+    "content page", "summary of contents"
+)
+
+TOC_LINE_PATTERNS = (
+    r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*\d+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\.{2,}\d+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\s*\.{2,}\s*\d+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\s\d+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\s{2,}\d+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+(?:\.\s*)+\d+\s*$',
+    r'^\s*[A-Za-z].+\s*\.{2,}\s*[a-zA-Z0-9]+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*[ivxlcdmIVXLCDM]+\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\s*\(\s*\d+\s*\)\s*$',
+    r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*\d+(?:[-–]\d+)\s*$',
+    r'^\s*[•\-\*]\s*.+\.{2,}\s*\d+\s*$',
+    r'^\s*[A-Z]\.\s+.+\.{2,}\s*\d+\s*$',
+    r'^\s*[A-Za-z].+\s{2,}\d+\s*$',
+)
+
+# All patterns are anchored at the start, so one alternation matches a line
+# exactly when at least one of the individual patterns does.
+_TOC_LINE_RE = re.compile("|".join(f"(?:{p})" for p in TOC_LINE_PATTERNS))
+
+
+def _could_be_toc_line(line: str) -> bool:
+    """Cheap prefilter: every pattern ends with a letter, digit or ')' before trailing spaces."""
+    stripped = line.rstrip()
+    return bool(stripped) and (stripped[-1].isalnum() or stripped[-1] == ")")
+
+
+def count_toc_lines(text: str) -> int:
+    """Counts the lines of a page's text that look like TOC entries."""
+    return sum(
+        1 for line in text.strip().split("\n")
+        if _could_be_toc_line(line) and _TOC_LINE_RE.search(line)
+    )
+
+
+def has_toc_keyword(text: str) -> bool:
+    """Checks whether a page's text mentions one of the TOC keywords."""
+    lowered = text.lower()
+    return any(kw in lowered for kw in TOC_KEYWORDS)
+
+
+def detect_toc_pages(
+    pdf_path: str,
+    min_matches_first_page: int = 5,
+    min_matches_next_page: int = 1,
+    max_scan_pages: int | None = None,
+    workers: int | None = None,
+    chunk_size: int = 32,
+    doc: fitz.Document | None = None,
+    store: PageTextStore | None = None
+) -> list[int]:
+    """
+    Finds the Table of Contents pages of a PDF.
+
+    The first TOC page must mention a TOC keyword and contain at least
+    min_matches_first_page TOC-like lines; following pages are included while
+    they contain at least min_matches_next_page such lines.
+
+    Args:
+        pdf_path: Local path of the PDF. Worker processes open it independently.
+        min_matches_first_page: TOC-like lines required on the first TOC page.
+        min_matches_next_page: TOC-like lines required on each following page.
+        max_scan_pages: Only look for the start of the TOC in this many leading pages.
+            None scans the whole document.
+        workers: Number of worker processes for text extraction. Defaults to the CPU count.
+        chunk_size: Number of pages each worker task extracts.
+        doc: An already open document for pdf_path, reused when scanning in-process.
+        store: A shared PageTextStore for pdf_path. Its "sorted" text of the scanned
+            pages stays available to later stages; workers, chunk_size and doc
+            are then ignored.
+
+    Returns:
+        The 1-based page numbers of the TOC pages, or an empty list if none were found.
+    """
+    owned = store is None
+    if owned:
+        store = PageTextStore(pdf_path, workers=workers, chunk_size=chunk_size, doc=doc)
+
+    toc_page_numbers = []
+    first_found = False
+
+    try:
+        for page_num, text in enumerate(store.iter_pages(flavour="sorted")):
+            matches, has_keyword = count_toc_lines(text), has_toc_keyword(text)
+            if not first_found:
+                if max_scan_pages is not None and page_num >= max_scan_pages:
+                    break
+                if has_keyword and matches >= min_matches_first_page:
+                    first_found = True
+                    toc_page_numbers.append(page_num + 1)
+            else:
+                if matches >= min_matches_next_page:
+                    toc_page_numbers.append(page_num + 1)
+                else:
+                    break
+    finally:
+        if owned:
+            store.close()
+    return toc_page_numbers
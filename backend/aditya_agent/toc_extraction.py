@@ -1,36 +1,79 @@
 import fitz  # PyMuPDF
-import re
+import hashlib
 from io import BytesIO
-from pathlib import PurePosixPath
-from google.cloud import storage
+from artifact_naming import copy_name, first_free_name, upload_unique
+from pdf_cache import get_cached_pdf_path
+from toc_detector import detect_toc_pages
+from storage_backend import get_storage_client
+from metrics import count_bytes
 
 
 def get_unique_blob_name(bucket, dest_blob):
-    """Return a unique blob name by appending '_copy' if needed."""
-    blob = bucket.blob(dest_blob)
+    """Return a unique blob name by appending '_copy' if needed, using one prefix listing."""
+    candidate = first_free_name(bucket, dest_blob, copy_name)
+    return candidate, bucket.blob(candidate)
 
-    if not blob.exists():
-        return dest_blob, blob
 
-    # Split into folder + filename + extension
-    path = PurePosixPath(dest_blob)
-    folder = "" if str(path.parent) == "." else str(path.parent)
-    stem = path.stem
-    suffix = path.suffix or ".pdf"
+def build_toc_pdf(doc: fitz.Document, pages: list[int]) -> tuple[bytes, str]:
+    """
+    Copies the given 0-based pages of doc into a new PDF.
 
-    counter = 1
-    new_name = f"{stem}_copy{suffix}"
-    candidate = f"{folder}/{new_name}" if folder else new_name
-    blob = bucket.blob(candidate)
+    The PDF is saved without metadata or a fresh file ID, so the same pages
+    always give the same bytes, and their SHA-256 can key the TOC tree cache.
+    Hashing the saved file rather than the pages' content streams also covers
+    images and other resources, so different scanned TOCs never share a key.
 
-    # Keep incrementing until a free name is found
-    while blob.exists():
-        counter += 1
-        new_name = f"{stem}_copy{counter}{suffix}"
-        candidate = f"{folder}/{new_name}" if folder else new_name
-        blob = bucket.blob(candidate)
+    Returns:
+        (PDF bytes, hex SHA-256 of those bytes)
+    """
+    new_doc = fitz.open()
+    for p in pages:
+        new_doc.insert_pdf(doc, from_page=p, to_page=p)
+    new_doc.set_metadata({})
+    pdf_bytes = new_doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    new_doc.close()
+    return pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def upload_toc_pdf(
+    pdf_bytes: bytes,
+    dest_bucket: str,
+    dest_blob: str,
+    overwrite: bool = False,
+    project_id: str | None = None,
+    verbose: bool = False
+) -> dict:
+    """
+    Uploads an extracted TOC PDF to GCS, picking a unique name unless overwrite is set.
+
+    Returns:
+        dict with bucket, blob_path, gs_uri and public_url.
+    """
+    dst_bucket = get_storage_client(project_id).bucket(dest_bucket)
+
+    # --- Upload to destination ---
+    def _write(blob, **precondition):
+        blob.upload_from_file(BytesIO(pdf_bytes), content_type="application/pdf", **precondition)
+        count_bytes("upload", "toc_pdf", len(pdf_bytes))
+
+    if overwrite:
+        if verbose:
+            print(f"Uploading extracted PDF to gs://{dest_bucket}/{dest_blob}")
+        _write(dst_bucket.blob(dest_blob))
+    else:
+        requested = dest_blob
+        dest_blob, _ = upload_unique(dst_bucket, dest_blob, _write, copy_name)
+        if dest_blob != requested:
+            print(f"File already exists. Saved instead as: gs://{dest_bucket}/{dest_blob}")
+        elif verbose:
+            print(f"Uploaded extracted PDF to gs://{dest_bucket}/{dest_blob}")
 
-    return candidate, blob
+    return {
+        "bucket": dest_bucket,
+        "blob_path": dest_blob,
+        "gs_uri": f"gs://{dest_bucket}/{dest_blob}",
+        "public_url": f"https://storage.googleapis.com/{dest_bucket}/{dest_blob}"
+    }
 
 
 def extract_toc_pdf(
@@ -41,74 +84,50 @@ def extract_toc_pdf(
     fallback_pages: int = 10,
     min_matches_first_page: int = 5,
     min_matches_next_page: int = 1,
+    max_scan_pages: int | None = None,
+    scan_workers: int | None = None,
     overwrite: bool = False,
     project_id: str | None = None,
-    verbose: bool = False
+    verbose: bool = False,
+    upload: bool = True,
+    text_store=None
 ) -> dict:
     """
     Extract ToC (or fallback) pages from a PDF in GCS, save the new PDF
     to the specified destination bucket and blob path, and return metadata.
 
+    TOC pages are found with toc_detector.detect_toc_pages; max_scan_pages and
+    scan_workers bound the scan window and the number of worker processes.
+    With upload=False nothing is written to GCS: the caller gets the PDF bytes
+    and can pass them on directly (or persist them later with upload_toc_pdf).
+    A shared page_text_store.PageTextStore for the source PDF can be passed as
+    text_store, so the text extracted for TOC detection is reused later on.
+
     Returns:
-        dict with bucket, blob_path, gs_uri, public_url, and from_toc.
+        dict with bucket, blob_path, gs_uri, public_url (all None when not
+        uploaded), pdf_bytes, from_toc, toc_pages, source_pages (0-based pages
+        in the extracted PDF, TOC or fallback), toc_sha256 (hash of the
+        extracted PDF, see build_toc_pdf) and outline (the embedded bookmark outline
+        from doc.get_toc()).
     """
 
-    # --- Init GCS client ---
-    client = storage.Client(project=project_id)
-    src_bucket = client.bucket(source_bucket)
-    dst_bucket = client.bucket(dest_bucket)
-
-    # --- Download source PDF into memory ---
-    if verbose:
-        print(f"Downloading gs://{source_bucket}/{source_blob} into memory...")
-    pdf_bytes = src_bucket.blob(source_blob).download_as_bytes()
-    doc = fitz.open("pdf", pdf_bytes)
-
-    # --- TOC detection logic ---
-    def find_toc_pages(doc) -> list[int]:
-        keywords = [
-            "contents", "table of contents", "index",
-            "list of contents", "detailed contents",
-            "content page", "summary of contents"
-        ]
-        patterns = [
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*\d+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\.{2,}\d+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\s*\.{2,}\s*\d+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\s\d+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\s{2,}\d+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+(?:\.\s*)+\d+\s*$'),
-            re.compile(r'^\s*[A-Za-z].+\s*\.{2,}\s*[a-zA-Z0-9]+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*[ivxlcdmIVXLCDM]+\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\s*\(\s*\d+\s*\)\s*$'),
-            re.compile(r'^\s*\d+(\.\d+)*\s+.+\.{2,}\s*\d+(?:[-–]\d+)\s*$'),
-            re.compile(r'^\s*[•\-\*]\s*.+\.{2,}\s*\d+\s*$'),
-            re.compile(r'^\s*[A-Z]\.\s+.+\.{2,}\s*\d+\s*$'),
-            re.compile(r'^\s*[A-Za-z].+\s{2,}\d+\s*$'),
-        ]
-
-        toc_page_numbers = []
-        first_found = False
-
-        for page_num in range(doc.page_count):
-            text = doc[page_num].get_text(sort=True)
-            lines = text.strip().split("\n")
-            matches = sum(1 for line in lines if any(p.search(line) for p in patterns))
-
-            if not first_found:
-                if any(kw in text.lower() for kw in keywords) and matches >= min_matches_first_page:
-                    first_found = True
-                    toc_page_numbers.append(page_num + 1)
-            else:
-                if matches >= min_matches_next_page:
-                    toc_page_numbers.append(page_num + 1)
-                else:
-                    break
-        return toc_page_numbers
+    # --- Open source PDF through the shared local cache ---
+    if text_store is not None:
+        pdf_path = text_store.pdf_path
+    else:
+        pdf_path = get_cached_pdf_path(f"gs://{source_bucket}/{source_blob}", project_id=project_id, verbose=verbose)
+    doc = fitz.open(pdf_path)
 
     # --- Find pages ---
-    toc_pages=[]
-    toc_pages = find_toc_pages(doc)
+    toc_pages = detect_toc_pages(
+        pdf_path,
+        min_matches_first_page=min_matches_first_page,
+        min_matches_next_page=min_matches_next_page,
+        max_scan_pages=max_scan_pages,
+        workers=scan_workers,
+        doc=doc,
+        store=text_store
+    )
     if toc_pages:
         pages_to_extract = [p - 1 for p in toc_pages]  # convert to 0-based
         from_toc = True
@@ -120,32 +139,21 @@ def extract_toc_pdf(
         print(f"Extracting pages: {pages_to_extract}")
 
     # --- Build new PDF in memory ---
-    new_doc = fitz.open()
-    for p in pages_to_extract:
-        new_doc.insert_pdf(doc, from_page=p, to_page=p)
-    output_buffer = BytesIO()
-    new_doc.save(output_buffer)
-    new_doc.close()
+    pdf_bytes, toc_sha256 = build_toc_pdf(doc, pages_to_extract)
+    outline = doc.get_toc()
     doc.close()
-    output_buffer.seek(0)
-
-    # --- Handle existing destination file ---
-    blob = dst_bucket.blob(dest_blob)
-    if blob.exists() and not overwrite:
-        dest_blob, blob = get_unique_blob_name(dst_bucket, dest_blob)
-        print(f"File already exists. Saving instead as: gs://{dest_bucket}/{dest_blob}")
 
-    # --- Upload to destination ---
-    if verbose:
-        print(f"Uploading extracted PDF to gs://{dest_bucket}/{dest_blob}")
-    blob.upload_from_file(output_buffer, content_type="application/pdf")
+    if upload:
+        location = upload_toc_pdf(pdf_bytes, dest_bucket, dest_blob, overwrite=overwrite, project_id=project_id, verbose=verbose)
+    else:
+        location = {"bucket": None, "blob_path": None, "gs_uri": None, "public_url": None}
 
     return {
-        "bucket": dest_bucket,
-        "blob_path": dest_blob,
-        "gs_uri": f"gs://{dest_bucket}/{dest_blob}",
-        "public_url": f"https://storage.googleapis.com/{dest_bucket}/{dest_blob}",
+        **location,
+        "pdf_bytes": pdf_bytes,
         "from_toc": from_toc,
-        "toc_pages":toc_pages
+        "toc_pages":toc_pages,
+        "source_pages": pages_to_extract,
+        "toc_sha256": toc_sha256,
+        "outline": outline
     }
-
@@ -0,0 +1,44 @@
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+_executor = None
+_pending: set[Future] = set()
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="write-behind")
+        return _executor
+
+
+def _log_failure(future: Future):
+    with _lock:
+        _pending.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        print("Write-behind task failed:")
+        traceback.print_exception(future.exception())
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """
+    Runs fn(*args, **kwargs) in the background, off the caller's critical path.
+
+    Failures are logged. Pending writes are finished before the interpreter exits.
+    """
+    future = _get_executor().submit(fn, *args, **kwargs)
+    with _lock:
+        _pending.add(future)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def flush(timeout: float | None = None) -> bool:
+    """Waits for all pending background writes; returns False if some are still running."""
+    with _lock:
+        pending = list(_pending)
+    _, not_done = wait(pending, timeout=timeout)
+    return not not_done
@@ -0,0 +1,93 @@
+import os
+import asyncio
+import httpx
+
+# Jira accepts at most 50 issues per bulk create request
+BULK_BATCH_SIZE = 50
+# Bulk requests in flight at once for one call
+BULK_CONCURRENCY = int(os.getenv("JIRA_BULK_CONCURRENCY", "4"))
+
+
+def issue_update(project_key: str, test_case: dict) -> dict:
+    """The create payload of one test case, as a Task in the given project."""
+    return {
+        "fields": {
+            "project": {"key": project_key},
+            "summary": test_case["summary"],
+            "description": test_case["description"],
+            "issuetype": {"name": "Task"}
+        }
+    }
+
+
+def _failed(error) -> dict:
+    return {"status": "failed", "error": error}
+
+
+def batch_results(size: int, status_code: int, body) -> list[dict]:
+    """
+    Maps a bulk create response back onto the issues of the batch, in order.
+
+    Jira lists the created issues in request order, skipping failed ones, and
+    reports each failure with the index of the element it belongs to.
+    """
+    if not isinstance(body, dict) or ("issues" not in body and "errors" not in body):
+        # The whole request was rejected (auth, rate limit, bad project...)
+        return [_failed({"status": status_code, "response": body}) for _ in range(size)]
+
+    results = [None] * size
+    for error in body.get("errors") or []:
+        index = error.get("failedElementNumber")
+        if isinstance(index, int) and 0 <= index < size:
+            results[index] = _failed(error.get("elementErrors") or error)
+
+    created = iter(body.get("issues") or [])
+    for index in range(size):
+        if results[index] is None:
+            issue = next(created, None)
+            results[index] = {"status": "created", **issue} if issue else _failed({"status": status_code, "response": "No issue returned"})
+    return results
+
+
+async def _create_batch(client: httpx.AsyncClient, url: str, headers: dict, issue_updates: list[dict], slots: asyncio.Semaphore) -> list[dict]:
+    async with slots:
+        try:
+            res = await client.post(url, headers=headers, json={"issueUpdates": issue_updates})
+        except httpx.HTTPError as e:
+            return [_failed({"error": str(e)}) for _ in issue_updates]
+    try:
+        body = res.json()
+    except ValueError:
+        body = res.text
+    return batch_results(len(issue_updates), res.status_code, body)
+
+
+async def create_issues_bulk(client: httpx.AsyncClient, cloudid: str, access_token: str, project_key: str, test_cases: list[dict]) -> list[dict]:
+    """
+    Creates one Jira issue per test case through the bulk create endpoint.
+
+    Test cases are sent in batches of BULK_BATCH_SIZE, with up to
+    BULK_CONCURRENCY batches in flight.
+
+    Returns:
+        One result per test case, in the original order: the created issue's
+        id, key and self link with status "created", or status "failed" and
+        the error Jira reported for it.
+    """
+    url = f"https://api.atlassian.com/ex/jira/{cloudid}/rest/api/2/issue/bulk"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+    updates = [issue_update(project_key, tc) for tc in test_cases]
+    slots = asyncio.Semaphore(BULK_CONCURRENCY)
+    batches = await asyncio.gather(*(
+        _create_batch(client, url, headers, updates[start:start + BULK_BATCH_SIZE], slots)
+        for start in range(0, len(updates), BULK_BATCH_SIZE)
+    ))
+
+    results = [result for batch in batches for result in batch]
+    for test_case, result in zip(test_cases, results):
+        result["summary"] = test_case["summary"]
+    return results
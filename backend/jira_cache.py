@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+import httpx
+from prometheus_client import Counter
+
+# Served without asking Jira while younger than the TTL; served as-is (and refreshed
+# in the background) for STALE_SECONDS after that; fetched again once older
+PROJECTS_TTL_SECONDS = float(os.getenv("JIRA_PROJECTS_TTL_SECONDS", "300"))
+PROJECTS_STALE_SECONDS = float(os.getenv("JIRA_PROJECTS_STALE_SECONDS", "3600"))
+
+CACHE_REQUESTS = Counter(
+    "jira_project_cache_requests", "Project list lookups, by how the cache answered", ["result"]
+)
+CACHE_REFRESHES = Counter(
+    "jira_project_cache_refreshes", "Project list fetches from Jira, by outcome", ["outcome"]
+)
+
+
+class _Entry:
+    def __init__(self, value, etag: str | None):
+        self.value = value
+        self.etag = etag
+        self.fetched_at = time.monotonic()
+
+
+class ProjectCache:
+    """
+    Cache of the Jira project list per site and user, with stale-while-revalidate.
+
+    Jira only lists the projects a user may browse, so each user of a site has
+    their own entry. fetch is an async callable taking the cached ETag (or None)
+    and returning the httpx.Response of the project list request; a 304 keeps
+    the cached list. Only successful responses are cached. Concurrent refreshes
+    of one entry share a single request.
+    """
+
+    def __init__(self, ttl_seconds: float = PROJECTS_TTL_SECONDS, stale_seconds: float = PROJECTS_STALE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._entries: dict[tuple[str, str], _Entry] = {}
+        self._refreshing: dict[tuple[str, str], asyncio.Task] = {}
+        self._generations: dict[str, int] = {}  # Per site; bumped on invalidate, so in-flight fetches don't store old data
+
+    async def get(self, cloudid: str, user_id: str, fetch):
+        key = (cloudid, user_id)
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry.fetched_at if entry else None
+        if entry and age < self.ttl_seconds:
+            CACHE_REQUESTS.labels("hit").inc()
+            return entry.value
+        if entry and age < self.ttl_seconds + self.stale_seconds:
+            CACHE_REQUESTS.labels("stale").inc()
+            self._start_refresh(key, fetch)
+            return entry.value
+        CACHE_REQUESTS.labels("miss").inc()
+        return await asyncio.shield(self._start_refresh(key, fetch))
+
+    def invalidate(self, cloudid: str | None = None) -> int:
+        """Drops the cached lists of one site (for all its users), or of every site; returns how many were dropped."""
+        cloudids = {cloudid} if cloudid is not None else {site for site, _ in self._entries}
+        for site in cloudids:
+            self._generations[site] = self._generations.get(site, 0) + 1
+        dropped = [key for key in self._entries if key[0] in cloudids]
+        for key in dropped:
+            del self._entries[key]
+        return len(dropped)
+
+    def _start_refresh(self, key: tuple[str, str], fetch) -> asyncio.Task:
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, fetch))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+
+    async def _refresh(self, key: tuple[str, str], fetch):
+        cloudid = key[0]
+        generation = self._generations.get(cloudid, 0)
+        entry = self._entries.get(key)
+        try:
+            res = await fetch(entry.etag if entry else None)
+        except httpx.HTTPError as e:
+            CACHE_REFRESHES.labels("error").inc()
+            print(f"Refreshing Jira projects for {cloudid} failed: {e}")
+            if entry:
+                return entry.value
+            raise
+
+        if res.status_code == 304 and entry:
+            CACHE_REFRESHES.labels("not_modified").inc()
+            entry.fetched_at = time.monotonic()
+            return entry.value
+
+        body = res.json()
+        if res.status_code != 200:
+            CACHE_REFRESHES.labels("error").inc()
+            return body
+        CACHE_REFRESHES.labels("updated").inc()
+        if self._generations.get(cloudid, 0) == generation:
+            self._entries[key] = _Entry(body, res.headers.get("etag"))
+        return body
@@ -0,0 +1,145 @@
+import os
+import time
+import secrets
+import asyncio
+import httpx
+from prometheus_client import Counter
+
+TOKEN_URL = "https://auth.atlassian.com/oauth/token"
+
+# Tokens are refreshed in the background this long before they expire
+REFRESH_MARGIN_SECONDS = float(os.getenv("JIRA_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# How often the background task looks for tokens nearing expiry
+REFRESH_CHECK_SECONDS = float(os.getenv("JIRA_TOKEN_REFRESH_CHECK_SECONDS", "30"))
+# How long a user has to finish the Atlassian consent screen
+AUTHORIZATION_TTL_SECONDS = float(os.getenv("JIRA_AUTHORIZATION_TTL_SECONDS", "600"))
+
+TOKEN_REFRESHES = Counter(
+    "jira_token_refreshes", "OAuth access token refreshes, by where they ran and outcome", ["trigger", "outcome"]
+)
+
+
+class JiraTokens:
+    def __init__(self, access_token: str, refresh_token: str | None, expires_at: float, cloudid: str | None):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+        self.cloudid = cloudid
+
+    def expires_within(self, seconds: float) -> bool:
+        return time.time() + seconds >= self.expires_at
+
+
+class TokenStore:
+    """
+    Atlassian OAuth tokens per user, kept valid by refreshing them ahead of expiry.
+
+    Users are identified by their login (the JWT subject). Each consent flow
+    gets a random, single-use OAuth state mapped to the user who started it,
+    so a callback can only store tokens for that user. A background task (run_refresher) renews every token nearing expiry with its
+    refresh token, so requests normally find a valid token waiting. A request
+    only refreshes inline if that hasn't happened in time. Atlassian rotates
+    refresh tokens, so refreshes of one user never overlap.
+    """
+
+    def __init__(self, client_id: str | None, client_secret: str | None, refresh_margin: float = REFRESH_MARGIN_SECONDS):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self._tokens: dict[str, JiraTokens] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._pending: dict[str, tuple[str, float]] = {}  # OAuth state -> (user, expiry)
+
+    def begin_authorization(self, user_id: str) -> str:
+        """Returns a new OAuth state for user_id's consent flow."""
+        now = time.time()
+        self._pending = {state: entry for state, entry in self._pending.items() if entry[1] > now}
+        state = secrets.token_urlsafe(32)
+        self._pending[state] = (user_id, now + AUTHORIZATION_TTL_SECONDS)
+        return state
+
+    def complete_authorization(self, state: str) -> str | None:
+        """Consumes an OAuth state; returns the user who started the flow, or None if unknown or expired."""
+        user_id, expires_at = self._pending.pop(state, (None, 0.0))
+        return user_id if expires_at > time.time() else None
+
+    def save(self, user_id: str, token_data: dict, cloudid: str | None = None):
+        """
+        Stores the token endpoint's response for a user.
+
+        A user's JiraTokens object is updated in place, so holders of it (such
+        as a pending cache revalidation) see refreshed tokens. The known cloudid
+        is kept if none is given, and the last refresh token if none was issued.
+        """
+        expires_at = time.time() + float(token_data.get("expires_in", 3600))
+        tokens = self._tokens.get(user_id)
+        if tokens is None:
+            self._tokens[user_id] = JiraTokens(token_data["access_token"], token_data.get("refresh_token"), expires_at, cloudid)
+            return
+        tokens.access_token = token_data["access_token"]
+        tokens.refresh_token = token_data.get("refresh_token") or tokens.refresh_token
+        tokens.expires_at = expires_at
+        tokens.cloudid = cloudid or tokens.cloudid
+
+    def remove(self, user_id: str):
+        self._tokens.pop(user_id, None)
+
+    async def get(self, user_id: str, http: httpx.AsyncClient) -> JiraTokens | None:
+        """Returns the user's valid tokens, or None if they need to connect Jira (again)."""
+        tokens = self._tokens.get(user_id)
+        if tokens is None or not tokens.expires_within(0):
+            return tokens
+        # The background refresh didn't get to it in time
+        await self._refresh(user_id, http, trigger="request")
+        return self._tokens.get(user_id)
+
+    async def _refresh(self, user_id: str, http: httpx.AsyncClient, trigger: str):
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            tokens = self._tokens.get(user_id)
+            # Another caller may have refreshed while we waited for the lock
+            if tokens is None or not tokens.expires_within(self.refresh_margin):
+                return
+            if not tokens.refresh_token:
+                if tokens.expires_within(0):
+                    print(f"Jira token of {user_id} expired and can't be refreshed; reconnect needed")
+                    self.remove(user_id)
+                return
+            try:
+                res = await http.post(TOKEN_URL, json={
+                    "grant_type": "refresh_token",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "refresh_token": tokens.refresh_token,
+                })
+            except httpx.HTTPError as e:
+                # Transient: keep the tokens and try again on the next pass
+                TOKEN_REFRESHES.labels(trigger, "error").inc()
+                print(f"Refreshing the Jira token of {user_id} failed: {e}")
+                return
+            if res.status_code in (400, 401, 403):
+                # The refresh token was revoked or has expired
+                TOKEN_REFRESHES.labels(trigger, "rejected").inc()
+                print(f"Jira refused to refresh the token of {user_id}; reconnect needed: {res.text[:200]}")
+                self.remove(user_id)
+                return
+            if res.status_code != 200:
+                TOKEN_REFRESHES.labels(trigger, "error").inc()
+                print(f"Refreshing the Jira token of {user_id} failed with status {res.status_code}")
+                return
+            self.save(user_id, res.json())
+            TOKEN_REFRESHES.labels(trigger, "ok").inc()
+
+    async def refresh_expiring(self, http: httpx.AsyncClient):
+        """Refreshes every token that expires within the refresh margin."""
+        due = [user_id for user_id, tokens in list(self._tokens.items()) if tokens.expires_within(self.refresh_margin)]
+        await asyncio.gather(*(self._refresh(user_id, http, trigger="background") for user_id in due))
+
+    async def run_refresher(self, http: httpx.AsyncClient, interval: float = REFRESH_CHECK_SECONDS):
+        """Background task: keeps tokens fresh until cancelled."""
+        while True:
+            try:
+                await self.refresh_expiring(http)
+            except Exception as e:
+                print(f"Jira token refresh pass failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# The document pipeline lives in aditya_agent/ and uses flat imports.
+# Appended (not prepended) so backend modules such as main.py keep priority.
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aditya_agent")
+if AGENT_DIR not in sys.path:
+    sys.path.append(AGENT_DIR)
+
+# Mirrors ingest.STAGES, which can't be imported without the pipeline's dependencies
+INGEST_STAGES = ("toc_extraction", "tree_generation", "population", "save")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class IngestJob:
+    def __init__(self, gcs_path: str, incremental: bool = False):
+        self.id = uuid.uuid4().hex
+        self.gcs_path = gcs_path
+        self.incremental = incremental
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        # pending -> running -> done | failed, or skipped when an incremental run doesn't need it
+        self.stages = {stage: {"status": "pending", "started_at": None, "finished_at": None} for stage in INGEST_STAGES}
+        self.json_location = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0  # Bumped on every change, so streams can detect updates
+
+    def touch(self):
+        self.updated_at = time.time()
+        self.version += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "gcs_path": self.gcs_path,
+            "incremental": self.incremental,
+            "status": self.status,
+            "stages": self.stages,
+            "json_location": self.json_location,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """
+    Runs document ingestion jobs on a bounded thread pool, off the event loop.
+
+    At most max_workers jobs run at once and at most max_pending wait behind
+    them; finished jobs are kept for status queries until max_jobs is exceeded.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 100, max_jobs: int = 1000):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._max_jobs = max_jobs
+        self._jobs: dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, gcs_path: str, incremental: bool = False) -> IngestJob:
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if active >= self._max_workers + self._max_pending:
+                raise QueueFullError("Too many ingestion jobs in progress")
+            job = IngestJob(gcs_path, incremental)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.status in ("succeeded", "failed")]
+        excess = len(self._jobs) - self._max_jobs
+        for job in sorted(finished, key=lambda j: j.updated_at)[:max(excess, 0)]:
+            del self._jobs[job.id]
+
+    def _on_stage(self, job: IngestJob, stage: str, status: str):
+        with self._lock:
+            info = job.stages[stage]
+            info["status"] = status
+            if status == "running":
+                info["started_at"] = time.time()
+            else:
+                info["finished_at"] = time.time()
+            job.touch()
+
+    def _run(self, job: IngestJob):
+        with self._lock:
+            job.status = "running"
+            job.touch()
+        try:
+            # Imported lazily: the pipeline pulls in PyMuPDF and Vertex AI
+            from ingest import ingest_document
+            result = ingest_document(
+                job.gcs_path,
+                on_stage=lambda stage, status: self._on_stage(job, stage, status),
+                incremental=job.incremental
+            )
+            with self._lock:
+                job.json_location = result["json_location"]
+                if job.json_location:
+                    job.status = "succeeded"
+                else:
+                    job.status = "failed"
+                    job.error = "Saving the populated JSON failed"
+                job.touch()
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                for info in job.stages.values():
+                    if info["status"] == "running":
+                        info["status"] = "failed"
+                        info["finished_at"] = time.time()
+                job.status = "failed"
+                job.error = str(e)
+                job.touch()
@@ -1,8 +1,11 @@
 from fastapi import FastAPI, Request , Depends  , Form,HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
-import httpx, os
+import httpx, os, json, asyncio, time, threading
+import importlib.util
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv, find_dotenv
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine, Base 
@@ -10,13 +13,47 @@ from datetime import datetime, timedelta
 from models import User
 import jwt 
 from pydantic import BaseModel
+from jobs import JobManager, QueueFullError
+from jira_bulk import create_issues_bulk
+from jira_cache import ProjectCache
+from jira_tokens import TokenStore, JiraTokens
+from prometheus_client import Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 
 
 load_dotenv(find_dotenv())
-app = FastAPI()
 
-Base.metadata.create_all(bind=engine)
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]"); without it
+# connections are still pooled and kept alive over HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+        # Bulk issue creation can take a while on Jira's side
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every Atlassian call, so connections and TLS sessions are reused
+    app.state.http = create_http_client()
+    if not HTTP2_AVAILABLE:
+        print('HTTP/2 disabled for Atlassian calls: the h2 package is not installed (pip install "httpx[http2]"); using HTTP/1.1 keep-alive')
+    # Renews Jira tokens ahead of expiry, off the request path
+    token_refresher = asyncio.create_task(token_store.run_refresher(app.state.http))
+    try:
+        yield
+    finally:
+        token_refresher.cancel()
+        await app.state.http.aclose()
+        job_manager.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["http://localhost:3000"]  # your frontend
 
@@ -29,7 +66,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-Base.metadata.create_all(bind=engine)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
@@ -39,8 +75,33 @@ CLIENT_ID = os.getenv("ATLASSIAN_CLIENT_ID")
 CLIENT_SECRET = os.getenv("ATLASSIAN_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("ATLASSIAN_REDIRECT_URI")
 
-# In-memory token store (replace with DB for real app)
-user_tokens = {}
+# In-memory Jira tokens per logged-in user, keyed by the JWT subject (replace with DB for real app)
+token_store = TokenStore(CLIENT_ID, CLIENT_SECRET)
+
+# Jira project lists per site and user; they rarely change, so page loads are served locally
+project_cache = ProjectCache()
+
+# Document ingestion runs on a bounded worker pool, off the event loop
+job_manager = JobManager(max_workers=int(os.getenv("INGEST_WORKERS", "2")))
+
+# Request latency per route template (not raw path, so IDs don't explode the label set)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Latency of API requests", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", str(status)).observe(time.perf_counter() - started)
 
 
 class UserCreate(BaseModel):
@@ -52,7 +113,54 @@ class LoginData(BaseModel):
     email: str
     password: str
 
+class IngestRequest(BaseModel):
+    gcs_path: str
+    incremental: bool = False  # Update the document's last populated JSON instead of starting over
+
+# Tables are created on first database use, not at import, so startup needs no DB round trip
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            Base.metadata.create_all(bind=engine)
+            _schema_ready = True
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)) -> str:
+    # The login JWT identifies the user; anything else is rejected
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload["sub"]
+
+
+async def get_jira_tokens(user: str = Depends(get_current_user), http: httpx.AsyncClient = Depends(get_http_client)) -> JiraTokens:
+    tokens = await token_store.get(user, http)
+    if tokens is None or not tokens.cloudid:
+        raise HTTPException(status_code=401, detail="Jira is not connected")
+    return tokens
+
+
 def get_db():
+    ensure_schema()
     db = SessionLocal()
     try:
         yield db
@@ -60,6 +168,12 @@ def get_db():
         db.close()
 
 
+@app.get("/metrics")
+def metrics():
+    # Pipeline stage, storage and Gemini metrics register themselves in the same default registry
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/")
 def test_connection(db: Session = Depends(get_db)):
     return {"message": "Connected to Cloud SQL postgres!", "db_status": str(db.bind)}    
@@ -96,9 +210,51 @@ def login(user: LoginData, db: Session = Depends(get_db)):
 
 
 
-# Step 1: Redirect to Atlassian login/consent
+# Document ingestion jobs
+@app.post("/ingest/jobs", status_code=202)
+def submit_ingest_job(body: IngestRequest):
+    if not body.gcs_path.startswith("gs://"):
+        raise HTTPException(status_code=400, detail="gcs_path must be a gs:// URI")
+    try:
+        job = job_manager.submit(body.gcs_path, incremental=body.incremental)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/ingest/jobs/{job_id}/events")
+async def stream_ingest_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Server-sent events: one message per status change, until the job finishes
+    async def events():
+        last_version = -1
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                yield f"data: {json.dumps(job.to_dict())}\n\n"
+                if job.status in ("succeeded", "failed"):
+                    break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# Step 1: Send the logged-in user to Atlassian login/consent
 @app.get("/connect-jira")
-async def connect_jira():
+async def connect_jira(user: str = Depends(get_current_user)):
+    # A fresh, single-use state ties the callback to this user
+    state = token_store.begin_authorization(user)
     print(CLIENT_ID)
     print(CLIENT_SECRET)
     auth_url = (
@@ -108,13 +264,19 @@ async def connect_jira():
         f"&scope=read%3Ajira-work%20write%3Ajira-work%20offline_access"
         f"&redirect_uri={REDIRECT_URI}"
         f"&response_type=code&prompt=consent"
+        f"&state={state}"
     )
-    return RedirectResponse(auth_url)
+    # Returned rather than redirected to: the browser navigates there itself, since it can't send the JWT along a redirect
+    return {"auth_url": auth_url}
 
 
 # Step 2: Handle callback and exchange code for tokens
 @app.get("/jira/callback")
-async def jira_callback(code: str):
+async def jira_callback(code: str, state: str, http: httpx.AsyncClient = Depends(get_http_client)):
+    user = token_store.complete_authorization(state)
+    if user is None:
+        return JSONResponse({"error": "Unknown or expired authorization request; connect Jira again"}, status_code=400)
+
     token_url = "https://auth.atlassian.com/oauth/token"
     data = {
         "grant_type": "authorization_code",
@@ -124,9 +286,8 @@ async def jira_callback(code: str):
         "redirect_uri": REDIRECT_URI,
     }
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(token_url, json=data)
-        token_data = res.json()
+    res = await http.post(token_url, json=data)
+    token_data = res.json()
 
     if "access_token" not in token_data:
         return JSONResponse({"error": "Failed to get access token", "details": token_data}, status_code=400)
@@ -134,21 +295,19 @@ async def jira_callback(code: str):
     access_token = token_data["access_token"]
 
     # Get Jira cloud site (cloudid)
-    async with httpx.AsyncClient() as client:
-        res2 = await client.get(
-            "https://api.atlassian.com/oauth/token/accessible-resources",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        resources = res2.json()
+    res2 = await http.get(
+        "https://api.atlassian.com/oauth/token/accessible-resources",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    resources = res2.json()
 
     if not resources:
         return {"error": "No Jira instances found for this user"}
 
     cloudid = resources[0]["id"]
 
-    # Save tokens in memory
-    user_tokens["access_token"] = access_token
-    user_tokens["cloudid"] = cloudid
+    # Save tokens in memory, per user; the refresh token keeps them valid without re-consent
+    token_store.save(user, token_data, cloudid)
 
     # ✅ Redirect back to frontend instead of JSON dump
     return RedirectResponse("http://localhost:3000/generated-files?connected=jira")
@@ -156,45 +315,34 @@ async def jira_callback(code: str):
 
 # Step 3: Fetch Jira projects
 @app.get("/jira/projects")
-async def get_projects():
-    async with httpx.AsyncClient() as client:
-        res = await client.get(
-            f"https://api.atlassian.com/ex/jira/{user_tokens['cloudid']}/rest/api/3/project",
-            headers={"Authorization": f"Bearer {user_tokens['access_token']}"}
-        )
-    return res.json()
+async def get_projects(user: str = Depends(get_current_user), tokens: JiraTokens = Depends(get_jira_tokens), http: httpx.AsyncClient = Depends(get_http_client)):
+    async def fetch(etag: str | None) -> httpx.Response:
+        # Read at call time: a background revalidation may run after the token was refreshed
+        headers = {"Authorization": f"Bearer {tokens.access_token}"}
+        if etag:
+            headers["If-None-Match"] = etag
+        return await http.get(f"https://api.atlassian.com/ex/jira/{tokens.cloudid}/rest/api/3/project", headers=headers)
+
+    # Per user too: Jira only lists the projects each user may browse
+    return await project_cache.get(tokens.cloudid, user, fetch)
+
+
+@app.post("/jira/projects/invalidate")
+async def invalidate_projects(tokens: JiraTokens = Depends(get_jira_tokens)):
+    # Forget the cached project list, e.g. right after creating a project in Jira
+    return {"invalidated": project_cache.invalidate(tokens.cloudid)}
 
 
 # Step 4: Create Jira issues
 @app.post("/jira/create-issues")
-async def create_issues(request: Request):
+async def create_issues(request: Request, tokens: JiraTokens = Depends(get_jira_tokens), http: httpx.AsyncClient = Depends(get_http_client)):
     data = await request.json()
     project_key = data["projectKey"]
     test_cases = data["testCases"]
 
-    created_issues = []
-    async with httpx.AsyncClient() as client:
-        for tc in test_cases:
-            payload = {
-                "fields": {
-                    "project": {"key": project_key},
-                    "summary": tc["summary"],
-                    "description": tc["description"],
-                    "issuetype": {"name": "Task"}
-                }
-            }
-            res = await client.post(
-                f"https://api.atlassian.com/ex/jira/{user_tokens['cloudid']}/rest/api/2/issue",
-                headers={
-                    "Authorization": f"Bearer {user_tokens['access_token']}",
-                    "Accept": "application/json",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            )
-            created_issues.append(res.json())
-
-    return created_issues  # Return array directly for simplicity
+    results = await create_issues_bulk(http, tokens.cloudid, tokens.access_token, project_key, test_cases)
+
+    return results  # One result per test case, in order
 
 # uvicorn main:app --reload --host 0.0.0.0 --port 8000
 
@@ -8,6 +8,9 @@ import styles from "./GeneratedFilesPage.module.css";
 import { toast } from "react-toastify";
 import axios from "axios";
 
+// The login token identifies this user to the backend's Jira token store
+const authHeaders = () => ({ Authorization: `Bearer ${localStorage.getItem("authToken")}` });
+
 export default function GeneratedFilesPage() {
   const location = useLocation();
   const queryParams = new URLSearchParams(location.search);
@@ -120,12 +123,17 @@ export default function GeneratedFilesPage() {
     toast.info(`Downloading ${getDummyFileName(format)}...`);
   };
 
-  const handleYesClick = () => {
+  const handleYesClick = async () => {
     setShowYesNo(false);
-    // Show Jira connect (redirect)
-    const state = "user123";
-    const url = `https://auth.atlassian.com/authorize?audience=api.atlassian.com&client_id=3ewrPVgbajY6Or7gXCBhSnilSkphliMk&scope=read:jira-work write:jira-work&redirect_uri=http://localhost:8000/jira/callback&state=${state}&response_type=code&prompt=consent`;
-    window.location.href = url;
+    // Show Jira connect (redirect); the backend issues the OAuth state for this user
+    try {
+      const res = await axios.get("http://localhost:8000/connect-jira", { headers: authHeaders() });
+      window.location.href = res.data.auth_url;
+    } catch (err) {
+      console.error(err);
+      toast.error("⚠️ Please log in again to connect Jira");
+      setShowYesNo(true);
+    }
   };
 
   const handleNoClick = () => {
@@ -170,7 +178,7 @@ export default function GeneratedFilesPage() {
       const res = await axios.post("http://localhost:8000/jira/create-issues", {
         projectKey: "SMS", // replace with your project key
         testCases,
-      });
+      }, { headers: authHeaders() });
 
       if (res.status === 200) {
         toast.success(`📌 Created Jira issues from ${fileName}!`);